@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from stats_engine import AGE_GROUPS, N_QUESTIONS, NO_AGE
+
+
+# Slider answers live on a 0.01 grid in [-1, 1], so every answer falls in one
+# of 201 exact "centi" bins. Counting those on write makes any equal-width
+# histogram over [-1, 1], and exact quantiles, a pure function of 201 numbers
+# per question. Answers off the grid are counted at the nearest grid point
+# (and reported as ``off_grid``); answers outside [-1, 1] go to the end bins.
+GRID_BINS = 201
+MAX_AGE_CODES = 128  # int8 codes, NO_AGE counted separately
+
+
+def _grid_index(values: np.ndarray):
+    """(bin index, finite mask, on-grid mask) for a (6, k) block of answers."""
+    finite = np.isfinite(values)
+    scaled = np.where(finite, values, 0.0) * 100.0
+    idx = np.clip(np.rint(scaled), -100, 100)
+    on_grid = finite & (np.abs(scaled - idx) < 1e-6)
+    return idx.astype(np.int64) + 100, finite, on_grid
+
+
+class AnswerAggregates:
+    """Running per-question histograms, moments and age counts.
+
+    ``counts`` is (6, 201): how many answers sit at each grid point. Sums of
+    values and squares give exact means and (population) standard
+    deviations; ``age_counts`` counts responses per store age code. All of
+    it is updated in O(k) for k added or removed rows, so summaries cost
+    the same at any dataset size.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.counts = np.zeros((N_QUESTIONS, GRID_BINS), dtype=np.int64)
+        self.n = np.zeros(N_QUESTIONS, dtype=np.int64)
+        self.sum = np.zeros(N_QUESTIONS)
+        self.sum_sq = np.zeros(N_QUESTIONS)
+        self.off_grid = np.zeros(N_QUESTIONS, dtype=np.int64)
+        self.age_counts = np.zeros(MAX_AGE_CODES, dtype=np.int64)
+        self.no_age = 0
+        self.responses = 0
+
+    def add(self, answers: np.ndarray, age_codes: np.ndarray, sign: int = 1) -> None:
+        """Fold in a (6, k) block of answers with their age codes (``sign=-1`` removes)."""
+        k = answers.shape[1]
+        if k == 0:
+            return
+        idx, finite, on_grid = _grid_index(answers)
+        rows = np.broadcast_to(np.arange(N_QUESTIONS)[:, None], idx.shape)
+        flat = (rows * GRID_BINS + idx)[finite]
+        self.counts += sign * np.bincount(flat, minlength=N_QUESTIONS * GRID_BINS).reshape(N_QUESTIONS, GRID_BINS)
+        values = np.where(finite, answers, 0.0)
+        self.n += sign * finite.sum(axis=1)
+        self.sum += sign * values.sum(axis=1)
+        self.sum_sq += sign * (values * values).sum(axis=1)
+        self.off_grid += sign * (finite & ~on_grid).sum(axis=1)
+        codes = np.asarray(age_codes, dtype=np.int64)
+        missing = codes == NO_AGE
+        self.no_age += sign * int(missing.sum())
+        self.age_counts += sign * np.bincount(codes[~missing], minlength=MAX_AGE_CODES)[:MAX_AGE_CODES]
+        self.responses += sign * k
+
+    def remove(self, answers: np.ndarray, age_codes: np.ndarray) -> None:
+        self.add(answers, age_codes, sign=-1)
+
+    def summary(self, age_labels: List[str], bins: int = 9, quantiles=(0.0, 0.25, 0.5, 0.75, 1.0)) -> Dict:
+        """JSON-ready histograms with ``bins`` equal-width bins over [-1, 1],
+        means, standard deviations, quantiles and age-group counts."""
+        if not 1 <= bins <= GRID_BINS - 1:
+            raise ValueError(f"bins must be between 1 and {GRID_BINS - 1}")
+        # Grid point g (value g/100 - 1) falls in bin floor(g * bins / 200),
+        # with +1.0 folded into the last bin
+        grid_to_bin = np.minimum(np.arange(GRID_BINS) * bins // (GRID_BINS - 1), bins - 1)
+        histograms = np.zeros((N_QUESTIONS, bins), dtype=np.int64)
+        np.add.at(histograms, (slice(None), grid_to_bin), self.counts)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self.sum / self.n
+            std = np.sqrt(np.clip(self.sum_sq / self.n - mean ** 2, 0.0, None))
+        grid = np.linspace(-1.0, 1.0, GRID_BINS)
+        questions = []
+        for j in range(N_QUESTIONS):
+            questions.append({
+                "question": f"q{j + 1}",
+                "n": int(self.n[j]),
+                "mean": _float(mean[j]),
+                "std": _float(std[j]),
+                "histogram": histograms[j].tolist(),
+                "quantiles": [_float(v) for v in _grid_quantiles(self.counts[j], grid, quantiles)],
+                "off_grid": int(self.off_grid[j]),
+            })
+
+        codes = list(range(len(AGE_GROUPS))) + [
+            code for code in range(len(AGE_GROUPS), len(age_labels)) if self.age_counts[code] > 0
+        ]
+        return {
+            "n": int(self.responses),
+            "bins": bins,
+            "edges": np.linspace(-1.0, 1.0, bins + 1).round(10).tolist(),
+            "quantile_levels": list(quantiles),
+            "questions": questions,
+            "age_groups": [age_labels[code] for code in codes],
+            "age_counts": [int(self.age_counts[code]) for code in codes],
+            "no_age": int(self.no_age),
+        }
+
+
+def _grid_quantiles(counts: np.ndarray, grid: np.ndarray, levels) -> List[Optional[float]]:
+    """Quantiles of the values counted on the grid, interpolated between
+    order statistics like ``numpy.quantile``'s default (linear) method."""
+    total = int(counts.sum())
+    if total == 0:
+        return [None] * len(levels)
+    cumulative = np.cumsum(counts)
+    out = []
+    for q in levels:
+        h = (total - 1) * q
+        lo, hi = int(np.floor(h)), int(np.ceil(h))
+        # Value of the r-th smallest answer (0-based) is the first grid point
+        # whose cumulative count exceeds r
+        v_lo = grid[np.searchsorted(cumulative, lo, side="right")]
+        v_hi = grid[np.searchsorted(cumulative, hi, side="right")]
+        out.append(float(v_lo + (h - lo) * (v_hi - v_lo)))
+    return out
+
+
+def _float(value) -> Optional[float]:
+    return float(value) if value is not None and np.isfinite(value) else None
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from stats_engine import SufficientStats, ols_from_stats
+
+
+# Small dense kernels for the analytics page. Everything is computed from a
+# covariance matrix (SufficientStats.cov/corr) or the sufficient statistics
+# behind it, so the cost is O(p^3) for p <= 11 variables whatever the number
+# of responses.
+
+
+def pca_from_cov(cov: np.ndarray, n: int) -> Dict[str, np.ndarray]:
+    """Principal components of the covariance matrix by eigen-decomposition.
+
+    Returns, for the first ``min(n, p)`` components (largest first):
+      - eigenvalues: component variances
+      - variance_ratio: share of the total variance (as sklearn's
+        ``explained_variance_ratio_`` on the raw rows)
+      - components: (k, p) unit eigenvectors, signed so that the largest
+        entry of each is positive
+      - loadings: (p, k) eigenvectors scaled by sqrt(eigenvalue), i.e. the
+        covariance of each variable with each component score
+    """
+    eigvals, eigvecs = np.linalg.eigh(cov)
+    order = np.argsort(eigvals)[::-1][: min(n, cov.shape[0])]
+    eigvals = np.clip(eigvals[order], 0.0, None)
+    vectors = eigvecs[:, order]
+    signs = np.sign(vectors[np.abs(vectors).argmax(axis=0), np.arange(vectors.shape[1])])
+    vectors = vectors * np.where(signs == 0, 1.0, signs)
+    total = np.trace(cov)
+    ratio = eigvals / total if total > 0 else np.full(len(eigvals), np.nan)
+    return {
+        "eigenvalues": eigvals,
+        "variance_ratio": ratio,
+        "components": vectors.T,
+        "loadings": vectors * np.sqrt(eigvals),
+    }
+
+
+def cronbach_alpha(cov: np.ndarray) -> float:
+    """Alpha = (k/(k-1)) * (1 - trace(C) / sum(C)) for item covariance C."""
+    k = cov.shape[0]
+    total_variance = cov.sum()
+    if k < 2 or not np.isfinite(total_variance) or total_variance <= 0:
+        return float("nan")
+    return float((k / (k - 1.0)) * (1.0 - np.trace(cov) / total_variance))
+
+
+def alpha_if_deleted(cov: np.ndarray) -> np.ndarray:
+    """Cronbach's alpha of the scale with each item left out in turn.
+
+    Dropping item i removes row and column i: the total variance loses
+    ``2 * rowsum_i - c_ii`` and the trace loses ``c_ii``, so all k values
+    come from one pass over the matrix.
+    """
+    k = cov.shape[0]
+    if k < 3:
+        return np.full(k, np.nan)
+    diag = np.diag(cov)
+    total = cov.sum() - 2.0 * cov.sum(axis=1) + diag
+    trace = np.trace(cov) - diag
+    m = k - 1.0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        alphas = (m / (m - 1.0)) * (1.0 - trace / total)
+    return np.where(np.isfinite(total) & (total > 0), alphas, np.nan)
+
+
+def regression_table(
+    stats: SufficientStats,
+    target: int,
+    predictors: Sequence[int],
+    names: Sequence[str],
+) -> str:
+    """Compact OLS summary of ``target`` on ``predictors`` (with intercept).
+
+    ``names`` labels the variables of ``stats`` by index. Shows fit
+    statistics and one line per coefficient with std. error, t, p and a 95%
+    confidence interval.
+    """
+    from scipy import special
+
+    model = ols_from_stats(stats, target, predictors)
+    df_resid = model["df_resid"]
+    df_model = len(predictors)
+    r2 = model["rsquared"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        f_value = (r2 / df_model) / ((1.0 - r2) / df_resid) if df_resid > 0 else float("nan")
+    f_pvalue = float(special.fdtrc(df_model, df_resid, f_value)) if df_resid > 0 else float("nan")
+    t_crit = float(special.stdtrit(df_resid, 0.975)) if df_resid > 0 else float("nan")
+
+    labels: List[str] = ["const"] + [names[i] for i in predictors]
+    width = 78
+    lines = [
+        f"OLS regression: {names[target]} ~ {' + '.join(labels)}",
+        "=" * width,
+        f"{'No. Observations:':<20}{model['nobs']:>12d}    {'R-squared:':<20}{r2:>12.4f}",
+        f"{'Df Residuals:':<20}{df_resid:>12d}    {'Adj. R-squared:':<20}{model['rsquared_adj']:>12.4f}",
+        f"{'Df Model:':<20}{df_model:>12d}    {'F-statistic:':<20}{f_value:>12.4g}",
+        f"{'Residual Std. Err.:':<20}{np.sqrt(model['mse_resid']):>12.4f}    {'Prob (F-statistic):':<20}{f_pvalue:>12.3g}",
+        "=" * width,
+        f"{'':<12}{'coef':>11}{'std err':>11}{'t':>11}{'P>|t|':>11}{'[0.025':>11}{'0.975]':>11}",
+        "-" * width,
+    ]
+    for label, coef, se, t, p in zip(labels, model["params"], model["bse"], model["tvalues"], model["pvalues"]):
+        lines.append(
+            f"{label[:12]:<12}{coef:>11.4f}{se:>11.3f}{t:>11.3f}{p:>11.3f}"
+            f"{coef - t_crit * se:>11.3f}{coef + t_crit * se:>11.3f}"
+        )
+    lines.append("=" * width)
+    return "\n".join(lines)
@@ -0,0 +1,156 @@
+"""Benchmark analytics_kernel against the pandas/sklearn/statsmodels code it replaced.
+
+For each dataset size the same generated responses are summarized both ways:
+
+  - reference: pandas corr/cov, sklearn PCA and Cronbach's alpha on the raw
+    rows, plus a statsmodels OLS ``summary()`` (the pre-kernel
+    v0_2_analytics implementation)
+  - kernel: SufficientStats over the answer columns, then corr/cov, eigen
+    PCA with loadings, alpha with item-deleted alphas and the regression
+    table from the covariance matrix
+  - kernel (incremental): the same, starting from the running statistics the
+    ResponseStore already keeps, i.e. what /api/analytics pays per rebuild
+
+Results are checked for agreement before timings are reported. The
+reference needs statsmodels and scikit-learn, which the app itself no longer
+uses (``pip install statsmodels scikit-learn``); ``--no-reference`` times
+the kernel alone without them.
+
+Usage:
+    python benchmarks/analytics_kernel.py [--sizes 1000,100000] [--repeat 5] [--json] [--no-reference]
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics_kernel import alpha_if_deleted, cronbach_alpha, pca_from_cov, regression_table  # noqa: E402
+from sample_generator import columns_to_records, generate_sample_columns  # noqa: E402
+from stats_engine import (  # noqa: E402
+    N_QUESTIONS,
+    QUESTION_COLUMNS,
+    VARIABLES,
+    SufficientStats,
+    design_rows,
+    ols_from_stats,
+)
+
+# Import name -> pip package, for the reference implementation only
+REFERENCE_PACKAGES = {"statsmodels": "statsmodels", "sklearn": "scikit-learn"}
+
+
+def reference(df):
+    import statsmodels.api as sm
+    from sklearn.decomposition import PCA
+
+    q = df[QUESTION_COLUMNS].dropna()
+    corr = q.corr(method="pearson").values
+    cov = q.cov().values
+    pca = PCA().fit(q.to_numpy(dtype=float))
+    items = q.to_numpy(dtype=float)
+    k = items.shape[1]
+    alpha = (k / (k - 1.0)) * (1.0 - items.var(axis=0, ddof=1).sum() / items.sum(axis=1).var(ddof=1))
+    X = sm.add_constant(q[QUESTION_COLUMNS[:-1]].to_numpy(dtype=float))
+    model = sm.OLS(q["q6"].to_numpy(dtype=float), X, hasconst=True).fit()
+    summary = model.summary().as_text()
+    return {"corr": corr, "cov": cov, "variance_ratio": pca.explained_variance_ratio_,
+            "alpha": alpha, "params": model.params, "summary": summary}
+
+
+def kernel(stats: SufficientStats):
+    idx = list(range(N_QUESTIONS))
+    cov = stats.cov(idx)
+    corr = stats.corr(idx)
+    pca = pca_from_cov(cov, stats.n)
+    alpha = cronbach_alpha(cov)
+    deleted = alpha_if_deleted(cov)
+    table = regression_table(stats, N_QUESTIONS - 1, idx[:-1], VARIABLES)
+    return {"corr": corr, "cov": cov, "variance_ratio": pca["variance_ratio"], "alpha": alpha,
+            "loadings": pca["loadings"], "alpha_if_deleted": deleted, "summary": table}
+
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def check(ref, new, stats: SufficientStats) -> None:
+    for key in ("corr", "cov", "variance_ratio"):
+        np.testing.assert_allclose(new[key], ref[key], rtol=1e-7, atol=1e-10, err_msg=key)
+    np.testing.assert_allclose(new["alpha"], ref["alpha"], rtol=1e-7)
+    params = ols_from_stats(stats, N_QUESTIONS - 1, list(range(N_QUESTIONS - 1)))["params"]
+    np.testing.assert_allclose(params, ref["params"], rtol=1e-6, atol=1e-10)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--no-reference", action="store_true",
+                        help="time the kernel only (no statsmodels/scikit-learn needed)")
+    args = parser.parse_args()
+    with_reference = not args.no_reference
+    missing = [pkg for name, pkg in REFERENCE_PACKAGES.items() if importlib.util.find_spec(name) is None]
+    if with_reference and missing:
+        parser.error(f"the reference implementation needs `pip install {' '.join(missing)}` "
+                     "(or pass --no-reference)")
+
+    import pandas as pd
+
+    # Warm up imports so they are not billed to the first measurement
+    answers, ages, timestamps, _ = generate_sample_columns(50, "correlated", seed=1)
+    kernel(SufficientStats.from_rows(design_rows(answers, ages)))
+    if with_reference:
+        reference(pd.DataFrame(columns_to_records(answers, ages, timestamps)))
+
+    results = []
+    for n in [int(s) for s in args.sizes.split(",")]:
+        answers, ages, timestamps, _ = generate_sample_columns(n, "correlated", seed=42)
+        stats = SufficientStats.from_rows(design_rows(answers, ages))
+        row = {
+            "n": n,
+            "reference_ms": None,
+            "kernel_ms": best_of(
+                lambda: kernel(SufficientStats.from_rows(design_rows(answers, ages))), args.repeat
+            ) * 1000.0,
+            "kernel_incremental_ms": best_of(lambda: kernel(stats.copy()), args.repeat) * 1000.0,
+            "speedup": None,
+            "speedup_incremental": None,
+        }
+        if with_reference:
+            df = pd.DataFrame(columns_to_records(answers, ages, timestamps))
+            check(reference(df), kernel(stats), stats)
+            row["reference_ms"] = best_of(lambda: reference(df), args.repeat) * 1000.0
+            row["speedup"] = row["reference_ms"] / row["kernel_ms"]
+            row["speedup_incremental"] = row["reference_ms"] / row["kernel_incremental_ms"]
+        results.append(row)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    if not with_reference:
+        print(f"{'n':>9} {'kernel':>12} {'incremental':>12}")
+        for r in results:
+            print(f"{r['n']:>9} {r['kernel_ms']:>10.2f}ms {r['kernel_incremental_ms']:>10.2f}ms")
+        return
+    print(f"{'n':>9} {'reference':>12} {'kernel':>12} {'incremental':>12} {'speedup':>9} {'incr.':>9}")
+    for r in results:
+        print(f"{r['n']:>9} {r['reference_ms']:>10.2f}ms {r['kernel_ms']:>10.2f}ms "
+              f"{r['kernel_incremental_ms']:>10.2f}ms {r['speedup']:>8.1f}x {r['speedup_incremental']:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
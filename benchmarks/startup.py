@@ -0,0 +1,122 @@
+"""Cold-start benchmark for the web process.
+
+Every run starts a fresh interpreter (as Passenger or uvicorn does when it
+spawns a worker) against a temporary data directory and measures:
+
+  - import_s: ``import main`` (app, storage and store load)
+  - first_submit_s: import plus the first POST /api/submit, served through
+    the ASGI interface without a network server
+  - total_s: wall time of the whole child process, interpreter start included
+  - heavy: which of pandas/scipy/statsmodels/sklearn got imported by then
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--rows 0] [--storage log|sqlite] [--json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+
+async def submit():
+    body = json.dumps({"timestamp": "2025-01-01T00:00:00", "age_group": "19-22",
+                       "q1": 0.1, "q2": 0.2, "q3": 0.3, "q4": 0.4, "q5": 0.5, "q6": 0.6}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": "/api/submit", "raw_path": b"/api/submit",
+        "root_path": "", "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await main.app(scope, receive, send)
+    return status[0]
+
+status = asyncio.run(submit())
+t2 = time.perf_counter()
+heavy = [m for m in ("pandas", "scipy", "statsmodels", "sklearn") if m in sys.modules]
+print(json.dumps({"import_s": t1 - t0, "first_submit_s": t2 - t0, "status": status, "heavy": heavy}))
+'''
+
+
+def seed(data_dir: str, rows: int) -> None:
+    """Write ``rows`` generated responses to the data directory's log."""
+    sys.path.insert(0, ROOT)
+    from sample_generator import columns_to_jsonl, generate_sample_columns
+
+    answers, ages, timestamps, _ = generate_sample_columns(rows, "normal", seed=0)
+    with open(os.path.join(data_dir, "survey-data.jsonl"), "w") as f:
+        f.write(columns_to_jsonl(answers, ages, timestamps))
+
+
+def run_once(data_dir: str, storage: str) -> dict:
+    env = dict(os.environ, SURVEYAI_DATA_DIR=data_dir, SURVEYAI_STORAGE=storage)
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    total = time.perf_counter() - started
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["total_s"] = total
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=0, help="responses in the log before start")
+    parser.add_argument("--storage", default="log", choices=("log", "sqlite"))
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as data_dir:
+            if args.rows:
+                seed(data_dir, args.rows)
+            results.append(run_once(data_dir, args.storage))
+
+    summary = {
+        key: {"median": statistics.median(r[key] for r in results), "max": max(r[key] for r in results)}
+        for key in ("import_s", "first_submit_s", "total_s")
+    }
+    summary["runs"] = args.runs
+    summary["rows"] = args.rows
+    summary["storage"] = args.storage
+    summary["heavy_modules"] = sorted({m for r in results for m in r["heavy"]})
+    summary["statuses"] = sorted({r["status"] for r in results})
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"{args.runs} cold starts, {args.rows} rows, {args.storage} storage")
+    for key in ("import_s", "first_submit_s", "total_s"):
+        print(f"  {key:<15} median {summary[key]['median'] * 1000:8.1f} ms   max {summary[key]['max'] * 1000:8.1f} ms")
+    print(f"  heavy modules loaded: {', '.join(summary['heavy_modules']) or 'none'}")
+    print(f"  submit status: {summary['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
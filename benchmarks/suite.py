@@ -0,0 +1,329 @@
+"""Benchmark and load-test suite for the survey API.
+
+For each dataset size a fresh process seeds a temporary data directory with
+generated responses (through the app's own bulk write path), then measures:
+
+  - micro: the analytics and storage functions the endpoints are built on
+    (``calculate_regression_models``, ``generate_analytics_payload``, KMO,
+    ``load_data``/``save_data``, the sample generator); median and min of
+    ``--repeat`` runs
+  - load: a mixed workload driven through the ASGI interface without a
+    network server. ``--concurrency`` clients send ``--requests`` requests in
+    total, ``--submit-ratio`` of them POST /api/submit and the rest reads
+    spread over the results endpoints. Reports p50/p99 latency per endpoint
+    and overall, throughput and status codes
+  - peak_rss_seeded_mb / peak_rss_mb: the process's peak resident set size
+    once the dataset is loaded, and at the end (the micro-benchmarks hold
+    a DataFrame and a list of dicts of the whole dataset)
+
+``--output`` writes the results as JSON; ``--baseline`` compares them with an
+earlier output and exits with status 1 when a timing got more than
+``--tolerance`` (default 25%) worse, so it can gate a change.
+
+Usage:
+    python benchmarks/suite.py [--sizes 1000,100000,1000000] [--storage log|sqlite|binary]
+        [--repeat 3] [--requests 2000] [--concurrency 16] [--submit-ratio 0.2]
+        [--output results.json] [--baseline results.json] [--tolerance 0.25] [--json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Reads are picked uniformly from these; submits go to /api/submit
+READ_PATHS = [
+    "/api/aggregates?bins=9&recent=10",
+    "/api/dashboard",
+    "/api/regression",
+    "/api/analytics",
+    "/api/responses?limit=100",
+]
+SEED_CHUNK = 100_000
+# Timings that moved by less than this are never reported as regressions
+# (sub-millisecond latencies jitter by more than any sensible tolerance)
+NOISE_FLOOR_MS = 1.0
+
+CHILD = r'''
+import asyncio, contextlib, io, json, random, statistics, sys, time
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+args = json.loads(sys.argv[1])
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0)
+
+def timed(fn, repeat):
+    fn()  # warm-up: lazy imports and caches are not billed to the first run
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"median_ms": statistics.median(times) * 1000.0, "min_ms": min(times) * 1000.0, "runs": repeat}
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))] * 1000.0 if values else None
+
+def summarize(latencies, elapsed=None):
+    out = {"count": len(latencies), "p50_ms": percentile(latencies, 0.50), "p99_ms": percentile(latencies, 0.99),
+           "max_ms": max(latencies) * 1000.0 if latencies else None}
+    if elapsed is not None:
+        out["throughput_rps"] = len(latencies) / elapsed if elapsed > 0 else None
+    return out
+
+async def request(app, method, target, body=b""):
+    path, _, query = target.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": query.encode(),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.Event().wait()  # a streaming response waits here until cancelled
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+async def load(app, requests, concurrency, submit_ratio, read_paths, seed):
+    rng = random.Random(seed)
+    plan = []
+    for i in range(requests):
+        if rng.random() < submit_ratio:
+            answers = {f"q{j}": round(rng.uniform(-1, 1), 2) for j in range(1, 7)}
+            record = {"timestamp": f"2030-01-01T00:00:{i % 60:02d}.{i % 1000:03d}Z",
+                      "age_group": rng.choice(["16-18", "19-22", "23-26", "27-40", "40+"]), **answers}
+            plan.append(("POST", "/api/submit", json.dumps(record).encode()))
+        else:
+            plan.append(("GET", rng.choice(read_paths), b""))
+    latencies = {}
+    statuses = {}
+    queue = iter(plan)
+
+    async def client():
+        for method, target, body in queue:
+            start = time.perf_counter()
+            status = await request(app, method, target, body)
+            latencies.setdefault(target, []).append(time.perf_counter() - start)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    everything = [t for values in latencies.values() for t in values]
+    return {
+        "requests": requests, "concurrency": concurrency, "submit_ratio": submit_ratio,
+        "elapsed_s": elapsed, "overall": summarize(everything, elapsed),
+        "endpoints": {target: summarize(values) for target, values in sorted(latencies.items())},
+        "statuses": statuses,
+    }
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import main
+    from factor_adequacy import kmo
+    from sample_generator import generate_sample_columns
+    from v0_2_analytics import generate_analytics_payload
+
+    n, repeat = args["n"], args["repeat"]
+    result = {"n": n}
+    start = time.perf_counter()
+    for offset in range(0, n, args["chunk"]):
+        answers, ages, timestamps, ts_ms = generate_sample_columns(min(args["chunk"], n - offset), "correlated", seed=offset)
+        main.append_samples(answers, ages, timestamps, ts_ms)
+    result["seed_s"] = time.perf_counter() - start
+    result["peak_rss_seeded_mb"] = peak_rss_mb()
+
+    store = main.response_store
+    stats = store.stats.copy()
+    frame = store.to_frame()
+    corr = stats.corr(list(range(6)))
+    data = main.load_data()
+    micro = {
+        "generate_sample_columns": timed(lambda: generate_sample_columns(n, "correlated", seed=1), repeat),
+        "calculate_regression_models": timed(lambda: main.calculate_regression_models(stats.copy()), repeat),
+        "calculate_regression_models[frame]": timed(lambda: main.calculate_regression_models(frame), repeat),
+        "generate_analytics_payload": timed(lambda: generate_analytics_payload(frame), repeat),
+        "generate_analytics_payload[stats]": timed(lambda: generate_analytics_payload(frame, stats.copy()), repeat),
+        "kmo": timed(lambda: kmo(corr), repeat),
+        "load_data": timed(main.load_data, repeat),
+        "save_data": timed(lambda: main.save_data(data), repeat),
+    }
+    del data, frame
+    main.sync_store()  # take the rewritten log back into the store before the load test
+    result["micro"] = micro
+
+    async def run_load():
+        # Warm the snapshots and caches, as a running server would have them
+        for target in args["read_paths"]:
+            await request(main.app, "GET", target)
+        return await load(main.app, args["requests"], args["concurrency"], args["submit_ratio"],
+                          args["read_paths"], args["seed"])
+
+    result["load"] = asyncio.run(run_load()) if args["requests"] else None
+    result["responses_after"] = store.count
+    result["peak_rss_mb"] = peak_rss_mb()
+print(json.dumps(result))
+'''
+
+
+def run_size(n: int, args: argparse.Namespace) -> dict:
+    """Seed ``n`` responses into a fresh data directory and benchmark them in a new process."""
+    child_args = {
+        "n": n,
+        "repeat": args.repeat,
+        "chunk": SEED_CHUNK,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "submit_ratio": args.submit_ratio,
+        "read_paths": READ_PATHS,
+        "seed": args.seed,
+    }
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(
+            os.environ,
+            SURVEYAI_DATA_DIR=data_dir,
+            SURVEYAI_STORAGE=args.storage,
+            # Measured runs should not include background checkpoint writes
+            SURVEYAI_CHECKPOINT_INTERVAL="0",
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD, json.dumps(child_args)],
+            cwd=ROOT, env=env, capture_output=True, text=True,
+        )
+    if out.returncode != 0:
+        sys.stderr.write(out.stderr)
+        raise SystemExit(f"benchmark child for n={n} failed with status {out.returncode}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def metrics(results: dict) -> dict:
+    """Flatten results into {name: (value, higher_is_better)} for comparison."""
+    flat = {}
+    for dataset in results["datasets"]:
+        n = dataset["n"]
+        for name, timing in dataset["micro"].items():
+            flat[f"n={n} micro {name} median_ms"] = (timing["median_ms"], False)
+        load = dataset.get("load")
+        if load:
+            flat[f"n={n} load p50_ms"] = (load["overall"]["p50_ms"], False)
+            flat[f"n={n} load p99_ms"] = (load["overall"]["p99_ms"], False)
+            flat[f"n={n} load throughput_rps"] = (load["overall"]["throughput_rps"], True)
+        for key in ("peak_rss_seeded_mb", "peak_rss_mb"):
+            if dataset.get(key) is not None:
+                flat[f"n={n} {key}"] = (dataset[key], False)
+    return flat
+
+
+def compare(current: dict, baseline: dict, tolerance: float):
+    """Rows of (metric, baseline, current, change, regressed) for metrics in both runs."""
+    rows = []
+    new, old = metrics(current), metrics(baseline)
+    for name, (value, higher_is_better) in new.items():
+        if name not in old or value is None or not old[name][0]:
+            continue
+        before = old[name][0]
+        change = value / before - 1.0
+        if higher_is_better:
+            regressed = change < -tolerance / (1.0 + tolerance)
+        else:
+            regressed = change > tolerance and not (name.endswith("_ms") and value - before < NOISE_FLOOR_MS)
+        rows.append((name, before, value, change, regressed))
+    return rows
+
+
+def print_results(results: dict) -> None:
+    print(f"storage={results['storage']}  python {results['python']}  {results['platform']}")
+    for dataset in results["datasets"]:
+        rss = [dataset.get(key) for key in ("peak_rss_seeded_mb", "peak_rss_mb")]
+        print(f"\nn={dataset['n']}  seeded in {dataset['seed_s']:.2f}s  peak RSS "
+              + ("n/a" if None in rss else f"{rss[0]:.0f} MB seeded, {rss[1]:.0f} MB at the end"))
+        for name, timing in dataset["micro"].items():
+            print(f"  {name:<38} median {timing['median_ms']:10.2f} ms   min {timing['min_ms']:10.2f} ms")
+        load = dataset.get("load")
+        if not load:
+            continue
+        overall = load["overall"]
+        print(f"  load: {load['requests']} requests, {load['concurrency']} clients, "
+              f"{load['submit_ratio']:.0%} submits: {overall['throughput_rps']:.0f} req/s, "
+              f"p50 {overall['p50_ms']:.2f} ms, p99 {overall['p99_ms']:.2f} ms, statuses {load['statuses']}")
+        for target, summary in load["endpoints"].items():
+            print(f"    {target:<36} {summary['count']:>6}  p50 {summary['p50_ms']:8.2f} ms  "
+                  f"p99 {summary['p99_ms']:8.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument("--storage", default="log", choices=("log", "sqlite", "binary"))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=2000, help="load-test requests per size (0 skips it)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--submit-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0, help="seed for the load-test request mix")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before failing")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "storage": args.storage,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "json")},
+        "datasets": [run_size(int(s), args) for s in args.sizes.split(",")],
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    rows = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare(results, json.load(f), args.tolerance)
+        results["comparison"] = [
+            {"metric": name, "baseline": before, "current": value, "change": change, "regressed": regressed}
+            for name, before, value, change, regressed in rows
+        ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+        if rows:
+            print(f"\ncompared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for name, before, value, change, regressed in rows:
+                flag = "  REGRESSION" if regressed else ""
+                print(f"  {name:<58} {before:10.2f} -> {value:10.2f}  {change:+7.1%}{flag}")
+    if any(row[4] for row in rows):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
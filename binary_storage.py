@@ -0,0 +1,457 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from response_store import ResponsePage, parse_timestamp_ms
+from stats_engine import AGE_GROUPS, NO_AGE, N_QUESTIONS, QUESTION_COLUMNS
+from storage import AppendLog
+
+
+# One response per 16-byte record: epoch microseconds, the six answers in
+# centi-units (-100..100), the age code (AGE_GROUPS index, NO_AGE for None)
+# and a kind byte. The file is a plain array of these, so it can be
+# memory-mapped as ``np.memmap(path, dtype=RECORD_DTYPE)``.
+RECORD_DTYPE = np.dtype([
+    ("ts_us", "<i8"),
+    ("q", "i1", (N_QUESTIONS,)),
+    ("age", "i1"),
+    ("kind", "u1"),
+])
+RECORD_SIZE = RECORD_DTYPE.itemsize
+
+# Kinds. A compact record remembers which of the two timestamp spellings in
+# use it came from, so the original string is rebuilt exactly:
+KIND_ISO_MS = 1   # "2025-10-22T12:00:00.123Z" (JavaScript toISOString)
+KIND_ISO_US = 2   # "2025-10-22T12:00:00.123456" (sample generator)
+# Anything that would not round-trip (other timestamp spellings, answers off
+# the 0.01 grid or missing, unknown age labels, extra keys) is kept verbatim
+# as JSON: a KIND_JSON record whose ts_us holds the byte length, followed by
+# KIND_PAYLOAD records carrying 15 bytes each. KIND_DELETE is a tombstone
+# with the deleted timestamp string as payload (same layout).
+KIND_JSON = 3
+KIND_DELETE = 4
+KIND_PAYLOAD = 5
+KIND_HEADER = 255
+PAYLOAD_BYTES = RECORD_SIZE - 1
+
+# First record of every file
+HEADER = b"SurveyAI-rec-v1" + bytes([KIND_HEADER])
+_KEYS = frozenset(("timestamp", "age_group") + tuple(QUESTION_COLUMNS))
+_AGE_CODES = {label: code for code, label in enumerate(AGE_GROUPS)}
+_AGE_CODES[None] = NO_AGE
+
+
+def encode_timestamp(value) -> Optional[Tuple[int, int]]:
+    """(epoch microseconds, kind) for a timestamp in one of the compact
+    spellings, or None when the string would not be rebuilt exactly."""
+    if not isinstance(value, str):
+        return None
+    if len(value) == 24 and value.endswith("Z"):
+        kind, text = KIND_ISO_MS, value[:-1]
+    elif len(value) == 26:
+        kind, text = KIND_ISO_US, value
+    else:
+        return None
+    try:
+        stamp = np.datetime64(text, "us")
+    except ValueError:
+        return None
+    if format_timestamps(np.array([stamp]), np.array([kind]))[0] != value:
+        return None
+    return int(stamp.astype(np.int64)), kind
+
+
+def format_timestamps(stamps: np.ndarray, kinds: np.ndarray) -> List[str]:
+    """Timestamp strings of compact records (datetime64[us] or int64 us)."""
+    stamps = np.asarray(stamps).astype("datetime64[us]")
+    out = np.empty(len(stamps), dtype=object)
+    ms = kinds == KIND_ISO_MS
+    if ms.any():
+        out[ms] = np.datetime_as_string(stamps[ms], unit="ms", timezone="UTC")
+    if not ms.all():
+        out[~ms] = np.datetime_as_string(stamps[~ms], unit="us")
+    return out.tolist()
+
+
+def _centi(value) -> Optional[int]:
+    """Answer as an int in -100..100 if ``value / 100`` gives it back exactly."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if not -1.0 <= value <= 1.0:
+        return None
+    c = round(value * 100)
+    return c if c / 100 == value else None
+
+
+def _compact(record: Dict) -> Optional[Tuple]:
+    """The compact record for ``record``, or None if it needs the JSON form."""
+    if not isinstance(record, dict) or record.keys() != _KEYS:
+        return None
+    stamp = encode_timestamp(record["timestamp"])
+    age = _AGE_CODES.get(record["age_group"]) if isinstance(record["age_group"], (str, type(None))) else None
+    if stamp is None or age is None:
+        return None
+    answers = tuple(_centi(record[col]) for col in QUESTION_COLUMNS)
+    if None in answers:
+        return None
+    return stamp[0], answers, age, stamp[1]
+
+
+def _escape(kind: int, payload: bytes) -> np.ndarray:
+    """A KIND_JSON/KIND_DELETE record followed by its payload records."""
+    m = -(-len(payload) // PAYLOAD_BYTES)
+    out = np.zeros(1 + m, dtype=RECORD_DTYPE)
+    out[0] = (len(payload), (0,) * N_QUESTIONS, 0, kind)
+    raw = out[1:].view(np.uint8).reshape(m, RECORD_SIZE)
+    padded = np.zeros(m * PAYLOAD_BYTES, dtype=np.uint8)
+    padded[: len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+    raw[:, :PAYLOAD_BYTES] = padded.reshape(m, PAYLOAD_BYTES)
+    raw[:, PAYLOAD_BYTES] = KIND_PAYLOAD
+    return out
+
+
+def encode_records(records: Sequence[Dict]) -> bytes:
+    """Encode records, compactly where they round-trip and as JSON otherwise."""
+    blocks: List[np.ndarray] = []
+    run: List[Tuple] = []
+    for record in records:
+        row = _compact(record)
+        if row is not None:
+            run.append(row)
+            continue
+        if run:
+            blocks.append(np.array(run, dtype=RECORD_DTYPE))
+            run = []
+        blocks.append(_escape(KIND_JSON, json.dumps(record, separators=(",", ":")).encode()))
+    if run:
+        blocks.append(np.array(run, dtype=RECORD_DTYPE))
+    return b"".join(block.tobytes() for block in blocks)
+
+
+def encode_columns(answers: np.ndarray, age_codes: np.ndarray, timestamps: List[str]) -> bytes:
+    """Vectorized ``encode_records`` for generated columns: answers (6, k) on
+    the 0.01 grid, AGE_GROUPS codes and sample-generator timestamps. Falls
+    back to the per-record path if any row does not fit that shape."""
+    k = len(timestamps)
+    out = np.zeros(k, dtype=RECORD_DTYPE)
+    centi = np.rint(answers * 100.0)
+    fits = bool(np.all(centi / 100.0 == answers)) and bool(np.all(np.abs(centi) <= 100))
+    if fits and k:
+        try:
+            stamps = np.array(timestamps, dtype="datetime64[us]")
+        except ValueError:
+            fits = False
+        else:
+            fits = np.datetime_as_string(stamps, unit="us").tolist() == list(timestamps)
+    if not fits:
+        lookup = list(AGE_GROUPS) + [None]
+        records = [
+            {"timestamp": ts, "age_group": lookup[code], **dict(zip(QUESTION_COLUMNS, row))}
+            for ts, code, row in zip(timestamps, np.asarray(age_codes).tolist(), answers.T.tolist())
+        ]
+        return encode_records(records)
+    out["ts_us"] = stamps.astype(np.int64)
+    out["q"] = centi.T.astype(np.int8)
+    out["age"] = age_codes
+    out["kind"] = KIND_ISO_US
+    return out.tobytes()
+
+
+def encode_delete(timestamp: str) -> bytes:
+    return _escape(KIND_DELETE, json.dumps(timestamp).encode()).tobytes()
+
+
+def _payload(rows: np.ndarray, i: int) -> bytes:
+    length = int(rows["ts_us"][i])
+    m = -(-length // PAYLOAD_BYTES)
+    raw = rows[i + 1: i + 1 + m].view(np.uint8).reshape(m, RECORD_SIZE)
+    return raw[:, :PAYLOAD_BYTES].tobytes()[:length]
+
+
+def _valid_prefix(rows: np.ndarray) -> Tuple[int, np.ndarray]:
+    """(number of intact records, indices of the escape records among them).
+
+    Stops at the first record that is not where the format allows it, and
+    never cuts an escape record from its payload (crash mid-append).
+    """
+    n = len(rows)
+    kinds = rows["kind"]
+    escapes = np.flatnonzero((kinds == KIND_JSON) | (kinds == KIND_DELETE))
+    spans = -(-rows["ts_us"][escapes] // PAYLOAD_BYTES)
+    ends = escapes + 1 + spans
+    # Payload ranges, marked with a difference array
+    covered = np.zeros(n + 1, dtype=np.int64)
+    ok = spans > 0
+    np.add.at(covered, escapes[ok] + 1, 1)
+    np.add.at(covered, np.minimum(ends[ok], n), -1)
+    payload = np.cumsum(covered[:-1]) > 0
+    valid = np.where(
+        payload, kinds == KIND_PAYLOAD,
+        (kinds == KIND_ISO_MS) | (kinds == KIND_ISO_US) | (kinds == KIND_JSON) | (kinds == KIND_DELETE),
+    )
+    valid[escapes[~ok]] = False
+    bad = np.flatnonzero(~valid)
+    good = int(bad[0]) if len(bad) else n
+    straddling = escapes[(escapes < good) & (ends > good)]
+    if len(straddling):
+        good = int(straddling[0])
+    return good, escapes[escapes < good]
+
+
+class BinaryLog(AppendLog):
+    """Append-only log of fixed 16-byte response records (see RECORD_DTYPE).
+
+    A drop-in for ``AppendLog`` (same locking, batched fsync, change
+    tracking and compaction, which it inherits) at about a tenth of the
+    size of the JSONL lines. Records that do not fit the compact layout are
+    stored as JSON inside the file, so every record reads back exactly as
+    written. ``load_page`` decodes the whole file into columns without
+    building a dict per response.
+
+    ``migrate`` is called once, when the file does not exist yet, to import
+    existing records (e.g. ``sqlite_storage.read_legacy``).
+    """
+
+    def __init__(self, path: str, migrate: Optional[Callable[[], List[Dict]]] = None, **kwargs) -> None:
+        super().__init__(path, **kwargs)
+        self.migrate = migrate
+
+    # ------------------------------------------------------------------
+    def load_page(self) -> ResponsePage:
+        """All live responses as columns (``seq`` is 0..n-1)."""
+        with self.locked():
+            self._migrate()
+            self._pending = []
+            page, _ = self._read_all()
+            return page
+
+    def append_many(self, records: List[Dict]) -> None:
+        if records:
+            self.append_encoded(encode_records(records), len(records))
+
+    def append_columns(self, answers: np.ndarray, age_codes: np.ndarray, timestamps: List[str]) -> None:
+        """Append generated columns (see ``encode_columns``)."""
+        if len(timestamps):
+            self.append_encoded(encode_columns(answers, age_codes, timestamps), len(timestamps))
+
+    def delete(self, timestamp: str, removed: int) -> None:
+        with self.locked():
+            self.append_encoded(encode_delete(timestamp), 1)
+            self._live -= 1 + removed
+            self._dead += 1 + removed
+            self._maybe_compact()
+
+    def rewrite(self, records: List[Dict]) -> None:
+        with self.locked():
+            self._migrated = True
+            self._close()
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(HEADER)
+                f.write(encode_records(records))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._fsync_dir()
+            self._seen(os.stat(self.path))
+            self._live, self._dead = len(records), 0
+            self._counted = True
+            self._unsynced = 0
+            self._last_fsync = time.monotonic()
+
+    # ------------------------------------------------------------------
+    def _open(self):
+        if self._fh is not None and os.fstat(self._fh.fileno()).st_ino != self._inode:
+            self._close()
+        if self._fh is None:
+            self._fh = open(self.path, "ab")
+            if self._fh.tell() == 0:
+                self._fh.write(HEADER)
+        return self._fh
+
+    def _migrate(self) -> None:
+        if self._migrated:
+            return
+        self._migrated = True
+        if os.path.exists(self.path) or self.migrate is None:
+            return
+        records = self.migrate()
+        print(f"Migrating {len(records)} records to {self.path}")
+        self.rewrite(records)
+
+    def _map(self, offset: int, size: int) -> np.ndarray:
+        """Records between byte ``offset`` and ``size`` (whole records only)."""
+        count = (size - offset) // RECORD_SIZE
+        if count <= 0:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        return np.memmap(self.path, dtype=RECORD_DTYPE, mode="r", offset=offset, shape=(count,))
+
+    def _truncate(self, offset: int) -> None:
+        print(f"Truncating torn tail of {self.path} at byte {offset}")
+        self._close()
+        with open(self.path, "r+b") as f:
+            f.truncate(offset)
+
+    def _read_all(self) -> Tuple[ResponsePage, Dict[int, Dict]]:
+        """Decode the whole file (caller holds ``locked()``): the live
+        responses as a page, plus the verbatim JSON records by page row."""
+        self._counted = True
+        empty = ResponsePage([], np.zeros(0, np.int8), list(AGE_GROUPS),
+                             np.zeros((N_QUESTIONS, 0)), np.zeros(0, np.int64), np.zeros(0, np.int64))
+        if not os.path.exists(self.path):
+            self._live, self._dead = 0, 0
+            self._inode, self._offset = None, 0
+            return empty, {}
+        size = os.path.getsize(self.path)
+        with open(self.path, "rb") as f:
+            head = f.read(RECORD_SIZE)
+        if size and head != HEADER:
+            raise RuntimeError(f"{self.path} is not a SurveyAI record file")
+        rows = self._map(RECORD_SIZE, size)
+        good, escapes = _valid_prefix(rows)
+        rows = np.array(rows[:good])
+        if RECORD_SIZE * (1 + good) < size:
+            self._truncate(RECORD_SIZE * (1 + good) if size else 0)
+        self._seen(os.stat(self.path))
+
+        kinds = rows["kind"]
+        compact = np.flatnonzero((kinds == KIND_ISO_MS) | (kinds == KIND_ISO_US))
+        json_rows: Dict[int, Dict] = {}
+        tombstones: Dict[str, int] = {}
+        for i in escapes.tolist():
+            value = json.loads(_payload(rows, i))
+            if kinds[i] == KIND_JSON:
+                json_rows[i] = value
+            else:
+                tombstones[value] = i  # the last one for a timestamp decides
+        n_json, n_deletes = len(json_rows), len(escapes) - len(json_rows)
+
+        # A compact record dies if a later tombstone spells its timestamp
+        alive = np.ones(len(compact), dtype=bool)
+        if tombstones:
+            keys, last = [], []
+            for ts, pos in tombstones.items():
+                stamp = encode_timestamp(ts)
+                if stamp is not None:
+                    keys.append(stamp[0] * 8 + stamp[1])
+                    last.append(pos)
+            if keys:
+                order = np.argsort(keys)
+                keys, last = np.array(keys)[order], np.array(last)[order]
+                row_keys = rows["ts_us"][compact] * 8 + kinds[compact]
+                at = np.minimum(np.searchsorted(keys, row_keys), len(keys) - 1)
+                alive = ~((keys[at] == row_keys) & (last[at] > compact))
+            json_rows = {
+                i: r for i, r in json_rows.items()
+                if not (isinstance(r, dict) and tombstones.get(r.get("timestamp"), -1) > i)
+            }
+        compact = compact[alive]
+        self._live = len(compact) + len(json_rows)
+        self._dead = (len(alive) - len(compact)) + (n_json - len(json_rows)) + n_deletes
+
+        live = rows[compact]
+        answers = live["q"].T.astype(np.float64) / 100.0
+        # int16: labels found in JSON records may outnumber the int8 codes
+        # (ResponseStore.from_page maps them down)
+        age_codes = live["age"].astype(np.int16)
+        timestamps = format_timestamps(live["ts_us"], live["kind"])
+        ts_ms = live["ts_us"] // 1000
+        labels = list(AGE_GROUPS)
+        verbatim: Dict[int, Dict] = {}
+        if json_rows:
+            # Slot the JSON records back in at their positions
+            positions = np.concatenate([compact, np.array(sorted(json_rows), dtype=np.int64)])
+            extra = [json_rows[i] for i in sorted(json_rows)]
+            answers = np.concatenate([answers, np.array(
+                [[_as_float(r.get(col) if isinstance(r, dict) else None) for r in extra] for col in QUESTION_COLUMNS],
+                dtype=np.float64,
+            ).reshape(N_QUESTIONS, len(extra))], axis=1)
+            extra_codes = []
+            for r in extra:
+                label = r.get("age_group") if isinstance(r, dict) else None
+                if label not in labels and label is not None:
+                    labels.append(label)
+                extra_codes.append(NO_AGE if label is None else labels.index(label))
+            age_codes = np.concatenate([age_codes, np.array(extra_codes, dtype=np.int16)])
+            extra_ts = [r.get("timestamp") if isinstance(r, dict) else None for r in extra]
+            timestamps = timestamps + extra_ts
+            ts_ms = np.concatenate([ts_ms, np.array([parse_timestamp_ms(ts) for ts in extra_ts], dtype=np.int64)])
+            order = np.argsort(positions, kind="stable")
+            answers, age_codes, ts_ms = answers[:, order], age_codes[order], ts_ms[order]
+            timestamps = [timestamps[i] for i in order.tolist()]
+            first_extra = len(compact)
+            verbatim = {row: extra[i - first_extra] for row, i in enumerate(order.tolist()) if i >= first_extra}
+        n = len(timestamps)
+        page = ResponsePage(timestamps, age_codes, labels, np.ascontiguousarray(answers), ts_ms, np.arange(n))
+        return page, verbatim
+
+    def _replay(self) -> List[Dict]:
+        page, verbatim = self._read_all()
+        records = page.records()
+        for row, record in verbatim.items():
+            records[row] = record
+        return records
+
+    def _catch_up(self) -> None:
+        if not self._counted:
+            return
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        if st is None or st.st_ino != self._inode or st.st_size < self._offset:
+            if st is None and self._inode is None:
+                return
+            self._close()
+            records = self._replay()
+            if self.track_changes:
+                self._pending = [("reset", records)]
+            return
+        if st.st_size == self._offset:
+            return
+
+        rows = np.array(self._map(self._offset, st.st_size))
+        good, escapes = _valid_prefix(rows)
+        rows = rows[:good]
+        kinds = rows["kind"]
+        compact = np.flatnonzero((kinds == KIND_ISO_MS) | (kinds == KIND_ISO_US))
+        lookup = list(AGE_GROUPS) + [None]
+        decoded = {
+            int(i): {
+                "timestamp": ts,
+                "age_group": lookup[code],
+                **dict(zip(QUESTION_COLUMNS, (q / 100.0).tolist())),
+            }
+            for i, ts, code, q in zip(
+                compact, format_timestamps(rows["ts_us"][compact], kinds[compact]),
+                rows["age"][compact].tolist(), rows["q"][compact],
+            )
+        }
+        ops: List[Tuple[int, Tuple]] = [(i, ("add", r)) for i, r in decoded.items()]
+        for i in escapes.tolist():
+            value = json.loads(_payload(rows, i))
+            ops.append((i, ("add", value) if kinds[i] == KIND_JSON else ("delete", value)))
+        ops.sort(key=lambda op: op[0])
+        for _, op in ops:
+            if op[0] == "add":
+                self._live += 1
+            else:
+                self._dead += 1
+            if self.track_changes:
+                self._pending.append(op)
+        self._offset += good * RECORD_SIZE
+        if self._offset < st.st_size:
+            self._truncate(self._offset)
+
+
+def _as_float(val) -> float:
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return math.nan
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from stats_engine import N_QUESTIONS
+
+
+# Upper bound for ?bootstrap=B
+MAX_REPLICATES = 10000
+# Upper bound for ?seed=; a small seed space lets cached results absorb repeats
+MAX_SEED = 100
+# Replicates per task. Fixed (not derived from the pool size) so that a given
+# seed always produces the same resamples, however many workers there are.
+SHARD_SIZE = 100
+# Memory for one batch of resampled rows (b, n, p) inside a worker
+BATCH_BYTES = 32 * 1024 * 1024
+
+
+def replicate_statistics(rows: np.ndarray, idx: np.ndarray, predictors: Sequence[int]) -> Dict[str, np.ndarray]:
+    """Statistics of a batch of bootstrap resamples.
+
+    ``rows`` is the (n, p) engine design matrix, ``idx`` a (b, n) matrix of
+    row indices (one resample per row). For every resample this computes the
+    question correlations, Cronbach's alpha, PCA variance ratios and the
+    betas of the six "question on everything else" regressions (questions
+    plus the age dummies in ``predictors``), all batched over b.
+    """
+    n = rows.shape[0]
+    sample = rows[idx]                                        # (b, n, p)
+    mean = sample.mean(axis=1)                                # (b, p)
+    sample -= mean[:, None, :]
+    m2 = np.matmul(sample.transpose(0, 2, 1), sample)         # (b, p, p)
+    del sample
+
+    cov = m2[:, :N_QUESTIONS, :N_QUESTIONS] / (n - 1)
+    sd = np.sqrt(np.diagonal(cov, axis1=1, axis2=2))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = np.clip(cov / (sd[:, :, None] * sd[:, None, :]), -1.0, 1.0)
+        total = cov.sum(axis=(1, 2))
+        trace = np.trace(cov, axis1=1, axis2=2)
+        k = float(N_QUESTIONS)
+        alpha = np.where(total > 0, (k / (k - 1.0)) * (1.0 - trace / total), np.nan)
+        eig = np.clip(np.linalg.eigvalsh(cov)[:, ::-1][:, : min(n, N_QUESTIONS)], 0.0, None)
+        pca = eig / trace[:, None]
+
+    # Leave-one-out regressions from the precision matrix (see
+    # stats_engine.loo_ols_from_stats); resamples whose Gram matrix is
+    # singular (e.g. an age group drawn zero times) give NaN betas
+    variables = list(range(N_QUESTIONS)) + list(predictors)
+    p = len(variables)
+    gram = m2[:, variables][:, :, variables]
+    ok = np.all(np.isfinite(gram), axis=(1, 2))
+    ok[ok] = np.linalg.cond(gram[ok]) < 1e12
+    prec = np.linalg.inv(np.where(ok[:, None, None], gram, np.eye(p)))
+    rows_t = prec[:, :N_QUESTIONS, :]                         # (b, T, p)
+    ptt = np.diagonal(prec, axis1=1, axis2=2)[:, :N_QUESTIONS]
+    others = ~np.eye(N_QUESTIONS, p, dtype=bool)
+    b = len(idx)
+    slopes = (-rows_t / ptt[:, :, None])[:, others].reshape(b, N_QUESTIONS, p - 1)
+    mean_v = mean[:, variables]
+    mean_x = np.broadcast_to(mean_v[:, None, :], (b, N_QUESTIONS, p))[:, others].reshape(b, N_QUESTIONS, p - 1)
+    intercept = mean_v[:, :N_QUESTIONS] - (slopes * mean_x).sum(axis=2)
+    betas = np.concatenate([intercept[:, :, None], slopes], axis=2)
+    betas[~ok] = np.nan
+
+    return {"corr": corr, "alpha": alpha, "pca": pca, "beta": betas}
+
+
+def run_shard(path: str, predictors: List[int], count: int, seed: np.random.SeedSequence,
+              deadline: float) -> Dict[str, np.ndarray]:
+    """Process-pool task: ``count`` resamples of the rows saved at ``path``,
+    stopping early once ``deadline`` (wall clock) has passed."""
+    rows = np.load(path, mmap_mode="r")
+    n, p = rows.shape
+    rng = np.random.default_rng(seed)
+    batch = max(1, min(count, BATCH_BYTES // max(n * p * 8, 1)))
+    parts: List[Dict[str, np.ndarray]] = []
+    done = 0
+    while done < count and time.time() < deadline:
+        b = min(batch, count - done)
+        idx = rng.integers(0, n, size=(b, n))
+        parts.append(replicate_statistics(rows, idx, predictors))
+        done += b
+    if not parts:
+        return {}
+    return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+
+def _listify(values: np.ndarray) -> list:
+    """Array to nested lists with NaN/inf as None (JSON null)."""
+    return np.where(np.isfinite(values), values, None).tolist()
+
+
+def _interval(values: np.ndarray, confidence: float) -> Dict[str, list]:
+    """Percentile interval and bootstrap standard error along axis 0."""
+    tail = (1.0 - confidence) / 2.0 * 100.0
+    with warnings.catch_warnings(), np.errstate(invalid="ignore"):
+        # All-NaN slices (e.g. a constant question) stay NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        lower, upper = np.nanpercentile(values, [tail, 100.0 - tail], axis=0)
+        se = np.nanstd(values, axis=0, ddof=1)
+    return {"lower": _listify(lower), "upper": _listify(upper), "se": _listify(se)}
+
+
+class BootstrapBusy(RuntimeError):
+    """Raised by ``BootstrapPool.reserve`` when the pool is already running
+    its maximum number of bootstrap requests."""
+
+
+class BootstrapPool:
+    """Percentile bootstrap on a process pool.
+
+    Resamples are drawn as batched index matrices and split into shards of
+    ``SHARD_SIZE``; shard i draws from child i of ``SeedSequence(seed)``, so
+    results are reproducible for a seed. Shards run on a spawn-based process
+    pool (the rows are shared through a temporary memory-mapped .npy file)
+    and stop when ``budget`` seconds have passed; the payload then says how
+    many replicates made it.
+
+    ``run`` is a coroutine: the event loop awaits the shard futures, so no
+    thread is held while the processes work. Callers take a slot with
+    ``reserve()`` first; at most ``max_requests`` requests run at once and
+    the next one gets ``BootstrapBusy`` instead of queueing.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_requests: int = 2) -> None:
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_requests = max_requests
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @contextlib.contextmanager
+    def reserve(self) -> Iterator[None]:
+        """Hold one of the ``max_requests`` slots (event loop only)."""
+        if self.active >= self.max_requests:
+            self.rejected += 1
+            raise BootstrapBusy(f"{self.active} bootstrap requests already running")
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+
+    async def run(
+        self,
+        rows: np.ndarray,
+        predictors: Sequence[int],
+        replicates: int,
+        seed: int = 0,
+        confidence: float = 0.95,
+        budget: float = 10.0,
+    ) -> Dict:
+        started = time.time()
+        deadline = started + budget
+        shards = -(-replicates // SHARD_SIZE)
+        seeds = np.random.SeedSequence(seed).spawn(shards)
+        counts = [min(SHARD_SIZE, replicates - i * SHARD_SIZE) for i in range(shards)]
+
+        path = await asyncio.to_thread(_save_rows, rows)
+        try:
+            executor = self._pool()
+            futures = [
+                executor.submit(run_shard, path, list(predictors), count, child, deadline)
+                for count, child in zip(counts, seeds)
+            ]
+            results = await asyncio.gather(*map(asyncio.wrap_future, futures))
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool next time
+            self.shutdown()
+            raise
+        finally:
+            os.unlink(path)
+
+        summary = await asyncio.to_thread(
+            _summarize, results, rows.shape[0], len(predictors), replicates, seed, confidence, started
+        )
+        self.completed += 1
+        return summary
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.max_workers,
+            "max_requests": self.max_requests,
+            "active": self.active,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: the web process has threads (and locks) running
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+
+def _save_rows(rows: np.ndarray) -> str:
+    """Write ``rows`` to a temporary .npy file for the shards to memory-map."""
+    fd, path = tempfile.mkstemp(suffix=".npy", prefix="surveyai-bootstrap-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, np.ascontiguousarray(rows, dtype=np.float64))
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+def _summarize(results: List[Dict[str, np.ndarray]], n: int, n_predictors: int, replicates: int,
+               seed: int, confidence: float, started: float) -> Dict:
+    results = [r for r in results if r]
+    done = sum(len(r["alpha"]) for r in results)
+    summary: Dict = {
+        "requested": replicates,
+        "replicates": done,
+        "truncated": done < replicates,
+        "seed": seed,
+        "confidence": confidence,
+        "method": "percentile",
+        "elapsed_ms": (time.time() - started) * 1000.0,
+    }
+    if done < 2:
+        return summary
+    merged = {key: np.concatenate([r[key] for r in results]) for key in results[0]}
+    summary["corr_matrix"] = _interval(merged["corr"], confidence)
+    summary["cronbach_alpha"] = _interval(merged["alpha"], confidence)
+    summary["pca_variance"] = _interval(merged["pca"], confidence)
+    # Same model layout as main.calculate_regression_models: target t on
+    # [const, other questions, age dummies], with the same minimum row count
+    if n >= N_QUESTIONS + n_predictors + 1:
+        beta = _interval(merged["beta"], confidence)
+        summary["regression"] = [
+            {
+                "targetQuestion": f"Question {t + 1}",
+                "targetIdx": t,
+                "beta_lower": beta["lower"][t],
+                "beta_upper": beta["upper"][t],
+                "beta_se": beta["se"][t],
+            }
+            for t in range(N_QUESTIONS)
+        ]
+    else:
+        summary["regression"] = []
+    return summary
@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from aggregates import AnswerAggregates
+from response_store import ResponsePage, ResponseStore
+from stats_engine import SufficientStats
+from timeline import TimeBuckets
+
+
+# A checkpoint is one .npz file (no pickles) holding the store's columns, its
+# running statistics (overall, per age code, per hour, histograms), the
+# dataset version and the log cursor they correspond to. Starting from it
+# costs a few array reads; only the writes made after the cursor are
+# replayed from the log.
+FORMAT = 1
+AGGREGATE_ARRAYS = ("counts", "n", "sum", "sum_sq", "off_grid", "age_counts")
+
+
+def capture(store: ResponseStore) -> Dict:
+    """Copy the store's columns and running statistics (under its lock).
+
+    Timestamps are copied as a list of references; encoding them is left to
+    ``write_checkpoint`` so the lock is only held for the array copies.
+    """
+    with store.lock:
+        timeline, aggregates = store.timeline, store.aggregates
+        return {
+            "version": store.version,
+            "next_seq": store.next_seq,
+            "age_labels": list(store.age_labels),
+            "timestamps": list(store.timestamps),
+            "questions": store.questions.copy(),
+            "age_codes": store.age_codes.copy(),
+            "ts_ms": store.ts_ms.copy(),
+            "seq": store.seq.copy(),
+            "stats": store.stats.copy(),
+            "group_stats": {code: s.copy() for code, s in store.group_stats.items()},
+            "timeline": [timeline.keys.copy(), timeline.n.copy(), timeline.mean.copy(), timeline.m2.copy()],
+            "aggregates": {name: getattr(aggregates, name).copy() for name in AGGREGATE_ARRAYS},
+            "no_age": aggregates.no_age,
+            "responses": aggregates.responses,
+        }
+
+
+def write_checkpoint(path: str, state: Dict, cursor: Dict, source: str) -> int:
+    """Atomically replace ``path`` with a checkpoint of ``state`` (from
+    ``capture``) taken at log position ``cursor``; returns its size in bytes."""
+    timestamps = state["timestamps"]
+    encoded = [b"" if ts is None else ts.encode("utf-8") for ts in timestamps]
+    stats, groups = state["stats"], state["group_stats"]
+    codes = sorted(groups)
+    p = stats.p
+    meta = {
+        "format": FORMAT,
+        "source": source,
+        "cursor": cursor,
+        "created_at": time.time(),
+        "version": state["version"],
+        "next_seq": state["next_seq"],
+        "age_labels": state["age_labels"],
+        "n": len(timestamps),
+        "stats_n": stats.n,
+        "no_age": state["no_age"],
+        "responses": state["responses"],
+    }
+    arrays = {
+        "meta": np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+        "questions": state["questions"],
+        "age_codes": state["age_codes"],
+        "ts_ms": state["ts_ms"],
+        "seq": state["seq"],
+        "ts_text": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "ts_len": np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)),
+        "ts_missing": np.fromiter((ts is None for ts in timestamps), dtype=bool, count=len(timestamps)),
+        "stats_mean": stats.mean,
+        "stats_m2": stats.m2,
+        "group_codes": np.array(codes, dtype=np.int64),
+        "group_n": np.array([groups[c].n for c in codes], dtype=np.int64),
+        "group_mean": np.array([groups[c].mean for c in codes]).reshape(len(codes), p),
+        "group_m2": np.array([groups[c].m2 for c in codes]).reshape(len(codes), p, p),
+    }
+    arrays.update(zip(("timeline_keys", "timeline_n", "timeline_mean", "timeline_m2"), state["timeline"]))
+    arrays.update({f"agg_{name}": values for name, values in state["aggregates"].items()})
+
+    # Written next to the target and renamed over it, so a reader never sees
+    # a partial file and a crash leaves the previous checkpoint in place
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                               dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return size
+
+
+def read_checkpoint(path: str, source: str) -> Optional[Tuple[ResponseStore, Dict]]:
+    """(store, meta) from the checkpoint at ``path``, or None when there is
+    none or it is unreadable or was written for another log. ``meta["cursor"]``
+    is the log position to continue from."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(data["meta"].tobytes())
+            if meta.get("format") != FORMAT or meta.get("source") != source:
+                print(f"Ignoring checkpoint {path}: written for {meta.get('source')} (format {meta.get('format')})")
+                return None
+            store = _rebuild(meta, data)
+    except Exception as e:
+        print(f"Ignoring unreadable checkpoint {path}: {e}")
+        return None
+    return store, meta
+
+
+def _rebuild(meta: Dict, data) -> ResponseStore:
+    n = meta["n"]
+    seq = data["seq"]
+    if len(seq) != n:
+        raise ValueError(f"expected {n} rows, found {len(seq)}")
+    page = ResponsePage(
+        timestamps=_decode_timestamps(data["ts_text"], data["ts_len"], data["ts_missing"]),
+        age_codes=data["age_codes"],
+        age_labels=meta["age_labels"],
+        questions=data["questions"],
+        ts_ms=data["ts_ms"],
+        seq=seq,
+    )
+    stats = _stats(meta["stats_n"], data["stats_mean"], data["stats_m2"])
+    # A checkpoint taken after an overflowing answer, or whose stats disagree
+    # with its columns, would be served as-is; rebuild from the log instead.
+    if not stats.is_finite():
+        raise ValueError("statistics are not finite")
+    complete = int(np.isfinite(page.questions).all(axis=0).sum())
+    if stats.n != complete:
+        raise ValueError(f"statistics cover {stats.n} rows, columns hold {complete} complete rows")
+    group_stats = {
+        int(code): _stats(int(k), mean, m2)
+        for code, k, mean, m2 in zip(data["group_codes"], data["group_n"], data["group_mean"], data["group_m2"])
+    }
+    timeline = TimeBuckets(stats.p)
+    timeline.keys, timeline.n = data["timeline_keys"], data["timeline_n"]
+    timeline.mean, timeline.m2 = data["timeline_mean"], data["timeline_m2"]
+    aggregates = AnswerAggregates()
+    for name in AGGREGATE_ARRAYS:
+        setattr(aggregates, name, data[f"agg_{name}"])
+    aggregates.no_age, aggregates.responses = meta["no_age"], meta["responses"]
+    return ResponseStore.from_state(
+        page, meta["next_seq"], meta["version"], stats, group_stats, timeline, aggregates,
+    )
+
+
+def _stats(n: int, mean: np.ndarray, m2: np.ndarray) -> SufficientStats:
+    stats = SufficientStats(len(mean))
+    stats.n, stats.mean, stats.m2 = n, np.array(mean, dtype=np.float64), np.array(m2, dtype=np.float64)
+    return stats
+
+
+def _decode_timestamps(text: np.ndarray, lengths: np.ndarray, missing: np.ndarray) -> list:
+    raw = text.tobytes()
+    ends = np.cumsum(lengths).tolist()
+    starts = [0] + ends[:-1]
+    decoded = raw.decode("utf-8")
+    # ISO timestamps are ASCII, where byte offsets are character offsets
+    source = decoded if len(decoded) == len(raw) else raw
+    timestamps = [source[a:b] for a, b in zip(starts, ends)]
+    if source is raw:
+        timestamps = [ts.decode("utf-8") for ts in timestamps]
+    if missing.any():
+        for i in np.flatnonzero(missing).tolist():
+            timestamps[i] = None
+    return timestamps
+
+
+class CheckpointWriter:
+    """Background checkpoints of the response store, after writes.
+
+    ``notify()`` (from the event loop, after a write) wakes the worker, which
+    writes at most one checkpoint per ``interval`` seconds, covering every
+    write made until it starts. ``capture`` returns (state, log cursor)
+    taken together and runs on ``run_capture`` (the write serializer), so no
+    write is half applied; encoding and writing the file run on
+    ``run_write``. A checkpoint another worker process wrote less than
+    ``interval`` seconds ago counts as this process's own.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        source: str,
+        capture: Callable[[], Tuple[Dict, Dict]],
+        version: Callable[[], int],
+        run_capture: Callable[..., Awaitable],
+        run_write: Callable[..., Awaitable],
+        interval: float = 300.0,
+        written_at: float = float("-inf"),
+        written_version: Optional[int] = None,
+    ) -> None:
+        self.path = path
+        self.source = source
+        self.capture = capture
+        self.version = version
+        self.run_capture = run_capture
+        self.run_write = run_write
+        self.interval = interval
+        self.written_at = written_at
+        self.written_version = written_version
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.writes = 0
+        self.failures = 0
+        self.last_duration = None
+        self.last_bytes = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def notify(self) -> None:
+        """Schedule a checkpoint (call from the event loop after a write)."""
+        if not self.enabled:
+            return
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._task = None
+        if self._task is None:
+            self._task = loop.create_task(self._worker())
+        self._wake.set()
+
+    def save(self) -> None:
+        """Write a checkpoint now, unless the last one is current (blocking;
+        for shutdown)."""
+        if not self.enabled or self.version() == self.written_version:
+            return
+        try:
+            state, cursor = self.capture()
+            self._write(state, cursor)
+        except Exception as e:
+            self.failures += 1
+            print(f"Checkpoint failed: {e}")
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "interval_s": self.interval,
+            "writes": self.writes,
+            "failures": self.failures,
+            "version": self.written_version,
+            "written_at": None if self.written_at == float("-inf") else self.written_at,
+            "last_duration_ms": None if self.last_duration is None else self.last_duration * 1000.0,
+            "last_bytes": self.last_bytes,
+        }
+
+    # ------------------------------------------------------------------
+    async def _worker(self) -> None:
+        while True:
+            await self._wake.wait()
+            delay = self.written_at + self.interval - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            if self._written_elsewhere():
+                continue
+            # Everything written up to here is covered by this checkpoint
+            self._wake.clear()
+            if self.version() == self.written_version:
+                continue
+            try:
+                state, cursor = await self.run_capture(self.capture)
+                await self.run_write(self._write, state, cursor)
+            except Exception as e:
+                self.failures += 1
+                self.written_at = time.time()  # retry after a full interval
+                print(f"Checkpoint failed: {e}")
+
+    def _written_elsewhere(self) -> bool:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        if mtime > self.written_at and time.time() - mtime < self.interval:
+            self.written_at = mtime
+            return True
+        return False
+
+    def _write(self, state: Dict, cursor: Dict) -> None:
+        started = time.perf_counter()
+        self.last_bytes = write_checkpoint(self.path, state, cursor, self.source)
+        self.last_duration = time.perf_counter() - started
+        self.written_at = time.time()
+        self.written_version = state["version"]
+        self.writes += 1
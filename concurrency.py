@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+
+T = TypeVar("T")
+
+
+class QueueMetrics:
+    """Depth and wait-time counters for a queue of blocking jobs."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def enqueued(self) -> float:
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+        return time.perf_counter()
+
+    def started(self, enqueued_at: float) -> float:
+        now = time.perf_counter()
+        wait = now - enqueued_at
+        with self._lock:
+            self.waiting -= 1
+            self.running += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        return now
+
+    def finished(self, started_at: float, ok: bool) -> None:
+        elapsed = time.perf_counter() - started_at
+        with self._lock:
+            self.running -= 1
+            self.total_run += elapsed
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            done = self.completed + self.failed
+            return {
+                "queue_depth": self.waiting,
+                "running": self.running,
+                "max_queue_depth": self.max_waiting,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_wait_ms": (self.total_wait / done * 1000.0) if done else None,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "avg_run_ms": (self.total_run / done * 1000.0) if done else None,
+            }
+
+
+class WriteSerializer:
+    """Single-writer gate for mutations.
+
+    Callers queue on an asyncio.Lock so that only one mutation (submit,
+    reminder, delete, clear, generate) runs at a time; the blocking file
+    I/O itself runs in a worker thread so the event loop keeps serving
+    reads while a write is in progress.
+    """
+
+    def __init__(self) -> None:
+        self._lock: Optional[asyncio.Lock] = None
+        self.metrics = QueueMetrics()
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        enqueued_at = self.metrics.enqueued()
+        async with self._lock:
+            started_at = self.metrics.started(enqueued_at)
+            ok = False
+            try:
+                result = await run_in_threadpool(fn, *args)
+                ok = True
+                return result
+            finally:
+                self.metrics.finished(started_at, ok)
+
+
+class AnalyticsPool:
+    """Bounded thread pool for heavy read-side computation.
+
+    NumPy/SciPy release the GIL inside their kernels, so a few threads are
+    enough to keep analytics requests from blocking the event loop (and
+    each other) without oversubscribing the CPU.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None) -> None:
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.metrics = QueueMetrics()
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="analytics"
+            )
+        enqueued_at = self.metrics.enqueued()
+
+        def job():
+            started_at = self.metrics.started(enqueued_at)
+            ok = False
+            try:
+                result = fn(*args)
+                ok = True
+                return result
+            finally:
+                self.metrics.finished(started_at, ok)
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import io
+import json
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from response_store import MISSING_TS, ResponsePage, ResponseStore, parse_timestamp_ms
+from stats_engine import QUESTION_COLUMNS
+
+
+STREAM_FORMATS = ("json", "ndjson")
+# Columnar formats are built in one go from the column arrays
+BINARY_FORMATS = ("arrow", "parquet", "npz")
+EXPORT_FORMATS = STREAM_FORMATS + BINARY_FORMATS
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.file",
+    "parquet": "application/vnd.apache.parquet",
+    "npz": "application/octet-stream",
+}
+FILE_EXTENSIONS = {
+    "arrow": "arrow",
+    "parquet": "parquet",
+    "npz": "npz",
+}
+CHUNK_ROWS = 1000
+
+
+def select_page(
+    store: ResponseStore,
+    since: Optional[str] = None,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> Tuple[ResponsePage, Optional[int]]:
+    """Pick the rows for one export page and copy them out of the store.
+
+    ``since`` keeps responses at or after an ISO timestamp, ``cursor`` keeps
+    rows after the given sequence number (the ``next_cursor`` of the previous
+    page) and ``limit`` (>= 1) caps the page size. Returns the page and the cursor
+    for the next page, or None when this is the last one.
+
+    The store lock is only held while selecting and copying, so encoding
+    the page never blocks writers.
+    """
+    with store.lock:
+        if since is None and cursor is None and (limit is None or limit >= store.count):
+            return store.copy_page(), None
+
+        mask = np.ones(store.count, dtype=bool)
+        if since is not None:
+            since_ms = parse_timestamp_ms(since)
+            if since_ms == MISSING_TS:
+                raise ValueError(f"Invalid 'since' timestamp: {since!r}")
+            mask &= store.ts_ms >= since_ms
+        if cursor is not None:
+            mask &= store.seq > cursor
+        idx = np.flatnonzero(mask)
+
+        next_cursor = None
+        if limit is not None and len(idx) > limit:
+            idx = idx[:limit]
+            next_cursor = int(store.seq[idx[-1]])
+        return store.page(idx), next_cursor
+
+
+def _encode(record) -> str:
+    return json.dumps(record, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+
+
+def iter_ndjson(page: ResponsePage, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """One JSON object per line, yielded ``chunk_rows`` records at a time."""
+    for start in range(0, len(page), chunk_rows):
+        lines = [_encode(r) for r in page.records(start, start + chunk_rows)]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def iter_json_array(page: ResponsePage, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """A single JSON array, streamed ``chunk_rows`` records at a time."""
+    yield b"["
+    for start in range(0, len(page), chunk_rows):
+        body = ",".join(_encode(r) for r in page.records(start, start + chunk_rows))
+        yield ((b"," if start else b"") + body.encode("utf-8"))
+    yield b"]"
+
+
+def iter_export(page: ResponsePage, fmt: str) -> Iterator[bytes]:
+    if fmt == "ndjson":
+        return iter_ndjson(page)
+    return iter_json_array(page)
+
+
+def build_npz(page: ResponsePage) -> bytes:
+    """NumPy archive: float32 q-columns, categorical age, epoch-ms timestamps.
+
+    ``age_code`` indexes ``age_categories`` (-1 = missing); ``timestamp_ms``
+    uses int64 min for timestamps that could not be parsed.
+    """
+    buf = io.BytesIO()
+    arrays = {col: page.questions[j].astype(np.float32) for j, col in enumerate(QUESTION_COLUMNS)}
+    np.savez(
+        buf,
+        **arrays,
+        age_code=np.asarray(page.age_codes, dtype=np.int8),
+        age_categories=np.array(page.age_labels, dtype=str),
+        timestamp_ms=np.asarray(page.ts_ms, dtype=np.int64),
+        seq=np.asarray(page.seq, dtype=np.int64),
+    )
+    return buf.getvalue()
+
+
+def build_arrow_table(page: ResponsePage):
+    """Arrow table over the page columns.
+
+    Question columns wrap the store's contiguous float64 rows without
+    copying; age is a dictionary-encoded column over the int8 codes.
+    """
+    import pyarrow as pa
+
+    codes = np.asarray(page.age_codes, dtype=np.int8)
+    ts_ms = np.asarray(page.ts_ms, dtype=np.int64)
+    age = pa.DictionaryArray.from_arrays(
+        pa.array(codes, mask=codes < 0),
+        pa.array(page.age_labels, type=pa.string()),
+    )
+    columns = {
+        "timestamp": pa.array(page.timestamps, type=pa.string()),
+        "timestamp_ms": pa.array(ts_ms, type=pa.timestamp("ms", tz="UTC"), mask=ts_ms == MISSING_TS),
+        "age_group": age,
+    }
+    for j, col in enumerate(QUESTION_COLUMNS):
+        columns[col] = pa.array(np.ascontiguousarray(page.questions[j]))
+    return pa.table(columns)
+
+
+def build_binary_export(page: ResponsePage, fmt: str) -> bytes:
+    """Serialize a page as Arrow IPC (Feather v2), Parquet or NPZ.
+
+    Arrow and Parquet need the optional ``pyarrow`` package and raise
+    ImportError without it.
+    """
+    if fmt == "npz":
+        return build_npz(page)
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ImportError(f"The '{fmt}' export needs pyarrow (pip install pyarrow)") from exc
+
+    table = build_arrow_table(page)
+    sink = pa.BufferOutputStream()
+    if fmt == "parquet":
+        pq.write_table(table, sink)
+    else:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
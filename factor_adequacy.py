@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from typing import Dict
+
+import numpy as np
+
+
+# Factor-analysis adequacy checks on a correlation matrix of any width
+# (questions alone, or questions plus age dummies). Everything is whole-
+# matrix NumPy: one inversion for the anti-image, one log-determinant for
+# Bartlett's test.
+
+
+def partial_correlations(corr: np.ndarray) -> np.ndarray:
+    """Partial correlation of each pair given all other variables.
+
+    p_ij = -P_ij / sqrt(P_ii * P_jj) with P the inverse of the (symmetrized)
+    correlation matrix; a tiny ridge is added when it is singular. The
+    diagonal is 1.
+    """
+    C = np.asarray(corr, dtype=float)
+    C = (C + C.T) / 2.0
+    k = C.shape[0]
+    try:
+        P = np.linalg.inv(C)
+    except np.linalg.LinAlgError:
+        P = np.linalg.inv(C + 1e-8 * np.eye(k))
+    d = np.diag(P)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        denom = np.sqrt(np.outer(d, d))
+        # NaN (not 0) when the diagonal is negative, i.e. R is not positive definite
+        partial = np.where(denom <= 0, 0.0, -P / denom)
+    np.fill_diagonal(partial, 1.0)
+    return partial
+
+
+def kmo(corr: np.ndarray) -> Dict[str, object]:
+    """Kaiser-Meyer-Olkin measure of sampling adequacy.
+
+    Overall KMO = sum(r_ij^2) / (sum(r_ij^2) + sum(p_ij^2)) over i != j;
+    the per-item MSA restricts both sums to the item's own row.
+    """
+    C = np.asarray(corr, dtype=float)
+    C = (C + C.T) / 2.0
+    k = C.shape[0]
+    if k < 2:
+        return {"kmo": float("nan"), "msa": np.full(k, np.nan)}
+    off = ~np.eye(k, dtype=bool)
+    r2 = np.where(off, C ** 2, 0.0)
+    p2 = np.where(off, partial_correlations(C) ** 2, 0.0)
+
+    r2_rows, p2_rows = r2.sum(axis=1), p2.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        msa = np.where(r2_rows + p2_rows > 0, r2_rows / (r2_rows + p2_rows), np.nan)
+    r2_sum, p2_sum = r2_rows.sum(), p2_rows.sum()
+    overall = r2_sum / (r2_sum + p2_sum) if r2_sum + p2_sum > 0 else float("nan")
+    return {"kmo": float(overall), "msa": msa}
+
+
+def bartlett_sphericity(corr: np.ndarray, n: int) -> Dict[str, float]:
+    """Bartlett's test that the correlation matrix is the identity.
+
+    chi2 = -(n - 1 - (2p + 5) / 6) * ln|R| with p(p - 1)/2 degrees of
+    freedom. NaN when R is not positive definite or n is too small.
+    """
+    from scipy import special
+
+    C = np.asarray(corr, dtype=float)
+    p = C.shape[0]
+    df = p * (p - 1) // 2
+    sign, logdet = np.linalg.slogdet(C) if np.all(np.isfinite(C)) else (0.0, float("nan"))
+    factor = n - 1 - (2.0 * p + 5.0) / 6.0
+    if sign <= 0 or factor <= 0 or df == 0:
+        return {"chi2": float("nan"), "df": df, "p_value": float("nan")}
+    chi2 = max(-factor * logdet, 0.0)
+    return {"chi2": float(chi2), "df": df, "p_value": float(special.chdtrc(df, chi2))}
+
+
+def factor_adequacy(corr: np.ndarray, n: int) -> Dict[str, object]:
+    """KMO, per-item MSA and Bartlett's test for one correlation matrix."""
+    try:
+        result = kmo(corr)
+    except (np.linalg.LinAlgError, ValueError):
+        k = np.shape(corr)[0]
+        result = {"kmo": float("nan"), "msa": np.full(k, np.nan)}
+    result["bartlett"] = bartlett_sphericity(corr, n)
+    return result
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Callable, Dict, List, Optional, Tuple
+
+from concurrency import WriteSerializer
+
+
+class GroupCommitter:
+    """Coalesce concurrent submissions into one durable write.
+
+    The first record to arrive opens a window of ``window_ms``; everything
+    that arrives before it closes (or until ``max_batch`` records are
+    waiting) is handed to ``commit`` as one list, through the single-writer
+    gate. ``commit`` must persist the whole batch durably (one write, one
+    fsync) and return the total count afterwards; each caller is then
+    acknowledged with the count its own record produced.
+    """
+
+    def __init__(
+        self,
+        commit: Callable[[List[Dict]], int],
+        writes: WriteSerializer,
+        window_ms: float = 10.0,
+        max_batch: int = 1000,
+    ) -> None:
+        self.commit = commit
+        self.writes = writes
+        self.window = max(window_ms, 0.0) / 1000.0
+        self.max_batch = max(int(max_batch), 1)
+        self._pending: List[Tuple[Dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self.batches = 0
+        self.records = 0
+        self.max_batch_seen = 0
+
+    async def submit(self, record: Dict) -> int:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((record, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush_now)
+        return await future
+
+    def _flush_now(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._commit(batch))
+            # Keep a reference until done so the task is not garbage collected
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _commit(self, batch: List[Tuple[Dict, asyncio.Future]]) -> None:
+        try:
+            total = await self.writes.run(self.commit, [record for record, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        self.batches += 1
+        self.records += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        first = total - len(batch) + 1
+        for i, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(first + i)
+
+    def stats(self) -> Dict:
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch": self.max_batch,
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "records": self.records,
+            "avg_batch": (self.records / self.batches) if self.batches else None,
+            "max_batch_seen": self.max_batch_seen,
+        }
@@ -1,19 +1,56 @@
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Body, Request, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Optional
-import json
+from fastapi.exceptions import RequestValidationError
+from fastapi.exception_handlers import request_validation_exception_handler
+from pydantic import BaseModel, Field, field_validator
+from typing import TYPE_CHECKING, List, Dict, Optional, Union
 import os
-from datetime import datetime
-import pandas as pd
+import math
+import asyncio
+import functools
 import numpy as np
-import statsmodels.api as sm
-from sklearn.linear_model import Ridge
-from sklearn.metrics import mean_squared_error
 import hashlib
-from v0_2_analytics import generate_analytics_payload
+from v0_2_analytics import analytics_from_stats
+from storage import AppendLog
+from sqlite_storage import SQLiteLog, read_legacy
+from binary_storage import BinaryLog
+from response_store import MISSING_TS, ResponseStore, parse_timestamp_ms
+from stats_engine import (
+    AGE_GROUPS,
+    N_QUESTIONS,
+    VARIABLES,
+    SufficientStats,
+    design_rows,
+    loo_ols_from_stats,
+    multi_target_ols_from_stats,
+    regression_entry,
+)
+from result_cache import ResultCache, etag_matches
+from concurrency import AnalyticsPool, WriteSerializer
+from group_commit import GroupCommitter
+from snapshots import SnapshotWorker
+from checkpoint import CheckpointWriter, capture, read_checkpoint
+from bootstrap import MAX_REPLICATES, MAX_SEED, BootstrapBusy, BootstrapPool
+from timeline import INTERVAL_MS, TimeBuckets, format_ms, series_to_json
+from stratified import stratified_analytics
+from sample_generator import DEFAULT_CORRELATION, MAX_SAMPLES, Distribution, columns_to_jsonl, generate_sample_columns
+from export import (
+    BINARY_FORMATS,
+    EXPORT_FORMATS,
+    STREAM_FORMATS,
+    FILE_EXTENSIONS,
+    MEDIA_TYPES,
+    build_binary_export,
+    iter_export,
+    select_page,
+)
+
+# pandas and scipy are only imported by the analytics code when
+# it first runs, so a (re)started worker can take submissions right away
+if TYPE_CHECKING:
+    import pandas as pd
 
 app = FastAPI(
     title="AI Confidence Survey - UIUC",
@@ -29,11 +66,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(RequestValidationError)
+async def validation_error(request: Request, exc: RequestValidationError):
+    """FastAPI's 422, without echoing NaN/inf inputs (which JSON cannot carry)"""
+    errors = [
+        {k: v for k, v in error.items() if k != "input"}
+        if isinstance(error.get("input"), float) and not math.isfinite(error["input"]) else error
+        for error in exc.errors()
+    ]
+    return await request_validation_exception_handler(request, RequestValidationError(errors))
+
 # Configuration
 # Use absolute path to ensure data file is found regardless of working directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_FILE = os.path.join(BASE_DIR, "survey-data.json")
-REMINDERS_FILE = os.path.join(BASE_DIR, "reminder-data.json")
+# Data files live next to main.py unless SURVEYAI_DATA_DIR points elsewhere
+DATA_DIR = os.environ.get("SURVEYAI_DATA_DIR", BASE_DIR)
+DATA_FILE = os.path.join(DATA_DIR, "survey-data.json")
+REMINDERS_FILE = os.path.join(DATA_DIR, "reminder-data.json")
+# Append-only logs; the JSON files above are only read once for migration
+DATA_LOG_FILE = os.path.join(DATA_DIR, "survey-data.jsonl")
+REMINDERS_LOG_FILE = os.path.join(DATA_DIR, "reminder-data.jsonl")
+# "log" (append-only JSONL files), "sqlite" (SURVEYAI_DB_FILE, WAL mode) or
+# "binary" (16-byte response records in SURVEYAI_BIN_FILE, reminders in JSONL)
+STORAGE_BACKEND = os.environ.get("SURVEYAI_STORAGE", "log")
+DB_FILE = os.environ.get("SURVEYAI_DB_FILE", os.path.join(DATA_DIR, "survey-data.db"))
+BIN_FILE = os.environ.get("SURVEYAI_BIN_FILE", os.path.join(DATA_DIR, "survey-data.bin"))
+CHECKPOINT_FILE = os.environ.get("SURVEYAI_CHECKPOINT_FILE", os.path.join(DATA_DIR, "survey-data.checkpoint.npz"))
+# Submissions arriving within this window are persisted with one write + fsync
+COMMIT_WINDOW_MS = float(os.environ.get("SURVEYAI_COMMIT_WINDOW_MS", "10"))
+# Analytics/regression snapshots are rebuilt at most once per this many seconds
+SNAPSHOT_INTERVAL = float(os.environ.get("SURVEYAI_SNAPSHOT_INTERVAL", "1"))
+# A snapshot rebuild running longer than this many seconds is reported as stuck
+SNAPSHOT_TIMEOUT = float(os.environ.get("SURVEYAI_SNAPSHOT_TIMEOUT", "60"))
+# Wall-clock budget (seconds) for one /api/analytics?bootstrap=B request
+BOOTSTRAP_BUDGET = float(os.environ.get("SURVEYAI_BOOTSTRAP_BUDGET", "10"))
+# Bootstrap requests computed at once per worker; more get a 503
+BOOTSTRAP_CONCURRENCY = int(os.environ.get("SURVEYAI_BOOTSTRAP_CONCURRENCY", "2"))
+# Idle /api/dashboard/stream connections get a keep-alive comment (and pick up
+# other workers' writes) this often, in seconds
+STREAM_HEARTBEAT = float(os.environ.get("SURVEYAI_STREAM_HEARTBEAT", "5"))
+# The in-memory store is checkpointed at most once per this many seconds after
+# writes, so a (re)started worker only replays newer writes; 0 disables
+CHECKPOINT_INTERVAL = float(os.environ.get("SURVEYAI_CHECKPOINT_INTERVAL", "300"))
 ADMIN_PASSWORD_HASH = "3dd7f1eb8e998529db00ed23f9a37845297a27a79b1cfc8c0d5cef2d8468b3ee"  # "PA$$"
 
 # Models
@@ -47,50 +121,253 @@ class SurveyResponse(BaseModel):
     q5: float
     q6: float
 
+    @field_validator("age_group")
+    @classmethod
+    def known_age_group(cls, value: str) -> str:
+        # Only the survey's own groups, so the set of labels stays bounded
+        if value not in AGE_GROUPS:
+            raise ValueError(f"age_group must be one of {', '.join(AGE_GROUPS)}")
+        return value
+
+    @field_validator("q1", "q2", "q3", "q4", "q5", "q6")
+    @classmethod
+    def slider_value(cls, value: float) -> float:
+        # The sliders run from -1 to 1; anything else (inf, 1e308) would
+        # overflow the running statistics
+        if not (math.isfinite(value) and -1.0 <= value <= 1.0):
+            raise ValueError("answers must be between -1 and 1")
+        return value
+
 class AdminAuth(BaseModel):
     password: str
 
 class GenerateSamplesRequest(BaseModel):
     password: str
-    num_responses: int
-    distribution_type: str
+    num_responses: int = Field(ge=1, le=MAX_SAMPLES)
+    distribution_type: Distribution
+    seed: Optional[int] = None
+    correlation: float = DEFAULT_CORRELATION  # only used by "correlated"
 
 class ReminderRequest(BaseModel):
     email: str
     response_count: int
     timestamp: str
 
+# Shared by all worker processes (see storage.AppendLog / sqlite_storage.SQLiteLog)
+if STORAGE_BACKEND == "sqlite":
+    response_log = SQLiteLog(
+        DB_FILE, "responses", track_changes=True,
+        migrate=lambda: read_legacy(DATA_LOG_FILE, DATA_FILE, "responses"),
+    )
+    reminder_log = SQLiteLog(
+        DB_FILE, "reminders",
+        migrate=lambda: read_legacy(REMINDERS_LOG_FILE, REMINDERS_FILE, "reminders"),
+    )
+elif STORAGE_BACKEND == "binary":
+    response_log = BinaryLog(
+        BIN_FILE, track_changes=True,
+        migrate=lambda: read_legacy(DATA_LOG_FILE, DATA_FILE, "responses"),
+    )
+    reminder_log = AppendLog(REMINDERS_LOG_FILE, legacy_path=REMINDERS_FILE, legacy_key="reminders")
+elif STORAGE_BACKEND == "log":
+    response_log = AppendLog(DATA_LOG_FILE, legacy_path=DATA_FILE, legacy_key="responses", track_changes=True)
+    reminder_log = AppendLog(REMINDERS_LOG_FILE, legacy_path=REMINDERS_FILE, legacy_key="reminders")
+else:
+    raise RuntimeError(f"Unknown SURVEYAI_STORAGE '{STORAGE_BACKEND}' (use 'log', 'sqlite' or 'binary')")
+# Checkpoints only apply to the log they were taken from
+CHECKPOINT_SOURCE = f"{STORAGE_BACKEND}:{os.path.abspath(response_log.path)}"
+
+def open_store():
+    """The store from the latest checkpoint, positioned so the next
+    ``apply_log_changes`` replays only newer writes, or else from the whole
+    log; returns (store, checkpoint meta or None)"""
+    if CHECKPOINT_INTERVAL > 0:
+        restored = read_checkpoint(CHECKPOINT_FILE, CHECKPOINT_SOURCE)
+        if restored is not None:
+            store, meta = restored
+            if response_log.restore(meta["cursor"]):
+                return store, meta
+            print(f"Checkpoint {CHECKPOINT_FILE} predates the last log rewrite; loading the full log")
+    if STORAGE_BACKEND == "binary":
+        # Decoded column-wise, without a dict per response
+        return ResponseStore.from_page(response_log.load_page()), None
+    return ResponseStore.from_records(response_log.load()), None
+
+# Loaded once at startup and kept in step with the log; every read endpoint
+# uses this instead of the disk
+response_store, startup_checkpoint = open_store()
+# Serialized analytics payloads, valid while response_store.version is unchanged
+result_cache = ResultCache()
+# Mutations run one at a time off the event loop; heavy reads use a bounded pool
+writes = WriteSerializer()
+analytics_pool = AnalyticsPool()
+# Bootstrap resampling runs on worker processes, started on first use
+bootstrap_pool = BootstrapPool(max_requests=BOOTSTRAP_CONCURRENCY)
+
+@app.on_event("shutdown")
+def close_logs():
+    """Flush batched fsyncs (and checkpoint) before the process exits"""
+    snapshots.stop()
+    checkpoints.stop()
+    checkpoints.save()
+    analytics_pool.shutdown()
+    bootstrap_pool.shutdown()
+    response_log.close()
+    reminder_log.close()
+
 # Helper functions
 def load_data():
-    """Load survey data from JSON file"""
-    if not os.path.exists(DATA_FILE):
-        return {"responses": []}
-    with open(DATA_FILE, 'r') as f:
-        return json.load(f)
+    """Load survey data from the response log"""
+    return {"responses": response_log.load()}
 
 def save_data(data):
-    """Save survey data to JSON file"""
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    """Replace all survey data (atomic rewrite of the response log)"""
+    response_log.rewrite(data.get("responses", []))
+
+def apply_log_changes():
+    """Replay other worker processes' writes into the in-memory store
+    (caller holds ``response_log.locked()``)"""
+    added = []
+    for op, arg in response_log.read_changes():
+        if op == "add":
+            added.append(arg)
+            continue
+        response_store.extend(added)
+        added = []
+        if op == "delete":
+            response_store.delete(arg)
+        else:
+            response_store.reset(arg)
+    response_store.extend(added)
+
+def sync_store():
+    """Catch up with the shared log"""
+    with response_log.locked():
+        apply_log_changes()
+
+# Writes made after the startup checkpoint
+sync_store()
+
+def data_changed():
+    """After a write: rebuild the snapshots and, in time, the checkpoint
+    (call from the event loop)"""
+    snapshots.notify()
+    checkpoints.notify()
+
+async def refresh_store():
+    """Before serving a read, pick up writes from other workers (one stat()
+    when there are none)"""
+    if response_log.changed():
+        await writes.run(sync_store)
+        data_changed()
+
+def exclusive(fn):
+    """Run a write holding the cross-process log lock, after applying what
+    other workers wrote so the store and the log stay in the same order"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with response_log.locked():
+            apply_log_changes()
+            return fn(*args, **kwargs)
+    return wrapper
+
+# Write operations; called through `writes.run` so they never overlap
+@exclusive
+def commit_responses(responses: List[Dict]) -> int:
+    """Durably append a batch of survey responses (one write, one fsync)
+    and add them to the in-memory store; returns the new total"""
+    # Encoded first: nothing reaches the log that the store cannot take
+    columns = response_store.encode(responses)
+    response_log.append_many(responses)
+    response_log.sync()
+    response_store.extend_columns(*columns)
+    return response_store.count
+
+def append_reminder(reminder: Dict) -> int:
+    """Append one reminder request to the reminder log"""
+    reminder_log.append(reminder)
+    return reminder_log.count
+
+@exclusive
+def append_samples(answers, age_codes, timestamps, ts_ms) -> int:
+    """Persist a generated batch with one bulk write and one bulk store append"""
+    if STORAGE_BACKEND == "sqlite":
+        response_log.append_columns(answers, [AGE_GROUPS[c] for c in age_codes.tolist()], timestamps, ts_ms)
+    elif STORAGE_BACKEND == "binary":
+        response_log.append_columns(answers, age_codes, timestamps)
+    else:
+        response_log.append_encoded(columns_to_jsonl(answers, age_codes, timestamps), len(timestamps))
+    response_store.extend_columns(answers, age_codes, timestamps, ts_ms=ts_ms)
+    return response_store.count
+
+@exclusive
+def delete_response(timestamp: str):
+    """Delete responses by timestamp; returns (deleted, remaining)"""
+    deleted = response_store.delete(timestamp)
+    if deleted:
+        # Tombstone (log) or indexed DELETE (sqlite); never a full rewrite
+        response_log.delete(timestamp, deleted)
+    return deleted, response_store.count
+
+@exclusive
+def clear_responses():
+    """Remove all responses"""
+    save_data({"responses": []})
+    response_store.clear()
+
+# Bursts of /api/submit calls share one durable write
+submissions = GroupCommitter(commit_responses, writes, window_ms=COMMIT_WINDOW_MS)
 
 def load_reminders():
-    """Load reminder data from JSON file"""
-    if not os.path.exists(REMINDERS_FILE):
-        return {"reminders": []}
-    with open(REMINDERS_FILE, 'r') as f:
-        return json.load(f)
+    """Load reminder data from the reminder log"""
+    return {"reminders": reminder_log.load()}
 
 def save_reminders(data):
-    """Save reminder data to JSON file"""
-    with open(REMINDERS_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    """Replace all reminder data (atomic rewrite of the reminder log)"""
+    reminder_log.rewrite(data.get("reminders", []))
 
 def verify_admin_password(password: str) -> bool:
     """Verify admin password"""
     return hashlib.sha256(password.encode()).hexdigest() == ADMIN_PASSWORD_HASH
 
-def calculate_regression_models(df: pd.DataFrame):
-    """Calculate multivariate regression for each question with age bins as predictors"""
+async def export_responses(fmt: str, since: Optional[str], cursor: Optional[int], limit: Optional[int],
+                     formats=EXPORT_FORMATS):
+    """One page of responses: streamed JSON array/NDJSON or a columnar file"""
+    if fmt not in formats:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{fmt}' (use one of {', '.join(formats)})")
+    binary = fmt in BINARY_FORMATS
+    await refresh_store()
+    try:
+        page, next_cursor, body = await analytics_pool.run(_prepare_export, fmt, since, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ImportError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    
+    headers = {"X-Page-Count": str(len(page))}
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = str(next_cursor)
+    if binary:
+        headers["Content-Disposition"] = f'attachment; filename="survey-data.{FILE_EXTENSIONS[fmt]}"'
+        return Response(content=body, media_type=MEDIA_TYPES[fmt], headers=headers)
+    return StreamingResponse(iter_export(page, fmt), media_type=MEDIA_TYPES[fmt], headers=headers)
+
+def _prepare_export(fmt: str, since: Optional[str], cursor: Optional[int], limit: Optional[int]):
+    """Copy an export page out of the store (under its lock), then serialize
+    binary formats from the copy without blocking writers"""
+    page, next_cursor = select_page(response_store, since=since, cursor=cursor, limit=limit)
+    if fmt not in BINARY_FORMATS:
+        return page, next_cursor, None
+    return page, next_cursor, build_binary_export(page, fmt)
+
+def calculate_regression_models(data: Union[SufficientStats, "pd.DataFrame"]):
+    """Calculate multivariate regression for each question with age bins as predictors
+
+    Models are fit from sufficient statistics (see stats_engine), so the cost
+    is independent of the number of responses. A DataFrame of raw responses
+    is summarized first.
+    """
+    stats = data if isinstance(data, SufficientStats) else SufficientStats.from_frame(data)
     questions = ['q1', 'q2', 'q3', 'q4', 'q5', 'q6']
     results = []
     
@@ -103,71 +380,43 @@ def calculate_regression_models(df: pd.DataFrame):
         5: "Social Impact"
     }
     
-    # One-hot encode age if available - drop first to avoid multicollinearity
-    age_dummy_cols = []
-    age_dummy_labels = []
-    if 'age_group' in df.columns:
-        dummies = pd.get_dummies(df['age_group'], prefix='age', drop_first=True)
-        # Convert boolean dummies to float to avoid numpy type errors
-        for col in dummies.columns:
-            dummies[col] = dummies[col].astype(float)
-        df = pd.concat([df, dummies], axis=1)
-        age_dummy_cols = list(dummies.columns)
-        # First category '16-18' is dropped, so remaining 4:
-        age_label_map = {
-            'age_19-22': 'Age 19-22',
-            'age_23-26': 'Age 23-26',
-            'age_27-40': 'Age 27-40',
-            'age_40+': 'Age 40+'
-        }
-        age_dummy_labels = [age_label_map.get(col, col) for col in age_dummy_cols]
-
-    for target_idx, target_col in enumerate(questions):
+    # One-hot age dummies, first observed bin ('16-18') dropped to avoid multicollinearity
+    age_dummy_idx = stats.age_dummy_indices()
+    age_label_map = {
+        'age_19-22': 'Age 19-22',
+        'age_23-26': 'Age 23-26',
+        'age_27-40': 'Age 27-40',
+        'age_40+': 'Age 40+'
+    }
+    age_dummy_labels = [age_label_map.get(VARIABLES[i], VARIABLES[i]) for i in age_dummy_idx]
+
+    # Every model uses the other five questions + age dummies as predictors
+    n_predictors = len(questions) - 1 + len(age_dummy_idx)
+
+    # Require sufficient observations (need more than # of predictors + constant)
+    min_required = n_predictors + 2
+    if stats.n < min_required:
+        print(f"Skipping regressions: insufficient complete rows ({stats.n}) for {n_predictors} predictors (need >= {min_required})")
+        return results
+
+    # Fit all six leave-one-out models from one inversion of the Gram matrix
+    try:
+        print(f"Fitting q1-q6: n={stats.n}, p={n_predictors}")
+        models = loo_ols_from_stats(stats, range(len(questions)), age_dummy_idx)
+    except Exception as e:
+        print(f"Error calculating regressions: {e}")
+        return results
+
+    for target_idx, (target_col, model) in enumerate(zip(questions, models)):
         try:
-            # Prepare data: other Q features + age dummies
-            predictor_cols = [q for q in questions if q != target_col] + age_dummy_cols
-
-            # Drop rows with any missing values in predictors or target
-            model_cols = [target_col] + predictor_cols
-            df_model = df[model_cols].dropna()
-
-            # Require sufficient observations (need more than # of predictors + constant)
-            min_required = len(predictor_cols) + 2
-            if len(df_model) < min_required:
-                print(f"Skipping {target_col}: insufficient complete rows ({len(df_model)}/{len(df)}) for {len(predictor_cols)} predictors (need >= {min_required})")
-                continue
-
-            X = df_model[predictor_cols].values
-            y = df_model[target_col].values
-            
-            # Add constant for intercept
-            X_with_const = sm.add_constant(X)
-            
-            # Fit OLS model
-            print(f"Fitting {target_col}: n={len(df_model)}, p={len(predictor_cols)}")
-            model = sm.OLS(y, X_with_const).fit()
-            print(f"Successfully fit {target_col}: R²={model.rsquared:.4f}")
+            print(f"Successfully fit {target_col}: R²={model['rsquared']:.4f}")
             
             # Build predictor labels
             predictor_indices = [i for i in range(6) if i != target_idx]
             predictor_short_labels = [q_label_map[i] for i in predictor_indices]
             all_predictor_labels = predictor_short_labels + age_dummy_labels
 
-            results.append({
-                'targetQuestion': f'Question {target_idx + 1}',
-                'targetIdx': target_idx,
-                'predictorIndices': predictor_indices,
-                'predictorLabels': all_predictor_labels,
-                'beta': model.params.tolist(),
-                'standardErrors': model.bse.tolist(),
-                'tStats': model.tvalues.tolist(),
-                'pValues': model.pvalues.tolist(),
-                'r2': float(model.rsquared),
-                'adjR2': float(model.rsquared_adj),
-                'rmse': float(np.sqrt(model.mse_resid)),
-                'n': int(model.nobs),
-                'method': 'OLS'
-            })
+            results.append(regression_entry(model, target_idx, predictor_indices, all_predictor_labels))
             
         except Exception as e:
             print(f"Error calculating regression for {target_col}: {e}")
@@ -193,66 +442,89 @@ async def read_upgrades():
     return FileResponse("gpt-atlas-upgrades.html")
 
 @app.get("/api/responses")
-async def get_responses():
-    """Get all survey responses"""
-    data = load_data()
-    return JSONResponse(content=data.get("responses", []))
+async def get_responses(
+    fmt: str = Query("json", alias="format"),
+    since: Optional[str] = None,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """Get survey responses (streamed; optional since/cursor/limit paging)"""
+    return await export_responses(fmt, since, cursor, limit, formats=STREAM_FORMATS)
 
 @app.post("/api/submit")
 async def submit_response(response: SurveyResponse):
     """Submit a new survey response"""
-    data = load_data()
-    
-    # Add new response
-    data.setdefault("responses", []).append(response.dict())
-    
-    # Save updated data
-    save_data(data)
+    count = await submissions.submit(response.dict())
+    data_changed()
     
     return JSONResponse(content={
         "success": True,
-        "count": len(data["responses"])
+        "count": count
     })
 
 @app.post("/api/reminder")
 async def submit_reminder(reminder: ReminderRequest):
     """Submit email reminder request"""
-    reminder_data = load_reminders()
-    
-    # Add new reminder
-    reminder_data.setdefault("reminders", []).append(reminder.dict())
-    
-    # Save updated reminders
-    save_reminders(reminder_data)
+    count = await writes.run(append_reminder, reminder.dict())
     
     return JSONResponse(content={
         "success": True,
-        "count": len(reminder_data["reminders"])
+        "count": count
     })
 
-@app.get("/api/regression")
-async def get_regression():
-    """Calculate and return regression analysis"""
-    data = load_data()
-    responses = data.get("responses", [])
-    
-    if len(responses) < 6:
+def slice_stats(start_ms: Optional[int] = None, end_ms: Optional[int] = None):
+    """(statistics, response count) for all responses, or for the hourly
+    timeline buckets between ``start_ms`` and ``end_ms`` when either is set."""
+    with response_store.lock:
+        if start_ms is None and end_ms is None:
+            _, stats = response_store.stats_snapshot()
+            return stats, response_store.count
+        stats = response_store.stats_between(start_ms, end_ms)
+        return stats, stats.n
+
+def parse_time_range(start: Optional[str], end: Optional[str]):
+    """``from``/``to`` query values (ISO timestamps) to epoch ms"""
+    bounds = []
+    for name, value in (("from", start), ("to", end)):
+        ms = None if value is None else parse_timestamp_ms(value)
+        if ms == MISSING_TS:
+            raise HTTPException(status_code=400, detail=f"Invalid '{name}' timestamp: {value!r}")
+        bounds.append(ms)
+    return tuple(bounds)
+
+def parse_stratify(stratify: Optional[str]) -> bool:
+    """``stratify`` query value; only ``age_group`` is supported"""
+    if stratify is None:
+        return False
+    if stratify != "age_group":
+        raise HTTPException(status_code=400, detail=f"Unsupported stratify '{stratify}' (use age_group)")
+    return True
+
+def build_regression_payload(start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                             stratify: bool = False):
+    """Calculate regression analysis (JSON-ready list), optionally for a time
+    slice, or per age group (each model tagged with its ``ageGroup``)"""
+    # Calculate regression models from a copy of the running statistics
+    with response_store.lock:
+        stats, count = slice_stats(start_ms, end_ms)
+        if stratify:
+            labels, groups = list(response_store.age_labels), response_store.strata(start_ms, end_ms)
+    if count < 6:
         raise HTTPException(
             status_code=400,
             detail="Need at least 6 responses for regression analysis"
         )
+    if stratify:
+        strata = stratified_analytics(labels, groups)["strata"]
+        return [{**model, "ageGroup": s["age_group"]} for s in strata for model in s["regressions"]]
     
-    # Convert to DataFrame
-    df = pd.DataFrame(responses)
-    
-    # Calculate regression models
-    results = calculate_regression_models(df)
+    results = calculate_regression_models(stats)
 
     # Remove separate age model block; age effects appear via one-hot dummies in each model
     
     # If nothing could be computed, return an empty list (200) so UI can handle gracefully
     if not results:
-        return JSONResponse(content=[])
+        return []
     
     # Sanitize NaN/Inf for JSON
     def _safe(val):
@@ -272,21 +544,15 @@ async def get_regression():
             return None
 
     safe_results = [_safe(r) for r in results]
-    return JSONResponse(content=safe_results)
+    return safe_results
 
-@app.get("/api/regression-age")
-async def get_regression_age():
+def build_regression_age_payload():
     """Regression predicting each age bin (binary classification) from the six questions."""
-    data = load_data()
-    responses = data.get("responses", [])
-    if len(responses) < 6:
+    if response_store.count < 6:
         raise HTTPException(status_code=400, detail="Need at least 6 responses for regression analysis")
 
-    df = pd.DataFrame(responses)
-    if 'age_group' not in df.columns:
-        raise HTTPException(status_code=400, detail="No age data available")
-
-    df = df.dropna(subset=['age_group'])
+    # Only responses that report an age group take part
+    stats = response_store.aged_stats()
     
     age_bins = ['16-18', '19-22', '23-26', '27-40', '40+']
     age_labels = ['Teen', 'Undergrad', 'Graduate', 'Working', 'Older']
@@ -294,43 +560,38 @@ async def get_regression_age():
     
     results = []
     
-    for age_bin, age_label in zip(age_bins, age_labels):
-        # Create binary target: 1 if this age bin, 0 otherwise
-        df[f'is_{age_bin}'] = (df['age_group'] == age_bin).astype(float)
-        
-        # Count how many samples in this bin
-        count = df[f'is_{age_bin}'].sum()
-        
-        if count < 2:
-            continue  # Skip if insufficient samples
-        
-        X = df[['q1','q2','q3','q4','q5','q6']].values
-        y = df[f'is_{age_bin}'].values
-        X_with_const = sm.add_constant(X)
-        
-        try:
-            model = sm.OLS(y, X_with_const).fit()
-            result = {
-                'targetQuestion': f'Age: {age_label} ({age_bin})',
-                'targetIdx': -1,
-                'ageBin': age_bin,
-                'ageLabel': age_label,
-                'count': int(count),
-                'predictorLabels': predictor_labels,
-                'beta': model.params.tolist(),
-                'standardErrors': model.bse.tolist(),
-                'tStats': model.tvalues.tolist(),
-                'pValues': model.pvalues.tolist(),
-                'r2': float(model.rsquared),
-                'adjR2': float(model.rsquared_adj),
-                'rmse': float(np.sqrt(model.mse_resid)),
-                'n': int(model.nobs),
-                'method': 'OLS'
-            }
-            results.append(result)
-        except Exception as e:
-            print(f"Error computing regression for {age_bin}: {e}")
-            continue
+    # Binary targets are the age indicators; skip bins with insufficient samples
+    counts = stats.age_counts()
+    fitted = [k for k, count in enumerate(counts) if count >= 2]
+    
+    # All bins share X = [1, q1..q6], so solve them together from one factorization
+    try:
+        models = multi_target_ols_from_stats(
+            stats, [N_QUESTIONS + k for k in fitted], range(N_QUESTIONS)
+        )
+    except Exception as e:
+        print(f"Error computing age regressions: {e}")
+        models = []
+    
+    for k, model in zip(fitted, models):
+        age_bin, age_label = age_bins[k], age_labels[k]
+        results.append({
+            'targetQuestion': f'Age: {age_label} ({age_bin})',
+            'targetIdx': -1,
+            'ageBin': age_bin,
+            'ageLabel': age_label,
+            'count': int(counts[k]),
+            'predictorLabels': predictor_labels,
+            'beta': model['params'].tolist(),
+            'standardErrors': model['bse'].tolist(),
+            'tStats': model['tvalues'].tolist(),
+            'pValues': model['pvalues'].tolist(),
+            'r2': float(model['rsquared']),
+            'adjR2': float(model['rsquared_adj']),
+            'rmse': float(np.sqrt(model['mse_resid'])),
+            'n': int(model['nobs']),
+            'method': 'OLS'
+        })
     
     # Sort by count (most responses first)
     results.sort(key=lambda x: x['count'], reverse=True)
@@ -352,24 +613,309 @@ async def get_regression_age():
         except Exception:
             return None
     
-    return JSONResponse(content=[_safe(r) for r in results])
+    return [_safe(r) for r in results]
+
+def build_analytics_payload(
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+    interval: Optional[str] = None,
+    window: int = 1,
+    stratify: bool = False,
+):
+    """Advanced analytics JSON for the v0.2 upgrades UI.
+
+    Optionally restricted to a time slice (adds "range"), with a per-period
+    time series of key metrics ("timeseries") and per-age-group results
+    ("stratified"). Bootstrap CIs are added by ``render_bootstrap_analytics``.
+    """
+    sliced = start_ms is not None or end_ms is not None
+    with response_store.lock:
+        stats, count = slice_stats(start_ms, end_ms)
+        series = response_store.timeline.series(interval, window, start_ms, end_ms) if interval else None
+        if stratify:
+            labels, groups = list(response_store.age_labels), response_store.strata(start_ms, end_ms)
+
+    payload = analytics_from_stats(stats, count)
+    if sliced:
+        lo, hi = TimeBuckets.resolve(start_ms, end_ms)
+        payload["range"] = {"from": format_ms(lo), "to": format_ms(hi), "n": stats.n}
+    if series is not None:
+        payload["timeseries"] = series_to_json(series, interval, window)
+    if stratify:
+        payload["stratified"] = stratified_analytics(labels, groups)
+    return payload
+
+def bootstrap_design(start_ms: Optional[int] = None, end_ms: Optional[int] = None):
+    """(design rows, age dummy columns) of the responses to resample"""
+    with response_store.lock:
+        stats, _ = slice_stats(start_ms, end_ms)
+        if start_ms is not None or end_ms is not None:
+            keep = response_store.time_mask(start_ms, end_ms)
+            rows = design_rows(response_store.questions[:, keep], response_store.age_codes[keep])
+        else:
+            rows = design_rows(response_store.questions, response_store.age_codes)
+    if stats.n < 3:
+        raise HTTPException(status_code=400, detail="Need at least 3 complete responses to bootstrap")
+    return rows, stats.age_dummy_indices()
+
+async def render_bootstrap_analytics(
+    start_ms: Optional[int],
+    end_ms: Optional[int],
+    interval: Optional[str],
+    window: int,
+    stratify: bool,
+    replicates: int,
+    seed: int,
+    confidence: float,
+) -> bytes:
+    """Analytics JSON with bootstrap CIs ("bootstrap"), serialized.
+
+    The rows and the base payload are built on the analytics pool; the
+    resampling is awaited here, on the event loop, so no analytics thread
+    waits on the process pool. Only BOOTSTRAP_CONCURRENCY of these run at
+    once; the rest are refused with 503 and Retry-After.
+    """
+    try:
+        with bootstrap_pool.reserve():
+            rows, predictors = await analytics_pool.run(bootstrap_design, start_ms, end_ms)
+            payload, summary = await asyncio.gather(
+                analytics_pool.run(build_analytics_payload, start_ms, end_ms, interval, window, stratify),
+                bootstrap_pool.run(
+                    rows, predictors, replicates, seed=seed, confidence=confidence, budget=BOOTSTRAP_BUDGET,
+                ),
+            )
+    except BootstrapBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many bootstrap requests in progress; retry shortly",
+            headers={"Retry-After": str(max(1, math.ceil(BOOTSTRAP_BUDGET)))},
+        )
+    payload["bootstrap"] = summary
+    return await analytics_pool.run(render_json, lambda: payload)
+
+def build_aggregates_payload(bins: int, recent: int):
+    """Histograms, moments, quantiles and age counts from the running
+    aggregates, plus the ``recent`` newest responses"""
+    with response_store.lock:
+        payload = response_store.aggregates.summary(response_store.age_labels, bins)
+        if recent:
+            n = response_store.count
+            payload["recent"] = response_store.page(np.arange(max(0, n - recent), n)).records()
+    return payload
+
+def render_json(build) -> bytes:
+    """Run a payload builder and serialize it the way JSONResponse does"""
+    return JSONResponse(content=build()).body
+
+async def cached_json_response(request: Request, key, build) -> Response:
+    """Serve ``build()`` as JSON, reusing the serialized bytes while the
+    dataset version is unchanged and answering If-None-Match with 304.
+    Cache misses are computed on the analytics pool, off the event loop."""
+    return await cached_response(request, key, lambda: analytics_pool.run(render_json, build))
+
+async def cached_response(request: Request, key, render) -> Response:
+    """Serve the JSON bytes ``await render()`` returns, cached like
+    ``cached_json_response``; ``render`` only runs on a cache miss."""
+    await refresh_store()
+    # Read the version first: a write racing the build only causes a later miss
+    version = response_store.version
+    entry = result_cache.get(key, version)
+    if entry is None:
+        body = await render()
+        entry = result_cache.put(key, version, body)
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+def store_state():
+    """(dataset version, response count) read together"""
+    with response_store.lock:
+        return response_store.version, response_store.count
+
+# Heavy payloads are rebuilt in the background after writes (debounced);
+# readers always get the latest finished snapshot without waiting.
+# "dashboard" bundles everything the survey page shows, from one version
+snapshots = SnapshotWorker(
+    {
+        "aggregates": functools.partial(build_aggregates_payload, 9, 10),
+        "regression": build_regression_payload,
+        "regression-age": build_regression_age_payload,
+        "analytics": build_analytics_payload,
+    },
+    store_state,
+    analytics_pool.run,
+    min_interval=SNAPSHOT_INTERVAL,
+    bundles={
+        "dashboard": {
+            "aggregates": "aggregates",
+            "regression": "regression",
+            "regression_age": "regression-age",
+            "analytics": "analytics",
+        },
+    },
+    lock=response_store.lock,
+    build_timeout=SNAPSHOT_TIMEOUT,
+)
+
+@exclusive
+def capture_checkpoint():
+    """The store's state and the log cursor it corresponds to, taken together"""
+    return capture(response_store), response_log.cursor()
+
+# Periodic checkpoints of the store (see checkpoint.py); one restored at
+# startup counts as written then
+checkpoints = CheckpointWriter(
+    CHECKPOINT_FILE,
+    CHECKPOINT_SOURCE,
+    capture_checkpoint,
+    lambda: store_state()[0],
+    writes.run,
+    analytics_pool.run,
+    interval=CHECKPOINT_INTERVAL,
+    written_at=startup_checkpoint["created_at"] if startup_checkpoint else float("-inf"),
+    written_version=startup_checkpoint["version"] if startup_checkpoint else None,
+)
+
+@app.on_event("startup")
+async def start_checkpoints():
+    """Checkpoint soon after a full log replay, or after a long tail"""
+    checkpoints.notify()
+
+async def snapshot_response(request: Request, key: str) -> Response:
+    """Serve the latest snapshot for ``key``; X-Computed-At / X-Computed-N
+    tell how fresh it is, and If-None-Match is answered with 304."""
+    await refresh_store()
+    snapshot = await snapshots.get(key)
+    headers = {
+        "ETag": snapshot.etag,
+        "Cache-Control": "no-cache",
+        "X-Computed-At": snapshot.computed_at,
+        "X-Computed-N": str(snapshot.n),
+    }
+    if snapshot.status == 200 and etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, status_code=snapshot.status,
+                    media_type="application/json", headers=headers)
+
+@app.get("/api/aggregates")
+async def get_aggregates(
+    request: Request,
+    bins: int = Query(9, ge=1, le=200),
+    recent: int = Query(0, ge=0, le=100),
+):
+    """Per-question histograms (``bins`` equal-width bins over [-1, 1]),
+    means, standard deviations, quantiles and age-group counts; a few KB
+    whatever the number of responses"""
+    build = functools.partial(build_aggregates_payload, bins, recent)
+    return await cached_json_response(request, ("aggregates", bins, recent), build)
+
+@app.get("/api/dashboard")
+async def get_dashboard(request: Request):
+    """Aggregates (9 bins, 10 newest responses), regression, age regression
+    and analytics in one payload, all computed from the same dataset version.
+    Sections that need more data are null, with the reason under ``errors``."""
+    return await snapshot_response(request, "dashboard")
+
+@app.get("/api/dashboard/stream")
+async def stream_dashboard(request: Request):
+    """Server-Sent Events: a ``dashboard`` event with the current payload,
+    then one after every recompute that changes it. The event id is the
+    payload's ETag, so a reconnecting client is only sent what it missed."""
+    await refresh_store()
+    last_id = request.headers.get("last-event-id")
+
+    async def events():
+        yield "retry: 5000\n\n"
+        updates = snapshots.subscribe("dashboard", f'"{last_id}"' if last_id else None, STREAM_HEARTBEAT)
+        try:
+            async for snapshot in updates:
+                if snapshot is None:
+                    # Idle: keep proxies from closing the connection, and
+                    # notice writes made through other worker processes
+                    await refresh_store()
+                    yield ": keep-alive\n\n"
+                    continue
+                event_id = snapshot.etag.strip('"')
+                yield f"id: {event_id}\nevent: dashboard\ndata: {snapshot.body.decode()}\n\n"
+        finally:
+            await updates.aclose()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+@app.get("/api/regression")
+async def get_regression(
+    request: Request,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    stratify: Optional[str] = None,
+):
+    """Calculate and return regression analysis, optionally for a time slice
+    or separately per age group (``stratify=age_group``)"""
+    if start is None and end is None and stratify is None:
+        return await snapshot_response(request, "regression")
+    stratified = parse_stratify(stratify)
+    start_ms, end_ms = parse_time_range(start, end)
+    build = functools.partial(build_regression_payload, start_ms, end_ms, stratified)
+    return await cached_json_response(request, ("regression", start_ms, end_ms, stratified), build)
+
+@app.get("/api/regression-age")
+async def get_regression_age(request: Request):
+    """Regression predicting each age bin (binary classification) from the six questions."""
+    return await snapshot_response(request, "regression-age")
 
 @app.get("/api/analytics")
-async def get_analytics():
-    """Return advanced analytics JSON for the v0.2 upgrades UI."""
-    data = load_data()
-    responses = data.get("responses", [])
-    payload = generate_analytics_payload(responses)
-    return JSONResponse(content=payload)
+async def get_analytics(
+    request: Request,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    interval: Optional[str] = None,
+    window: int = Query(1, ge=1, le=10000),
+    bootstrap: Optional[int] = Query(None, ge=2, le=MAX_REPLICATES),
+    seed: int = Query(0, ge=0, le=MAX_SEED),
+    confidence: float = Query(0.95, gt=0, lt=1),
+    stratify: Optional[str] = None,
+):
+    """Return advanced analytics JSON for the v0.2 upgrades UI.
+
+    ``from``/``to`` restrict it to a time slice (hour resolution);
+    ``interval=hour|day`` adds a time series of key metrics, each point over
+    a rolling ``window`` of periods. With ``bootstrap=B`` the payload also
+    carries percentile confidence intervals from B resamples (reproducible
+    for a given ``seed``, 0 to MAX_SEED); ``stratify=age_group`` adds
+    per-age-group results.
+    """
+    if start is None and end is None and interval is None and bootstrap is None and stratify is None:
+        return await snapshot_response(request, "analytics")
+    stratified = parse_stratify(stratify)
+    if interval is not None and interval not in INTERVAL_MS:
+        raise HTTPException(status_code=400, detail=f"Unsupported interval '{interval}' (use one of {', '.join(INTERVAL_MS)})")
+    start_ms, end_ms = parse_time_range(start, end)
+    if interval is None:
+        window = 1
+    key = ("analytics", start_ms, end_ms, interval, window, stratified)
+    if bootstrap is None:
+        build = functools.partial(build_analytics_payload, start_ms, end_ms, interval, window, stratified)
+        return await cached_json_response(request, key, build)
+    render = functools.partial(
+        render_bootstrap_analytics, start_ms, end_ms, interval, window, stratified, bootstrap, seed, confidence
+    )
+    return await cached_response(request, key + (bootstrap, seed, confidence), render)
 
 @app.post("/api/admin/export")
-async def admin_export(auth: AdminAuth):
-    """Export all data (admin only)"""
+async def admin_export(
+    auth: AdminAuth,
+    fmt: str = Query("json", alias="format"),
+    since: Optional[str] = None,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """Export data as a streamed JSON array/NDJSON or an Arrow/Parquet/NPZ file (admin only)"""
     if not verify_admin_password(auth.password):
         raise HTTPException(status_code=403, detail="Invalid password")
     
-    data = load_data()
-    return JSONResponse(content=data.get("responses", []))
+    return await export_responses(fmt, since, cursor, limit)
 
 @app.post("/api/admin/clear")
 async def admin_clear(auth: AdminAuth):
@@ -377,7 +923,8 @@ async def admin_clear(auth: AdminAuth):
     if not verify_admin_password(auth.password):
         raise HTTPException(status_code=403, detail="Invalid password")
     
-    save_data({"responses": []})
+    await writes.run(clear_responses)
+    data_changed()
     return JSONResponse(content={"success": True})
 
 @app.post("/api/admin/generate")
@@ -386,47 +933,26 @@ async def generate_samples(request: GenerateSamplesRequest):
     if not verify_admin_password(request.password):
         raise HTTPException(status_code=403, detail="Invalid password")
     
-    data = load_data()
-    responses = data.setdefault("responses", [])
-    
-    # Generate samples
-    for _ in range(request.num_responses):
-        timestamp = datetime.now().isoformat()
-        
-        if request.distribution_type == "normal":
-            values = np.random.normal(0, 0.3, 6)
-        elif request.distribution_type == "uniform":
-            values = np.random.uniform(-1, 1, 6)
-        elif request.distribution_type == "bimodal":
-            values = []
-            for _ in range(6):
-                peak = 0.5 if np.random.random() > 0.5 else -0.5
-                values.append(np.clip(np.random.normal(peak, 0.2), -1, 1))
-            values = np.array(values)
-        else:
-            values = np.random.uniform(-1, 1, 6)
-        
-        # Clip to [-1, 1] range
-        values = np.clip(values, -1, 1)
-        
-        response = {
-            "timestamp": timestamp,
-            "age_group": np.random.choice(["16-18","19-22","23-26","27-40","40+"], p=[0.1,0.4,0.3,0.15,0.05]).item(),
-            "q1": float(round(values[0], 2)),
-            "q2": float(round(values[1], 2)),
-            "q3": float(round(values[2], 2)),
-            "q4": float(round(values[3], 2)),
-            "q5": float(round(values[4], 2)),
-            "q6": float(round(values[5], 2)),
-        }
-        responses.append(response)
+    # Draw all answers at once as (6, n) columns, outside the write lock
+    try:
+        columns = await analytics_pool.run(
+            generate_sample_columns,
+            request.num_responses,
+            request.distribution_type,
+            request.seed,
+            request.correlation,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    save_data(data)
+    # One bulk write to the log, one bulk append to the store
+    total = await writes.run(append_samples, *columns)
+    data_changed()
     
     return JSONResponse(content={
         "success": True,
         "generated": request.num_responses,
-        "total": len(responses)
+        "total": total
     })
 
 @app.post("/api/admin/reminders")
@@ -438,6 +964,25 @@ async def admin_get_reminders(auth: AdminAuth):
     reminder_data = load_reminders()
     return JSONResponse(content=reminder_data.get("reminders", []))
 
+@app.post("/api/admin/metrics")
+async def admin_metrics(auth: AdminAuth):
+    """Cache, write-queue and analytics-pool counters (admin only)"""
+    if not verify_admin_password(auth.password):
+        raise HTTPException(status_code=403, detail="Invalid password")
+    
+    await refresh_store()
+    return JSONResponse(content={
+        "responses": response_store.count,
+        "dataset_version": response_store.version,
+        "cache": result_cache.stats(),
+        "snapshots": snapshots.stats(),
+        "checkpoint": checkpoints.stats(),
+        "writes": writes.metrics.snapshot(),
+        "group_commit": submissions.stats(),
+        "analytics": dict(analytics_pool.metrics.snapshot(), workers=analytics_pool.max_workers),
+        "bootstrap": bootstrap_pool.stats(),
+    })
+
 class DeleteResponseRequest(BaseModel):
     password: str
     timestamp: str
@@ -448,22 +993,15 @@ async def admin_delete_response(request: DeleteResponseRequest):
     if not verify_admin_password(request.password):
         raise HTTPException(status_code=403, detail="Invalid password")
     
-    data = load_data()
-    responses = data.get("responses", [])
-    
-    # Filter out the response with matching timestamp
-    original_count = len(responses)
-    data["responses"] = [r for r in responses if r.get("timestamp") != request.timestamp]
-    new_count = len(data["responses"])
+    deleted, new_count = await writes.run(delete_response, request.timestamp)
+    data_changed()
     
-    if original_count == new_count:
+    if deleted == 0:
         raise HTTPException(status_code=404, detail="Response not found")
     
-    save_data(data)
-    
     return JSONResponse(content={
         "success": True,
-        "deleted": original_count - new_count,
+        "deleted": deleted,
         "remaining": new_count
     })
 
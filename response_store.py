@@ -0,0 +1,491 @@
+from __future__ import annotations
+
+import functools
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from stats_engine import (
+    AGE_GROUPS,
+    NO_AGE,
+    QUESTION_COLUMNS,
+    SufficientStats,
+    design_rows,
+    grouped_row_stats,
+    grouped_stats,
+)
+from aggregates import AnswerAggregates
+from timeline import TimeBuckets
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# ts_ms value for timestamps that cannot be parsed
+MISSING_TS = np.iinfo(np.int64).min
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def parse_timestamp_ms(value: Optional[str]) -> int:
+    """ISO-8601 timestamp to epoch milliseconds (naive times count as UTC)."""
+    if not isinstance(value, str):
+        return MISSING_TS
+    try:
+        dt = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return MISSING_TS
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // _MILLISECOND
+
+
+def _locked(method):
+    """Run a ResponseStore method while holding the store lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class ResponseStore:
+    """Process-wide columnar copy of all survey responses.
+
+    Answers are kept as a (6, capacity) float64 array so that every question
+    column is contiguous in memory, age groups as an int8 code array and
+    timestamps as a plain list plus parsed epoch milliseconds. Every row also
+    gets a sequence number that never changes or gets reused, which makes a
+    stable pagination cursor. Capacity doubles on demand, so appending a
+    response is amortized O(1); deletes compact the arrays in one pass.
+
+    ``stats`` holds the running sufficient statistics (see stats_engine),
+    ``group_stats`` the same per age code and ``timeline`` per hour of the
+    response timestamps (see timeline.TimeBuckets); all are kept in step with
+    every mutation in O(p^2) per affected row. ``aggregates`` keeps the
+    per-question histograms and age counts (see aggregates.AnswerAggregates).
+
+    ``version`` increases on every mutation and can be used by readers to
+    detect changes. Mutations and the copying readers hold ``lock`` (an
+    RLock), so readers in other threads always see a consistent state.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        capacity = max(int(capacity), 1)
+        self._q = np.empty((len(QUESTION_COLUMNS), capacity), dtype=np.float64)
+        self._age = np.empty(capacity, dtype=np.int8)
+        self._ts_ms = np.empty(capacity, dtype=np.int64)
+        self._seq = np.empty(capacity, dtype=np.int64)
+        self._next_seq = 0
+        self._timestamps: List[str] = []
+        self.age_labels: List[str] = list(AGE_GROUPS)
+        self._age_overflow = False
+        self._n = 0
+        self.version = 0
+        self.lock = threading.RLock()
+        self.stats = SufficientStats()
+        self.group_stats: Dict[int, SufficientStats] = {}
+        self.timeline = TimeBuckets()
+        self.aggregates = AnswerAggregates()
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> "ResponseStore":
+        store = cls(capacity=max(1024, len(records)))
+        store.extend(records)
+        return store
+
+    @classmethod
+    def from_state(
+        cls,
+        page: "ResponsePage",
+        next_seq: int,
+        version: int,
+        stats: SufficientStats,
+        group_stats: Dict[int, SufficientStats],
+        timeline: TimeBuckets,
+        aggregates: AnswerAggregates,
+    ) -> "ResponseStore":
+        """Rebuild a store from saved columns and running statistics without
+        folding any row in again (see checkpoint.py)."""
+        n = len(page)
+        store = cls(capacity=max(1024, n))
+        store._q[:, :n] = page.questions
+        store._age[:n] = page.age_codes
+        store._ts_ms[:n] = page.ts_ms
+        store._seq[:n] = page.seq
+        store._timestamps = list(page.timestamps)
+        store.age_labels = list(page.age_labels)
+        store._n, store._next_seq, store.version = n, next_seq, version
+        store.stats, store.group_stats = stats, group_stats
+        store.timeline, store.aggregates = timeline, aggregates
+        return store
+
+    @classmethod
+    def from_page(cls, page: "ResponsePage") -> "ResponseStore":
+        """Build a store straight from columns (e.g. ``BinaryLog.load_page``)."""
+        store = cls(capacity=max(1024, len(page)))
+        # Page codes index page.age_labels; NO_AGE (-1) indexes the trailing entry
+        lookup = np.array([store.age_code(label) for label in page.age_labels] + [NO_AGE], dtype=np.int8)
+        codes = lookup[page.age_codes.astype(np.int64)]
+        store.extend_columns(page.questions, codes, list(page.timestamps), ts_ms=page.ts_ms)
+        return store
+
+    # ------------------------------------------------------------------
+    # Read access
+    # ------------------------------------------------------------------
+    @property
+    def count(self) -> int:
+        return self._n
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def questions(self) -> np.ndarray:
+        """(6, n) view of the answers; row j is question j+1 (contiguous)."""
+        return self._q[:, : self._n]
+
+    @property
+    def age_codes(self) -> np.ndarray:
+        """(n,) int8 view of the age codes (``NO_AGE`` when missing)."""
+        return self._age[: self._n]
+
+    @property
+    def timestamps(self) -> List[str]:
+        return self._timestamps
+
+    @property
+    def ts_ms(self) -> np.ndarray:
+        """(n,) int64 epoch milliseconds (``MISSING_TS`` when unparseable)."""
+        return self._ts_ms[: self._n]
+
+    @property
+    def seq(self) -> np.ndarray:
+        """(n,) int64 sequence numbers, increasing in insertion order."""
+        return self._seq[: self._n]
+
+    @property
+    def next_seq(self) -> int:
+        return self._next_seq
+
+    def age_label_array(self) -> np.ndarray:
+        """Object array of age labels with None for missing ages."""
+        lookup = np.array(self.age_labels + [None], dtype=object)
+        # NO_AGE (-1) indexes the trailing None
+        return lookup[self.age_codes.astype(np.int64)]
+
+    @_locked
+    def to_frame(self) -> pd.DataFrame:
+        """Build a DataFrame straight from the column arrays (no dict parsing)."""
+        import pandas as pd
+
+        data = {"timestamp": self._timestamps, "age_group": self.age_label_array()}
+        q = self.questions
+        for j, col in enumerate(QUESTION_COLUMNS):
+            data[col] = q[j]
+        return pd.DataFrame(data)
+
+    @_locked
+    def records(self) -> List[Dict]:
+        """Materialize the responses as dicts in the SurveyResponse shape."""
+        return self.page(np.arange(self._n)).records()
+
+    @_locked
+    def page(self, idx: np.ndarray) -> "ResponsePage":
+        """Copy the rows at ``idx`` out of the store.
+
+        The copy is columnar (about 60 bytes per row), so it stays cheap for
+        large exports and is unaffected by later mutations.
+        """
+        idx = np.asarray(idx, dtype=np.int64)
+        return ResponsePage(
+            timestamps=[self._timestamps[i] for i in idx.tolist()],
+            age_codes=self.age_codes[idx],
+            age_labels=list(self.age_labels),
+            questions=self.questions[:, idx],
+            ts_ms=self.ts_ms[idx],
+            seq=self.seq[idx],
+        )
+
+    def copy_page(self) -> "ResponsePage":
+        """All rows copied out of the store (slice copies, cheaper than
+        ``page`` with every index)."""
+        return ResponsePage(
+            timestamps=list(self._timestamps),
+            age_codes=self.age_codes.copy(),
+            age_labels=list(self.age_labels),
+            questions=self.questions.copy(),
+            ts_ms=self.ts_ms.copy(),
+            seq=self.seq.copy(),
+        )
+
+    # ------------------------------------------------------------------
+    # Mutations
+    # ------------------------------------------------------------------
+    def append(self, record: Dict) -> None:
+        self.extend([record])
+
+    @_locked
+    def extend(self, records: Iterable[Dict]) -> None:
+        self.extend_columns(*self.encode(records))
+
+    @_locked
+    def encode(self, records: Iterable[Dict]) -> Tuple[np.ndarray, np.ndarray, List[str], np.ndarray]:
+        """Records as ``extend_columns`` arguments (answers, age codes,
+        timestamps, epoch ms), without adding them. Writers encode a batch
+        before persisting it, so the store can always take what the log has."""
+        records = list(records)
+        k = len(records)
+        answers = np.array(
+            [[_as_float(r.get(col)) for r in records] for col in QUESTION_COLUMNS],
+            dtype=np.float64,
+        ).reshape(len(QUESTION_COLUMNS), k)
+        age_codes = np.array([self.age_code(r.get("age_group")) for r in records], dtype=np.int8)
+        timestamps = [r.get("timestamp") for r in records]
+        ts_ms = np.array([parse_timestamp_ms(ts) for ts in timestamps], dtype=np.int64)
+        return answers, age_codes, timestamps, ts_ms
+
+    @_locked
+    def extend_columns(
+        self,
+        answers: np.ndarray,
+        age_codes: np.ndarray,
+        timestamps: List[str],
+        ts_ms: Optional[np.ndarray] = None,
+    ) -> None:
+        """Bulk append from column arrays: answers (6, k), age codes (k,).
+
+        ``ts_ms`` may be supplied when the caller already has the epoch
+        milliseconds; otherwise the timestamps are parsed.
+        """
+        k = len(timestamps)
+        if k == 0:
+            return
+        self._reserve(self._n + k)
+        end = self._n + k
+        self._q[:, self._n:end] = answers
+        self._age[self._n:end] = age_codes
+        self._timestamps.extend(timestamps)
+        if ts_ms is None:
+            ts_ms = [parse_timestamp_ms(ts) for ts in timestamps]
+        self._ts_ms[self._n:end] = ts_ms
+        self._seq[self._n:end] = np.arange(self._next_seq, self._next_seq + k)
+        self._next_seq += k
+        self._fold_in(self._q[:, self._n:end], self._age[self._n:end], self._ts_ms[self._n:end])
+        self.aggregates.add(self._q[:, self._n:end], self._age[self._n:end])
+        self._n = end
+        self.version += 1
+
+    @_locked
+    def delete(self, timestamp: str) -> int:
+        """Remove every response with ``timestamp``; returns how many went."""
+        keep = np.fromiter(
+            (ts != timestamp for ts in self._timestamps), dtype=bool, count=self._n
+        )
+        removed = self._n - int(keep.sum())
+        if removed == 0:
+            return 0
+        gone = ~keep
+        self._fold_out(self.questions[:, gone], self.age_codes[gone], self.ts_ms[gone])
+        self.aggregates.remove(self.questions[:, gone], self.age_codes[gone])
+        n = self._n - removed
+        self._q[:, :n] = self.questions[:, keep]
+        self._age[:n] = self.age_codes[keep]
+        self._ts_ms[:n] = self.ts_ms[keep]
+        self._seq[:n] = self.seq[keep]
+        self._timestamps = [ts for ts, k in zip(self._timestamps, keep) if k]
+        self._n = n
+        if not self.stats_finite():
+            # Removing an overflowed row leaves inf - inf = NaN behind
+            print("Running statistics are not finite after a delete; rebuilding them from the columns")
+            self.refold()
+        self.version += 1
+        return removed
+
+    @_locked
+    def clear(self) -> None:
+        self._timestamps = []
+        self._n = 0
+        self.stats.reset()
+        self.group_stats = {}
+        self.timeline.reset()
+        self.aggregates.reset()
+        self.version += 1
+
+    @_locked
+    def reset(self, records: Iterable[Dict]) -> None:
+        """Replace the whole contents, e.g. after another process compacted the log."""
+        self.clear()
+        self.extend(records)
+
+    @_locked
+    def stats_snapshot(self) -> Tuple[int, SufficientStats]:
+        """(version, copy of the pooled statistics) taken atomically."""
+        return self.version, self.stats.copy()
+
+    @_locked
+    def stats_between(self, start_ms: Optional[int], end_ms: Optional[int]) -> SufficientStats:
+        """Pooled statistics of the responses timestamped in [start_ms, end_ms),
+        merged from the hourly timeline buckets (hour resolution)."""
+        return self.timeline.between(start_ms, end_ms)
+
+    @_locked
+    def time_mask(self, start_ms: Optional[int], end_ms: Optional[int]) -> np.ndarray:
+        """Rows inside the same (hour-aligned) slice ``stats_between`` covers."""
+        lo, hi = TimeBuckets.resolve(start_ms, end_ms)
+        ts = self.ts_ms
+        mask = ts != MISSING_TS
+        if lo is not None:
+            mask &= ts >= lo
+        if hi is not None:
+            mask &= ts < hi
+        return mask
+
+    @_locked
+    def strata(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Dict[int, SufficientStats]:
+        """Per-age-code statistics, for all responses (a copy of
+        ``group_stats``) or for a time slice (one grouped pass over its rows)."""
+        if start_ms is None and end_ms is None:
+            return {code: stats.copy() for code, stats in self.group_stats.items()}
+        keep = self.time_mask(start_ms, end_ms)
+        return grouped_stats(self.questions[:, keep], self.age_codes[keep])
+
+    @_locked
+    def stats_finite(self) -> bool:
+        """Whether the pooled, per-group, timeline and answer sums are all finite."""
+        return (
+            self.stats.is_finite()
+            and all(stats.is_finite() for stats in self.group_stats.values())
+            and bool(np.isfinite(self.timeline.mean).all() and np.isfinite(self.timeline.m2).all())
+            and bool(np.isfinite(self.aggregates.sum).all() and np.isfinite(self.aggregates.sum_sq).all())
+        )
+
+    @_locked
+    def refold(self) -> None:
+        """Recompute the running statistics and aggregates from the columns."""
+        self.stats.reset()
+        self.group_stats = {}
+        self.timeline.reset()
+        self.aggregates.reset()
+        self._fold_in(self.questions, self.age_codes, self.ts_ms)
+        self.aggregates.add(self.questions, self.age_codes)
+
+    @_locked
+    def aged_stats(self) -> SufficientStats:
+        """Statistics over the responses that have an age group."""
+        merged = SufficientStats()
+        for code, stats in self.group_stats.items():
+            if code != NO_AGE:
+                merged.merge(stats)
+        return merged
+
+    def age_code(self, label: Optional[str]) -> int:
+        """Map an age label to its int8 code, registering unknown labels.
+
+        The API only accepts the canonical groups; other labels can only come
+        from old or hand-edited data. Once the int8 codes run out they count
+        as having no age group rather than failing the load.
+        """
+        if label is None:
+            return NO_AGE
+        try:
+            return self.age_labels.index(label)
+        except ValueError:
+            if len(self.age_labels) >= np.iinfo(np.int8).max:
+                if not self._age_overflow:
+                    print(f"Too many distinct age groups; {label!r} and later new labels count as no age group")
+                    self._age_overflow = True
+                return NO_AGE
+            self.age_labels.append(label)
+            return len(self.age_labels) - 1
+
+    def _fold_in(self, questions: np.ndarray, age_codes: np.ndarray, ts_ms: np.ndarray) -> None:
+        rows, codes, ts_ms = _complete_rows(questions, age_codes, ts_ms)
+        for code, block in grouped_row_stats(rows, codes).items():
+            self.group_stats.setdefault(code, SufficientStats()).merge(block)
+            self.stats.merge(block)
+        timed = ts_ms != MISSING_TS
+        self.timeline.add(rows[timed], ts_ms[timed])
+
+    def _fold_out(self, questions: np.ndarray, age_codes: np.ndarray, ts_ms: np.ndarray) -> None:
+        rows, codes, ts_ms = _complete_rows(questions, age_codes, ts_ms)
+        for code, block in grouped_row_stats(rows, codes).items():
+            self.group_stats[code].subtract(block)
+            self.stats.subtract(block)
+        timed = ts_ms != MISSING_TS
+        self.timeline.remove(rows[timed], ts_ms[timed])
+
+    def _reserve(self, needed: int) -> None:
+        capacity = self._age.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        q = np.empty((len(QUESTION_COLUMNS), capacity), dtype=np.float64)
+        q[:, : self._n] = self.questions
+        age = np.empty(capacity, dtype=np.int8)
+        age[: self._n] = self.age_codes
+        ts_ms = np.empty(capacity, dtype=np.int64)
+        ts_ms[: self._n] = self.ts_ms
+        seq = np.empty(capacity, dtype=np.int64)
+        seq[: self._n] = self.seq
+        self._q, self._age, self._ts_ms, self._seq = q, age, ts_ms, seq
+
+
+class ResponsePage:
+    """A columnar slice of the store (same layout as the store arrays)."""
+
+    def __init__(
+        self,
+        timestamps: List[str],
+        age_codes: np.ndarray,
+        age_labels: List[str],
+        questions: np.ndarray,
+        ts_ms: np.ndarray,
+        seq: np.ndarray,
+    ) -> None:
+        self.timestamps = timestamps
+        self.age_codes = age_codes
+        self.age_labels = age_labels
+        self.questions = questions  # (6, k), one contiguous row per question
+        self.ts_ms = ts_ms
+        self.seq = seq
+
+    def __len__(self) -> int:
+        return len(self.seq)
+
+    def records(self, start: int = 0, stop: Optional[int] = None) -> List[Dict]:
+        """Rows ``start:stop`` as dicts in the SurveyResponse shape."""
+        lookup = self.age_labels + [None]
+        q = self.questions[:, start:stop].T.tolist()
+        ages = [lookup[c] for c in self.age_codes[start:stop].tolist()]
+        return [
+            {
+                "timestamp": ts,
+                "age_group": age,
+                **{col: _json_float(v) for col, v in zip(QUESTION_COLUMNS, row)},
+            }
+            for ts, age, row in zip(self.timestamps[start:stop], ages, q)
+        ]
+
+
+def _complete_rows(questions: np.ndarray, age_codes: np.ndarray, ts_ms: np.ndarray):
+    """Design rows of the complete (all answers finite) responses with their
+    age codes and epoch ms."""
+    complete = np.isfinite(questions).all(axis=0)
+    if complete.all():
+        return design_rows(questions, age_codes), age_codes, ts_ms
+    return design_rows(questions[:, complete], age_codes[complete]), age_codes[complete], ts_ms[complete]
+
+
+def _as_float(val) -> float:
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _json_float(val: float) -> Optional[float]:
+    return None if val != val else val
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Dict, List, Literal, Optional, Tuple, get_args
+
+import numpy as np
+
+from stats_engine import AGE_GROUPS, QUESTION_COLUMNS
+
+
+Distribution = Literal["normal", "uniform", "bimodal", "correlated"]
+DISTRIBUTIONS = get_args(Distribution)
+# Upper bound for one /api/admin/generate call
+MAX_SAMPLES = 100000
+# Share of synthetic respondents per age bin (same order as AGE_GROUPS)
+AGE_WEIGHTS = [0.1, 0.4, 0.3, 0.15, 0.05]
+DEFAULT_STD = 0.3
+DEFAULT_CORRELATION = 0.5
+
+
+def draw_answers(
+    rng: np.random.Generator,
+    n: int,
+    distribution_type: str,
+    correlation: float = DEFAULT_CORRELATION,
+    std: float = DEFAULT_STD,
+) -> np.ndarray:
+    """Draw an (n, 6) block of answers, clipped to [-1, 1] and rounded to 0.01.
+
+    - normal: independent N(0, std)
+    - uniform: U(-1, 1) (also used for unknown types)
+    - bimodal: N(+-0.5, 0.2) with the peak picked per answer
+    - correlated: multivariate normal, equicorrelated with ``correlation``
+    """
+    k = len(QUESTION_COLUMNS)
+    if distribution_type == "normal":
+        values = rng.normal(0.0, std, size=(n, k))
+    elif distribution_type == "bimodal":
+        peaks = np.where(rng.random((n, k)) > 0.5, 0.5, -0.5)
+        values = rng.normal(peaks, 0.2)
+    elif distribution_type == "correlated":
+        if not -1.0 / (k - 1) < correlation < 1.0:
+            raise ValueError(f"correlation must be in ({-1.0 / (k - 1):.2f}, 1) for {k} questions")
+        corr = np.full((k, k), correlation)
+        np.fill_diagonal(corr, 1.0)
+        chol = np.linalg.cholesky(corr) * std
+        values = rng.standard_normal((n, k)) @ chol.T
+    else:
+        values = rng.uniform(-1.0, 1.0, size=(n, k))
+    return np.round(np.clip(values, -1.0, 1.0), 2)
+
+
+def draw_age_codes(rng: np.random.Generator, n: int) -> np.ndarray:
+    return rng.choice(len(AGE_GROUPS), size=n, p=AGE_WEIGHTS).astype(np.int8)
+
+
+def make_timestamps(n: int, start: Optional[datetime] = None) -> Tuple[List[str], np.ndarray]:
+    """``n`` distinct isoformat timestamps, one microsecond apart.
+
+    Returns the strings and their epoch milliseconds.
+    """
+    start = start or datetime.now()
+    stamps = np.datetime64(start, "us") + np.arange(n)
+    ts_ms = stamps.astype("datetime64[ms]").astype(np.int64)
+    return np.datetime_as_string(stamps, unit="us").tolist(), ts_ms
+
+
+def generate_sample_columns(
+    n: int,
+    distribution_type: str,
+    seed: Optional[int] = None,
+    correlation: float = DEFAULT_CORRELATION,
+) -> Tuple[np.ndarray, np.ndarray, List[str], np.ndarray]:
+    """Vectorized synthetic responses as columns.
+
+    Returns (answers (6, n), age codes (n,), timestamps, epoch ms). Pass
+    ``seed`` for a reproducible draw.
+    """
+    rng = np.random.default_rng(seed)
+    answers = draw_answers(rng, n, distribution_type, correlation=correlation)
+    ages = draw_age_codes(rng, n)
+    timestamps, ts_ms = make_timestamps(n)
+    return np.ascontiguousarray(answers.T), ages, timestamps, ts_ms
+
+
+# JSON text for every value on the 0.01 grid (what draw_answers produces)
+_CENTI_TEXT = [repr(k / 100.0) for k in range(-100, 101)]
+
+
+def columns_to_jsonl(answers: np.ndarray, age_codes: np.ndarray, timestamps: List[str]) -> str:
+    """Encode generated columns as JSONL log lines without per-row dicts.
+
+    Equivalent to json-dumping ``columns_to_records`` output, but values are
+    looked up from a precomputed table of the 201 grid values.
+    """
+    idx = (np.rint(answers * 100).astype(np.int64) + 100).T.tolist()
+    ages = [AGE_GROUPS[c] for c in age_codes.tolist()]
+    text = _CENTI_TEXT
+    template = '{"timestamp":"%s","age_group":"%s","q1":%s,"q2":%s,"q3":%s,"q4":%s,"q5":%s,"q6":%s}\n'
+    return "".join(
+        template % (ts, age, text[a], text[b], text[c], text[d], text[e], text[f])
+        for ts, age, (a, b, c, d, e, f) in zip(timestamps, ages, idx)
+    )
+
+
+def columns_to_records(answers: np.ndarray, age_codes: np.ndarray, timestamps: List[str]) -> List[Dict]:
+    """Turn generated columns into SurveyResponse-shaped dicts."""
+    ages = [AGE_GROUPS[c] for c in age_codes.tolist()]
+    rows = answers.T.tolist()
+    return [
+        {"timestamp": ts, "age_group": age, **dict(zip(QUESTION_COLUMNS, row))}
+        for ts, age, row in zip(timestamps, ages, rows)
+    ]
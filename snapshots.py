@@ -0,0 +1,328 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import math
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, Callable, ContextManager, Dict, NamedTuple, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from result_cache import make_etag
+
+
+class Snapshot(NamedTuple):
+    version: int
+    status: int
+    body: bytes
+    etag: str
+    computed_at: str
+    n: int
+
+
+class SnapshotWorker:
+    """Background recompute of expensive read-only payloads.
+
+    ``builders`` maps a key to a function returning a JSON-ready payload
+    (raising HTTPException for "not enough data" style answers). After a
+    write, ``notify()`` wakes the worker, which rebuilds every payload on
+    ``run`` (the analytics pool) and swaps the new snapshots in. Recomputes
+    are debounced: at most one starts per ``min_interval`` seconds, and all
+    writes that land meanwhile are covered by the next one.
+
+    Readers get the latest completed snapshot straight away via ``get``;
+    only the very first request waits for a build. ``state`` returns the
+    (dataset version, response count) the snapshot is labelled with.
+    Dict payloads also get a ``computed_at`` key.
+
+    All payloads of a pass come from the same dataset version: a pass that
+    sees the version move while building is redone, the last time holding
+    ``lock`` (which writers take). ``bundles`` adds combined snapshots, e.g.
+    ``{"dashboard": {"regression_age": "regression-age", ...}}`` is one JSON
+    object with each named payload (``null`` plus an ``errors`` entry when
+    it is an error answer), spliced from the already serialized bodies.
+    ``subscribe`` lets long-lived connections follow a key as it changes.
+
+    A payload that fails to build (an exception, or e.g. NaN that cannot be
+    serialized) is not stored: readers keep the previous snapshot, or get a
+    503 with ``Retry-After`` when there is none, and each such read asks for
+    another pass (still at most one per ``min_interval``).
+
+    A pass still running after ``build_timeout`` seconds counts as stuck (a
+    thread cannot be killed, so it keeps its pool thread): no new pass
+    starts until it returns, reads of a snapshot older than the current
+    dataset version get a 503 instead of the stale payload, and ``stats``
+    reports it. When it does return its result is dropped and a fresh pass
+    is scheduled.
+    """
+
+    def __init__(
+        self,
+        builders: Dict[str, Callable[[], object]],
+        state: Callable[[], Tuple[int, int]],
+        run: Callable[..., Awaitable],
+        min_interval: float = 1.0,
+        bundles: Optional[Dict[str, Dict[str, str]]] = None,
+        lock: Optional[ContextManager] = None,
+        build_timeout: float = 60.0,
+    ) -> None:
+        self.builders = builders
+        self.state = state
+        self.run = run
+        self.min_interval = max(min_interval, 0.0)
+        self.bundles = bundles or {}
+        self.lock = lock if lock is not None else contextlib.nullcontext()
+        self.build_timeout = build_timeout
+        self._snapshots: Dict[str, Snapshot] = {}
+        self._failed: Set[str] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._published: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._current: Optional[asyncio.Task] = None
+        self._building: Optional[asyncio.Future] = None
+        self._build_started: Optional[float] = None
+        self._stuck = False
+        self._last_start = float("-inf")
+        self.runs = 0
+        self.failures = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.subscribers = 0
+        self.last_duration = None
+
+    async def get(self, key: str) -> Snapshot:
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            try:
+                await self.refresh()
+            except Exception:
+                pass  # counted and logged in _finished
+            snapshot = self._snapshots.get(key)
+            if snapshot is None:
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Could not compute '{key}' yet; retry shortly",
+                    headers={"Retry-After": self._retry_after()},
+                )
+        elif key in self._failed or snapshot.version != self.state()[0]:
+            if self._stuck and snapshot.version != self.state()[0]:
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"'{key}' is out of date: its rebuild has been running for {self._build_age():.0f}s",
+                    headers={"Retry-After": self._retry_after()},
+                )
+            # e.g. another worker process wrote, or the last pass failed:
+            # serve this one, rebuild behind it
+            self.notify()
+        return snapshot
+
+    def notify(self) -> None:
+        """Schedule a recompute (call from the event loop after a write)."""
+        self._ensure_started()
+        self._wake.set()
+
+    async def refresh(self) -> None:
+        """Recompute now, joining a recompute that is already running."""
+        self._ensure_started()
+        if self._stuck:
+            raise TimeoutError(f"snapshot build running for {self._build_age():.0f}s")
+        if self._current is None:
+            self._current = self._loop.create_task(self._recompute())
+            self._current.add_done_callback(self._finished)
+        await asyncio.shield(self._current)
+
+    async def subscribe(self, key: str, etag: Optional[str] = None,
+                        heartbeat: float = 15.0) -> AsyncIterator[Optional[Snapshot]]:
+        """Yield the snapshot for ``key`` (unless its ETag is ``etag``), then
+        each newer one as recomputes finish; ``None`` after ``heartbeat``
+        seconds without a change. All subscribers share the same snapshots,
+        so a change costs one recompute however many are connected."""
+        self.subscribers += 1
+        try:
+            while True:
+                try:
+                    snapshot = await self.get(key)
+                except HTTPException:
+                    snapshot = None  # nothing to send yet; wait for a pass
+                if snapshot is not None and snapshot.etag != etag:
+                    etag = snapshot.etag
+                    yield snapshot
+                    continue
+                try:
+                    await asyncio.wait_for(self._published.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self.subscribers -= 1
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict:
+        version = self.state()[0]
+        return {
+            "min_interval_s": self.min_interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "stuck": self._stuck,
+            "building_s": self._build_age(),
+            "subscribers": self.subscribers,
+            "last_duration_ms": None if self.last_duration is None else self.last_duration * 1000.0,
+            "computed_at": {key: s.computed_at for key, s in self._snapshots.items()},
+            "stale": sorted(key for key, s in self._snapshots.items() if s.version != version),
+            "failed": sorted(self._failed),
+        }
+
+    # ------------------------------------------------------------------
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or a new event loop (tests); old tasks died with the old loop
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._published = asyncio.Event()
+            self._current = None
+            self._building = None
+            self._stuck = False
+            self._task = None
+        if self._task is None:
+            self._task = loop.create_task(self._worker())
+
+    def _retry_after(self) -> str:
+        return str(max(1, math.ceil(self.min_interval)))
+
+    def _build_age(self) -> Optional[float]:
+        """Seconds the running build has taken so far (None when idle)."""
+        if self._build_started is None:
+            return None
+        return time.perf_counter() - self._build_started
+
+    def _build_done(self, build: asyncio.Future) -> None:
+        if self._building is not build:
+            return
+        self._building = self._build_started = None
+        if not build.cancelled():
+            build.exception()  # retrieved here when nobody awaited it
+        if self._stuck:
+            self._stuck = False
+            print("Stuck snapshot build returned; scheduling a fresh pass")
+            self.notify()
+
+    def _finished(self, task: asyncio.Task) -> None:
+        if self._current is task:
+            self._current = None
+        if not task.cancelled() and task.exception() is not None:
+            self.failures += 1
+            print(f"Snapshot recompute failed: {task.exception()}")
+
+    async def _worker(self) -> None:
+        while True:
+            await self._wake.wait()
+            delay = self._last_start + self.min_interval - self._loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # Everything written up to here is covered by this pass
+            self._wake.clear()
+            if self._up_to_date():
+                continue
+            try:
+                await self.refresh()
+            except Exception:
+                pass  # counted and logged in _finished
+
+    def _up_to_date(self) -> bool:
+        version = self.state()[0]
+        return not self._failed and len(self._snapshots) == len(self.builders) + len(self.bundles) and all(
+            s.version == version for s in self._snapshots.values()
+        )
+
+    async def _recompute(self) -> None:
+        self._last_start = self._loop.time()
+        started = time.perf_counter()
+        computed_at = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+        build = asyncio.ensure_future(self.run(self._build_all, computed_at))
+        self._building, self._build_started = build, started
+        build.add_done_callback(self._build_done)
+        try:
+            version, n, built, failed = await asyncio.wait_for(asyncio.shield(build), self.build_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._stuck = True
+            raise TimeoutError(f"snapshot build still running after {self.build_timeout:g}s") from None
+        self._snapshots.update({
+            key: Snapshot(version, status, body, make_etag(body), computed_at, n)
+            for key, (status, body) in built.items()
+            if key not in failed or key in self.bundles
+        })
+        self._failed = failed
+        self.runs += 1
+        self.last_duration = time.perf_counter() - started
+        # Wake subscribers; the next pass waits on a fresh event
+        self._published.set()
+        self._published = asyncio.Event()
+
+    def _build_all(self, computed_at: str) -> Tuple[int, int, Dict[str, Tuple[int, bytes]], Set[str]]:
+        """Build every payload from one dataset version (see class docstring).
+
+        Returns the version, response count, the payloads and the keys that
+        failed (their entries are error bodies, only used inside bundles;
+        bundles with a failed part count as failed too).
+        """
+        for _ in range(2):
+            version, n = self.state()
+            built, failed = self._build_once(computed_at)
+            if self.state()[0] == version:
+                break
+            self.retries += 1
+        else:
+            with self.lock:
+                version, n = self.state()
+                built, failed = self._build_once(computed_at)
+        for key, parts in self.bundles.items():
+            built[key] = (200, self._bundle(parts, built, version, n, computed_at))
+            if failed.intersection(parts.values()):
+                failed.add(key)
+        return version, n, built, failed
+
+    def _build_once(self, computed_at: str) -> Tuple[Dict[str, Tuple[int, bytes]], Set[str]]:
+        built, failed = {}, set()
+        for key, build in self.builders.items():
+            try:
+                try:
+                    payload, status = build(), 200
+                except HTTPException as e:
+                    payload, status = {"detail": e.detail}, e.status_code
+                if status == 200 and isinstance(payload, dict):
+                    payload = dict(payload, computed_at=computed_at)
+                built[key] = (status, JSONResponse(content=payload).body)
+            except Exception as e:
+                # e.g. NaN in a payload; keep it from taking the other keys down
+                self.failures += 1
+                print(f"Snapshot '{key}' failed: {e}")
+                failed.add(key)
+                built[key] = (503, JSONResponse(content={"detail": f"Could not compute '{key}'"}).body)
+        return built, failed
+
+    @staticmethod
+    def _bundle(parts: Dict[str, str], built: Dict[str, Tuple[int, bytes]],
+                version: int, n: int, computed_at: str) -> bytes:
+        head = json.dumps({"version": version, "n": n, "computed_at": computed_at}, separators=(",", ":"))
+        sections, errors = [], []
+        for name, key in parts.items():
+            status, body = built[key]
+            name = json.dumps(name).encode()
+            sections.append(name + b":" + (body if status == 200 else b"null"))
+            if status != 200:
+                errors.append(name + b":" + body)
+        return (
+            head[:-1].encode() + b"," + b",".join(sections)
+            + b',"errors":{' + b",".join(errors) + b"}}"
+        )
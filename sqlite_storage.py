@@ -0,0 +1,396 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from response_store import MISSING_TS, parse_timestamp_ms
+from stats_engine import QUESTION_COLUMNS
+from storage import AppendLog
+
+
+# Columns per table, in the order records are rebuilt. Keys outside the
+# schema survive in the JSON ``extra`` column.
+SCHEMAS: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    "responses": (("timestamp", "TEXT"), ("age_group", "TEXT"))
+    + tuple((col, "REAL") for col in QUESTION_COLUMNS),
+    "reminders": (("email", "TEXT"), ("response_count", "INTEGER"), ("timestamp", "TEXT")),
+}
+# Secondary indexes; ts_ms is the parsed timestamp kept for range scans
+INDEXES: Dict[str, Tuple[str, ...]] = {
+    "responses": ("timestamp", "ts_ms", "age_group"),
+    "reminders": ("timestamp",),
+}
+
+
+def read_legacy(log_path: str, json_path: str, key: str) -> List[Dict]:
+    """Records from the append log if it exists, else from the old JSON file."""
+    if os.path.exists(log_path):
+        return AppendLog(log_path).load()
+    if os.path.exists(json_path):
+        with open(json_path, "r") as f:
+            legacy = json.load(f)
+        return legacy.get(key, []) if isinstance(legacy, dict) else []
+    return []
+
+
+class SQLiteLog:
+    """SQLite storage for one record table, a drop-in for ``AppendLog``.
+
+    The database runs in WAL mode so readers never block the writer, and
+    several processes can share it: ``locked()`` opens a ``BEGIN IMMEDIATE``
+    transaction (the database-wide write lock) that commits when the
+    outermost block exits. Deletes by timestamp go through an index instead
+    of a file rewrite, and bulk inserts are a single ``executemany``.
+
+    Change tracking mirrors ``AppendLog.read_changes``: rows with an id above
+    the last one seen are ``("add", record)``, entries of the ``changes``
+    table are ``("delete", timestamp)`` (ordered against the adds by the row
+    id current at delete time), and a bumped ``generation`` (rewrite/clear)
+    is ``("reset", records)``. Only the newest ``changes_keep`` entries are
+    kept: older ones are pruned as deletes accumulate (and on ``compact``),
+    and ``<table>.pruned`` records the last id dropped. A reader that had not
+    got that far gets a ``("reset", records)`` instead, as after a rewrite.
+
+    Every write transaction also bumps ``<table>.version`` and keeps
+    ``<table>.count`` up to date in the ``meta`` table. ``changed()`` and
+    ``count`` read those single rows on a separate read-only connection,
+    so they are O(1) and never wait for a write in progress (WAL readers
+    are not blocked by the writer).
+
+    ``migrate`` is called once, when the table has never been filled, to
+    import existing records.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        table: str,
+        migrate: Optional[Callable[[], List[Dict]]] = None,
+        track_changes: bool = False,
+        changes_keep: int = 1024,
+    ) -> None:
+        self.path = path
+        self.table = table
+        self.migrate = migrate
+        self.track_changes = track_changes
+        self.changes_keep = changes_keep
+        self.columns = [name for name, _ in SCHEMAS[table]]
+        self._has_ts_ms = "ts_ms" in INDEXES[table]
+
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        # Read-only connection for count/changed(); its own lock, never held
+        # across a write
+        self._watch_lock = threading.Lock()
+        self._watch_conn: Optional[sqlite3.Connection] = None
+        self._generation = None
+        self._last_id = 0
+        self._last_change = 0
+        self._seen_version = None
+        self._pending: List[Tuple] = []
+
+        insert_cols = self.columns + (["ts_ms"] if self._has_ts_ms else []) + ["extra"]
+        self._insert_sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            table, ", ".join(insert_cols), ", ".join("?" * len(insert_cols))
+        )
+        self._select_sql = "SELECT id, {}, extra FROM {}".format(", ".join(self.columns), table)
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    @property
+    def count(self) -> int:
+        """Committed records (one meta row, not a table scan)."""
+        return self._read_meta("count")
+
+    def load(self) -> List[Dict]:
+        """All records in insertion order; discards pending change operations."""
+        with self.locked():
+            self._pending = []
+            return self._snapshot()
+
+    def changed(self) -> bool:
+        """Cheap check for commits from other connections not yet read."""
+        if self._pending:
+            return True
+        return self._read_meta("version") != self._seen_version
+
+    def read_changes(self) -> List[Tuple]:
+        with self.locked():
+            self._catch_up()
+            ops, self._pending = self._pending, []
+            return ops
+
+    def cursor(self) -> Dict:
+        """Last row id, change id and generation seen (see ``AppendLog.cursor``)."""
+        with self.locked():
+            return {"generation": self._generation, "last_id": self._last_id, "last_change": self._last_change}
+
+    def restore(self, cursor: Dict) -> bool:
+        """Continue from a ``cursor`` (see ``AppendLog.restore``); False if
+        the table has been rewritten since."""
+        with self.locked():
+            if cursor.get("generation") != self._generation_now():
+                return False
+            if cursor.get("last_change", -1) < self._meta(self._db(), "pruned"):
+                return False
+            if not 0 <= cursor.get("last_id", -1) <= self._max_id():
+                return False
+            self._generation = cursor["generation"]
+            self._last_id, self._last_change = cursor["last_id"], cursor["last_change"]
+            self._seen_version = None
+            self._pending = []
+            return True
+
+    @contextmanager
+    def locked(self):
+        """Hold the database write lock, across threads and processes (re-entrant)."""
+        with self._lock:
+            conn = self._db()
+            if self._depth == 0:
+                conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    conn.rollback()
+                raise
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    conn.commit()
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def append(self, record: Dict) -> None:
+        self.append_many([record])
+
+    def append_many(self, records: List[Dict]) -> None:
+        if records:
+            self._insert([self._row(r) for r in records])
+
+    def append_columns(self, answers, age_labels: Sequence[str], timestamps: Sequence[str], ts_ms) -> None:
+        """Bulk insert responses given as columns (answers (6, n))."""
+        rows = zip(timestamps, age_labels, *answers.tolist(), ts_ms.tolist(), [None] * len(timestamps))
+        self._insert(list(rows))
+
+    def delete(self, timestamp: str, removed: int = 0) -> None:
+        """Delete every record with ``timestamp`` (index lookup)."""
+        with self.locked():
+            self._catch_up()
+            conn = self._db()
+            deleted = conn.execute(f"DELETE FROM {self.table} WHERE timestamp = ?", (timestamp,)).rowcount
+            cur = conn.execute(
+                "INSERT INTO changes (tbl, upto, timestamp) VALUES (?, ?, ?)",
+                (self.table, self._max_id(), timestamp),
+            )
+            self._last_change = cur.lastrowid
+            self._bump(-deleted)
+            if self._last_change - self._meta(conn, "pruned") > 2 * self.changes_keep:
+                self._prune_changes()
+
+    def rewrite(self, records: List[Dict]) -> None:
+        """Replace the table contents with ``records``."""
+        with self.locked():
+            conn = self._db()
+            conn.execute(f"DELETE FROM {self.table}")
+            conn.execute("DELETE FROM changes WHERE tbl = ?", (self.table,))
+            conn.executemany(self._insert_sql, [self._row(r) for r in records])
+            conn.execute(
+                "UPDATE meta SET value = value + 1 WHERE key = ?", (f"{self.table}.generation",)
+            )
+            conn.execute("UPDATE meta SET value = ? WHERE key = ?", (len(records), f"{self.table}.count"))
+            self._bump(0)
+            self._mark_seen()
+
+    def compact(self) -> None:
+        """Prune old ``changes`` entries; deleted rows are removed in place."""
+        with self.locked():
+            self._catch_up()
+            self._prune_changes()
+
+    def sync(self) -> None:
+        """Commits are durable already (synchronous=FULL)."""
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None and self._depth == 0:
+                self._conn.close()
+                self._conn = None
+        with self._watch_lock:
+            if self._watch_conn is not None:
+                self._watch_conn.close()
+                self._watch_conn = None
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._conn = conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._create_schema(conn)
+                self._migrate(conn)
+                # Databases from before the counters existed are counted once
+                conn.execute(
+                    f"INSERT OR IGNORE INTO meta (key, value) SELECT ?, COUNT(*) FROM {self.table}",
+                    (f"{self.table}.count",),
+                )
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            self._mark_seen()
+        return self._conn
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        cols = ", ".join(f"{name} {kind}" for name, kind in SCHEMAS[self.table])
+        if self._has_ts_ms:
+            cols += ", ts_ms INTEGER"
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} (id INTEGER PRIMARY KEY AUTOINCREMENT, {cols}, extra TEXT)"
+        )
+        for col in INDEXES[self.table]:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_{col} ON {self.table} ({col})")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS changes "
+            "(id INTEGER PRIMARY KEY AUTOINCREMENT, tbl TEXT NOT NULL, upto INTEGER NOT NULL, timestamp TEXT)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        for key in ("generation", "version", "pruned"):
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, 0)", (f"{self.table}.{key}",))
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        key = f"{self.table}.migrated"
+        if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+            return
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, 1)", (key,))
+        if self.migrate is None or conn.execute(f"SELECT 1 FROM {self.table} LIMIT 1").fetchone():
+            return
+        records = self.migrate()
+        print(f"Migrating {len(records)} records into {self.path} ({self.table})")
+        conn.executemany(self._insert_sql, [self._row(r) for r in records])
+
+    def _insert(self, rows: List[Tuple]) -> None:
+        with self.locked():
+            # Rows other processes added come before ours in id order
+            self._catch_up()
+            self._db().executemany(self._insert_sql, rows)
+            self._last_id = self._max_id()
+            self._bump(len(rows))
+
+    def _bump(self, added: int) -> None:
+        """Count a write of ours in the meta counters (caller holds
+        ``locked()`` and has caught up, so the new version is seen)."""
+        conn = self._db()
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = ?", (f"{self.table}.version",))
+        if added:
+            conn.execute("UPDATE meta SET value = value + ? WHERE key = ?", (added, f"{self.table}.count"))
+        self._seen_version = self._meta(conn, "version")
+
+    def _prune_changes(self) -> None:
+        """Drop all but the newest ``changes_keep`` delete entries (caller
+        holds ``locked()``)."""
+        conn = self._db()
+        cutoff = conn.execute(
+            "SELECT id FROM changes WHERE tbl = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+            (self.table, self.changes_keep),
+        ).fetchone()
+        if cutoff is None:
+            return
+        conn.execute("DELETE FROM changes WHERE tbl = ? AND id <= ?", (self.table, cutoff[0]))
+        conn.execute("UPDATE meta SET value = ? WHERE key = ?", (cutoff[0], f"{self.table}.pruned"))
+
+    def _meta(self, conn: sqlite3.Connection, key: str) -> int:
+        return conn.execute("SELECT value FROM meta WHERE key = ?", (f"{self.table}.{key}",)).fetchone()[0]
+
+    def _read_meta(self, key: str) -> int:
+        """A committed meta counter, read without the write lock."""
+        if self._conn is None:
+            with self._lock:
+                self._db()  # creates the schema and counters
+        with self._watch_lock:
+            if self._watch_conn is None:
+                self._watch_conn = sqlite3.connect(
+                    f"file:{os.path.abspath(self.path)}?mode=ro", uri=True,
+                    timeout=30.0, isolation_level=None, check_same_thread=False,
+                )
+            return self._meta(self._watch_conn, key)
+
+    def _row(self, record: Dict) -> Tuple:
+        values = [record.get(col) for col in self.columns]
+        if self._has_ts_ms:
+            ts_ms = parse_timestamp_ms(record.get("timestamp"))
+            values.append(None if ts_ms == MISSING_TS else ts_ms)
+        extra = {k: v for k, v in record.items() if k not in self.columns}
+        values.append(json.dumps(extra) if extra else None)
+        return tuple(values)
+
+    def _record(self, row: Tuple) -> Dict:
+        record = {col: val for col, val in zip(self.columns, row[1:-1]) if val is not None}
+        if row[-1]:
+            record.update(json.loads(row[-1]))
+        return record
+
+    def _max_id(self) -> int:
+        return self._db().execute(f"SELECT COALESCE(MAX(id), 0) FROM {self.table}").fetchone()[0]
+
+    def _generation_now(self) -> int:
+        return self._meta(self._db(), "generation")
+
+    def _mark_seen(self) -> None:
+        conn = self._db()
+        self._generation = self._generation_now()
+        self._last_id = self._max_id()
+        last_change = conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM changes WHERE tbl = ?", (self.table,)
+        ).fetchone()[0]
+        # Nothing left to read below the pruned mark (e.g. after a rewrite)
+        self._last_change = max(last_change, self._meta(conn, "pruned"))
+        self._seen_version = self._meta(conn, "version")
+
+    def _snapshot(self) -> List[Dict]:
+        rows = self._db().execute(self._select_sql + " ORDER BY id").fetchall()
+        self._mark_seen()
+        return [self._record(row) for row in rows]
+
+    def _catch_up(self) -> None:
+        """Queue other processes' changes (caller holds ``locked()``)."""
+        conn = self._db()
+        stale = self._generation_now() != self._generation
+        if not stale and self.track_changes:
+            # Deletes we had not read yet were pruned: start over
+            stale = self._last_change < self._meta(conn, "pruned")
+        if stale:
+            records = self._snapshot()
+            if self.track_changes:
+                self._pending = [("reset", records)]
+            return
+        if not self.track_changes:
+            self._mark_seen()
+            return
+        rows = conn.execute(self._select_sql + " WHERE id > ? ORDER BY id", (self._last_id,)).fetchall()
+        deletes = conn.execute(
+            "SELECT upto, timestamp FROM changes WHERE tbl = ? AND id > ? ORDER BY id",
+            (self.table, self._last_change),
+        ).fetchall()
+        i = 0
+        for upto, timestamp in deletes:
+            while i < len(rows) and rows[i][0] <= upto:
+                self._pending.append(("add", self._record(rows[i])))
+                i += 1
+            self._pending.append(("delete", timestamp))
+        self._pending.extend(("add", self._record(row)) for row in rows[i:])
+        self._mark_seen()
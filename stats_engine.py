@@ -0,0 +1,508 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas and scipy are imported where they are used: both are slow to import
+# and the submit path never needs them.
+
+
+QUESTION_COLUMNS: List[str] = [f"q{i}" for i in range(1, 7)]
+# Canonical age bins; their position is the int8 age code used by the
+# ResponseStore. Unknown labels get codes after these, -1 means "no age".
+AGE_GROUPS: List[str] = ["16-18", "19-22", "23-26", "27-40", "40+"]
+NO_AGE = -1
+
+# Variables tracked by the engine: the six answers followed by one 0/1
+# indicator per canonical age bin (same names pd.get_dummies(prefix='age')
+# would produce).
+AGE_DUMMY_COLUMNS: List[str] = [f"age_{g}" for g in AGE_GROUPS]
+VARIABLES: List[str] = QUESTION_COLUMNS + AGE_DUMMY_COLUMNS
+N_QUESTIONS = len(QUESTION_COLUMNS)
+
+
+def design_rows(questions: np.ndarray, age_codes: np.ndarray, return_codes: bool = False):
+    """Build the (m, p) engine rows from store columns.
+
+    ``questions`` is (6, n) as kept by the ResponseStore. Rows with a missing
+    (or non-finite) answer are dropped (complete cases only, like
+    ``dropna``); a missing or
+    unknown age gives all-zero indicators, like ``pd.get_dummies``. With
+    ``return_codes`` the age codes of the kept rows are returned as well.
+    """
+    q = np.asarray(questions, dtype=np.float64)
+    codes = np.asarray(age_codes)
+    complete = np.isfinite(q).all(axis=0)
+    q = q[:, complete]
+    codes = codes[complete]
+    rows = np.zeros((q.shape[1], len(VARIABLES)), dtype=np.float64)
+    rows[:, :N_QUESTIONS] = q.T
+    known = (codes != NO_AGE) & (codes < len(AGE_GROUPS))
+    rows[np.nonzero(known)[0], N_QUESTIONS + codes[known].astype(np.int64)] = 1.0
+    if return_codes:
+        return rows, codes
+    return rows
+
+
+def grouped_stats(questions: np.ndarray, age_codes: np.ndarray) -> Dict[int, "SufficientStats"]:
+    """Per-age-code statistics for a block of store columns."""
+    return grouped_row_stats(*design_rows(questions, age_codes, return_codes=True))
+
+
+def grouped_row_stats(rows: np.ndarray, codes: np.ndarray) -> Dict[int, "SufficientStats"]:
+    """Per-age-code statistics for design rows and their age codes."""
+    if len(codes) and codes.min() == codes.max():
+        return {int(codes[0]): SufficientStats.from_rows(rows)}
+    return {
+        int(code): SufficientStats.from_rows(rows[codes == code])
+        for code in np.unique(codes)
+    }
+
+
+class SufficientStats:
+    """Running count, mean vector and co-moment matrix over ``VARIABLES``.
+
+    ``m2`` is the centered cross-product matrix sum((x - mean)(x - mean)'),
+    i.e. X'X of the centered data. Rows are folded in and out with the
+    Welford / Chan et al. pairwise update, which stays numerically stable
+    and costs O(p^2) per row regardless of how many rows came before.
+    Covariances, correlations and OLS fits are then derived in O(p^3).
+    """
+
+    def __init__(self, p: int = len(VARIABLES)) -> None:
+        self.n = 0
+        self.mean = np.zeros(p, dtype=np.float64)
+        self.m2 = np.zeros((p, p), dtype=np.float64)
+
+    @property
+    def p(self) -> int:
+        return self.mean.shape[0]
+
+    @classmethod
+    def from_rows(cls, rows: np.ndarray) -> "SufficientStats":
+        """Two-pass (centered) statistics for a block of rows."""
+        rows = np.asarray(rows, dtype=np.float64)
+        stats = cls(rows.shape[1])
+        if rows.shape[0] == 0:
+            return stats
+        stats.n = rows.shape[0]
+        stats.mean = rows.mean(axis=0)
+        centered = rows - stats.mean
+        stats.m2 = centered.T @ centered
+        return stats
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "SufficientStats":
+        """Statistics for a DataFrame of raw responses (list-of-dicts shape)."""
+        import pandas as pd
+
+        q = np.vstack([
+            pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)
+            if col in df.columns else np.full(len(df), np.nan)
+            for col in QUESTION_COLUMNS
+        ])
+        if "age_group" in df.columns:
+            lookup = {g: i for i, g in enumerate(AGE_GROUPS)}
+            codes = np.array([lookup.get(a, NO_AGE) for a in df["age_group"]], dtype=np.int8)
+        else:
+            codes = np.full(len(df), NO_AGE, dtype=np.int8)
+        return cls.from_rows(design_rows(q, codes))
+
+    def copy(self) -> "SufficientStats":
+        other = SufficientStats(self.p)
+        other.n = self.n
+        other.mean = self.mean.copy()
+        other.m2 = self.m2.copy()
+        return other
+
+    def reset(self) -> None:
+        self.n = 0
+        self.mean[:] = 0.0
+        self.m2[:] = 0.0
+
+    def is_finite(self) -> bool:
+        """False once an overflow (or inf - inf on removal) got into the moments."""
+        return bool(np.isfinite(self.mean).all() and np.isfinite(self.m2).all())
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+    def merge(self, other: "SufficientStats") -> None:
+        """Fold another block of rows in (Chan et al. parallel update)."""
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.n, self.mean, self.m2 = other.n, other.mean.copy(), other.m2.copy()
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + np.outer(delta, delta) * (self.n * other.n / n)
+        self.mean += delta * (other.n / n)
+        self.n = n
+
+    def subtract(self, other: "SufficientStats") -> None:
+        """Remove a block of rows that was previously merged in."""
+        if other.n == 0:
+            return
+        n = self.n - other.n
+        if n < 0:
+            raise ValueError("Cannot remove more rows than were added")
+        if n == 0:
+            self.reset()
+            return
+        mean = (self.n * self.mean - other.n * other.mean) / n
+        delta = other.mean - mean
+        self.m2 -= other.m2 + np.outer(delta, delta) * (n * other.n / self.n)
+        self.mean = mean
+        self.n = n
+
+    def add_rows(self, rows: np.ndarray) -> None:
+        """Fold rows in; rows with a non-finite value are skipped."""
+        self.merge(SufficientStats.from_rows(_finite_rows(rows)))
+
+    def remove_rows(self, rows: np.ndarray) -> None:
+        """Remove rows given to ``add_rows`` (skipping the same ones)."""
+        self.subtract(SufficientStats.from_rows(_finite_rows(rows)))
+
+    # ------------------------------------------------------------------
+    # Derived quantities
+    # ------------------------------------------------------------------
+    def cov(self, idx: Optional[Sequence[int]] = None) -> np.ndarray:
+        """Sample covariance (ddof=1) of the selected variables."""
+        m2 = self.m2 if idx is None else self.m2[np.ix_(idx, idx)]
+        if self.n < 2:
+            return np.full(m2.shape, np.nan)
+        return m2 / (self.n - 1)
+
+    def corr(self, idx: Optional[Sequence[int]] = None) -> np.ndarray:
+        """Pearson correlation of the selected variables (NaN for constants)."""
+        cov = self.cov(idx)
+        sd = np.sqrt(np.diag(cov))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = cov / np.outer(sd, sd)
+        corr = np.clip(corr, -1.0, 1.0)
+        np.fill_diagonal(corr, np.where(sd > 0, 1.0, np.nan))
+        return corr
+
+    def age_counts(self) -> np.ndarray:
+        """Number of complete rows in each canonical age bin."""
+        return np.rint(self.mean[N_QUESTIONS:] * self.n).astype(np.int64)
+
+    def age_dummy_indices(self) -> List[int]:
+        """Variable indices matching ``pd.get_dummies(..., drop_first=True)``.
+
+        Only bins that actually occur get a column, and the first occurring
+        bin is the reference category.
+        """
+        present = [N_QUESTIONS + i for i, c in enumerate(self.age_counts()) if c > 0]
+        return present[1:]
+
+
+def _finite_rows(rows: np.ndarray) -> np.ndarray:
+    rows = np.asarray(rows, dtype=np.float64)
+    if rows.ndim != 2 or np.isfinite(rows).all():
+        return rows
+    return rows[np.isfinite(rows).all(axis=1)]
+
+
+def _require_finite(*arrays: np.ndarray) -> None:
+    """No model from non-finite statistics: LAPACK may never return on
+    inf/NaN input, so callers get an error to report instead."""
+    if not all(np.isfinite(a).all() for a in arrays):
+        raise ValueError("statistics are not finite (an overflowing answer?); no model")
+
+
+def _two_sided_pvalues(tvalues, df_resid):
+    from scipy import special
+
+    return 2.0 * special.stdtr(df_resid, -np.abs(tvalues))
+
+
+def ols_from_stats(stats: SufficientStats, target: int, predictors: Sequence[int]) -> Dict:
+    """OLS of one variable on others (plus intercept) from the statistics.
+
+    Returns the same quantities statsmodels' OLS results expose, with the
+    intercept first in ``params``/``bse``/``tvalues``/``pvalues``.
+    """
+    predictors = list(predictors)
+    n = stats.n
+    k = len(predictors) + 1
+    df_resid = n - k
+    sxx = stats.m2[np.ix_(predictors, predictors)]
+    sxy = stats.m2[predictors, target]
+    syy = stats.m2[target, target]
+    xbar = stats.mean[predictors]
+    _require_finite(sxx, sxy, syy, xbar, stats.mean[target])
+
+    sxx_inv = np.linalg.pinv(sxx)
+    slopes = sxx_inv @ sxy
+    intercept = stats.mean[target] - xbar @ slopes
+
+    sse = max(syy - sxy @ slopes, 0.0)
+    mse_resid = sse / df_resid if df_resid > 0 else float("nan")
+    var_slopes = mse_resid * np.diag(sxx_inv)
+    var_intercept = mse_resid * (1.0 / n + xbar @ sxx_inv @ xbar)
+
+    params = np.concatenate([[intercept], slopes])
+    bse = np.sqrt(np.concatenate([[var_intercept], var_slopes]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tvalues = params / bse
+        rsquared = 1.0 - sse / syy if syy > 0 else float("nan")
+    pvalues = _two_sided_pvalues(tvalues, df_resid)
+    rsquared_adj = 1.0 - (n - 1) / df_resid * (1.0 - rsquared) if df_resid > 0 else float("nan")
+
+    return {
+        "params": params,
+        "bse": bse,
+        "tvalues": tvalues,
+        "pvalues": pvalues,
+        "rsquared": float(rsquared),
+        "rsquared_adj": float(rsquared_adj),
+        "mse_resid": float(mse_resid),
+        "nobs": n,
+        "df_resid": df_resid,
+    }
+
+
+def loo_ols_from_stats(
+    stats: SufficientStats,
+    targets: Sequence[int],
+    extra_predictors: Sequence[int] = (),
+) -> List[Dict]:
+    """Fit every "target on all other variables" model with one inversion.
+
+    With V = targets + extra_predictors and P = inv(S_VV), the regression of
+    target t on V minus t is read straight off row t of the precision matrix
+    (the sweep-operator / block-inversion identities):
+
+      slopes = -P[t, -t] / P[t, t]          SSE = 1 / P[t, t]
+      inv(S[-t, -t]) = P[-t, -t] - P[-t, t] P[t, -t] / P[t, t]
+
+    so all models come from a single Gram matrix, vectorized across targets.
+    Predictors keep their order in V. Returns one dict per target in the
+    ``ols_from_stats`` format; falls back to it when S_VV is singular.
+    Raises ValueError when the statistics are not finite.
+    """
+    targets = list(targets)
+    variables = targets + list(extra_predictors)
+    t_count, p = len(targets), len(variables)
+    n = stats.n
+    df_resid = n - p  # p - 1 predictors plus the intercept
+    gram = stats.m2[np.ix_(variables, variables)]
+    _require_finite(gram, stats.mean[variables])
+
+    try:
+        if np.linalg.cond(gram) > 1e12:
+            raise np.linalg.LinAlgError("ill-conditioned Gram matrix")
+        prec = np.linalg.inv(gram)
+    except np.linalg.LinAlgError:
+        return [
+            ols_from_stats(stats, v, [u for u in variables if u != v])
+            for v in targets
+        ]
+
+    rows = prec[:t_count]                       # (T, p)
+    ptt = np.diag(prec)[:t_count]               # (T,)
+    mean = stats.mean[variables]
+    # Drop each target's own column to get its predictor layout
+    others = ~np.eye(t_count, p, dtype=bool)
+
+    slopes = (-rows / ptt[:, None])[others].reshape(t_count, p - 1)
+    mean_x = np.broadcast_to(mean, (t_count, p))[others].reshape(t_count, p - 1)
+    intercept = mean[:t_count] - (slopes * mean_x).sum(axis=1)
+
+    sse = 1.0 / ptt
+    syy = np.diag(gram)[:t_count]
+    mse_resid = sse / df_resid if df_resid > 0 else np.full(t_count, np.nan)
+
+    # Diagonal of each downdated inverse and the quadratic form xbar' inv xbar
+    inv_diag = (np.diag(prec)[None, :] - rows ** 2 / ptt[:, None])[others].reshape(t_count, p - 1)
+    pm = prec @ mean
+    mt = mean[:t_count]
+    quad = (mean @ pm - 2.0 * mt * pm[:t_count] + mt ** 2 * ptt) - (pm[:t_count] - mt * ptt) ** 2 / ptt
+
+    params = np.column_stack([intercept, slopes])
+    bse = np.sqrt(np.column_stack([
+        mse_resid * (1.0 / n + quad),
+        mse_resid[:, None] * inv_diag,
+    ]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tvalues = params / bse
+        rsquared = np.where(syy > 0, 1.0 - sse / syy, np.nan)
+    pvalues = _two_sided_pvalues(tvalues, df_resid)
+    if df_resid > 0:
+        rsquared_adj = 1.0 - (n - 1) / df_resid * (1.0 - rsquared)
+    else:
+        rsquared_adj = np.full(t_count, np.nan)
+
+    return [
+        {
+            "params": params[t],
+            "bse": bse[t],
+            "tvalues": tvalues[t],
+            "pvalues": pvalues[t],
+            "rsquared": float(rsquared[t]),
+            "rsquared_adj": float(rsquared_adj[t]),
+            "mse_resid": float(mse_resid[t]),
+            "nobs": n,
+            "df_resid": df_resid,
+        }
+        for t in range(t_count)
+    ]
+
+
+def multi_target_ols_from_stats(
+    stats: SufficientStats,
+    targets: Sequence[int],
+    predictors: Sequence[int],
+) -> List[Dict]:
+    """Regress several targets on the same predictors (plus intercept).
+
+    The predictor Gram matrix is Cholesky-factorized once and every target
+    is solved against that factorization together (multi-response least
+    squares). Returns one ``ols_from_stats``-style dict per target; falls
+    back to it when the Gram matrix is not positive definite. Raises
+    ValueError when the statistics are not finite.
+    """
+    targets, predictors = list(targets), list(predictors)
+    if not targets:
+        return []
+    n = stats.n
+    k = len(predictors) + 1
+    df_resid = n - k
+    sxx = stats.m2[np.ix_(predictors, predictors)]
+    sxy = stats.m2[np.ix_(predictors, targets)]            # (p, T)
+    syy = np.diag(stats.m2)[targets]
+    _require_finite(sxx, sxy, syy, stats.mean[predictors], stats.mean[targets])
+
+    from scipy import linalg
+
+    try:
+        factor = linalg.cho_factor(sxx)
+    except (linalg.LinAlgError, ValueError):
+        return [ols_from_stats(stats, t, predictors) for t in targets]
+    slopes = linalg.cho_solve(factor, sxy)                   # (p, T)
+    sxx_inv = linalg.cho_solve(factor, np.eye(len(predictors)))
+    xbar = stats.mean[predictors]
+    intercept = stats.mean[targets] - xbar @ slopes
+
+    sse = np.clip(syy - (sxy * slopes).sum(axis=0), 0.0, None)
+    mse_resid = sse / df_resid if df_resid > 0 else np.full(len(targets), np.nan)
+    params = np.vstack([intercept, slopes]).T                # (T, k)
+    bse = np.sqrt(np.column_stack([
+        mse_resid * (1.0 / n + xbar @ sxx_inv @ xbar),
+        mse_resid[:, None] * np.diag(sxx_inv)[None, :],
+    ]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tvalues = params / bse
+        rsquared = np.where(syy > 0, 1.0 - sse / syy, np.nan)
+    pvalues = _two_sided_pvalues(tvalues, df_resid)
+    if df_resid > 0:
+        rsquared_adj = 1.0 - (n - 1) / df_resid * (1.0 - rsquared)
+    else:
+        rsquared_adj = np.full(len(targets), np.nan)
+
+    return [
+        {
+            "params": params[i],
+            "bse": bse[i],
+            "tvalues": tvalues[i],
+            "pvalues": pvalues[i],
+            "rsquared": float(rsquared[i]),
+            "rsquared_adj": float(rsquared_adj[i]),
+            "mse_resid": float(mse_resid[i]),
+            "nobs": n,
+            "df_resid": df_resid,
+        }
+        for i in range(len(targets))
+    ]
+
+
+def regression_entry(
+    model: Dict,
+    target_idx: int,
+    predictor_indices: Sequence[int],
+    predictor_labels: Sequence[str],
+) -> Dict:
+    """One question model as served by /api/regression (pooled and per age
+    group alike), from an ``ols_from_stats``-style dict; NaN becomes None."""
+    def _json(values):
+        return np.where(np.isfinite(values), values, None).tolist()
+
+    return {
+        "targetQuestion": f"Question {target_idx + 1}",
+        "targetIdx": target_idx,
+        "predictorIndices": list(predictor_indices),
+        "predictorLabels": list(predictor_labels),
+        "beta": _json(model["params"]),
+        "standardErrors": _json(model["bse"]),
+        "tStats": _json(model["tvalues"]),
+        "pValues": _json(model["pvalues"]),
+        "r2": _json(model["rsquared"]),
+        "adjR2": _json(model["rsquared_adj"]),
+        "rmse": _json(np.sqrt(model["mse_resid"])),
+        "n": int(model["nobs"]),
+        "method": "OLS",
+    }
+
+
+def stacked_loo_ols(n: np.ndarray, mean: np.ndarray, m2: np.ndarray) -> Dict[str, np.ndarray]:
+    """``loo_ols_from_stats`` for a stack of G independent groups at once.
+
+    ``n`` (G,), ``mean`` (G, p) and ``m2`` (G, p, p) are the groups'
+    statistics over p variables; every variable is regressed on the other
+    p - 1 (plus intercept). One batched inversion gives all G * p models.
+    Returns arrays with leading (G, p) axes (params/bse/tvalues/pvalues have
+    the intercept first) plus per-group ``df_resid``; models of groups with
+    too few rows or a singular Gram matrix are NaN.
+    """
+    n = np.asarray(n, dtype=np.int64)
+    g, p = mean.shape
+    ok = (n > p) & np.all(np.isfinite(m2), axis=(1, 2)) & np.all(np.isfinite(mean), axis=1)
+    ok[ok] = np.linalg.cond(m2[ok]) < 1e12
+    prec = np.linalg.inv(np.where(ok[:, None, None], m2, np.eye(p)))
+    ptt = np.diagonal(prec, axis1=1, axis2=2)                 # (G, p)
+    others = ~np.eye(p, dtype=bool)
+
+    slopes = (-prec / ptt[:, :, None])[:, others].reshape(g, p, p - 1)
+    mean_x = np.broadcast_to(mean[:, None, :], (g, p, p))[:, others].reshape(g, p, p - 1)
+    intercept = mean - (slopes * mean_x).sum(axis=2)
+
+    df_resid = n - p
+    safe_df = np.where(df_resid > 0, df_resid, 1)
+    sse = 1.0 / ptt
+    syy = np.diagonal(m2, axis1=1, axis2=2)
+    mse_resid = sse / safe_df[:, None]
+
+    inv_diag = (ptt[:, None, :] - prec ** 2 / ptt[:, :, None])[:, others].reshape(g, p, p - 1)
+    pm = np.einsum("gij,gj->gi", prec, mean)
+    quad = ((mean * pm).sum(axis=1)[:, None] - 2.0 * mean * pm + mean ** 2 * ptt) - (pm - mean * ptt) ** 2 / ptt
+
+    params = np.concatenate([intercept[:, :, None], slopes], axis=2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bse = np.sqrt(np.concatenate([
+            (mse_resid * (1.0 / np.maximum(n, 1)[:, None] + quad))[:, :, None],
+            mse_resid[:, :, None] * inv_diag,
+        ], axis=2))
+        tvalues = params / bse
+        rsquared = np.where(syy > 0, 1.0 - sse / syy, np.nan)
+        rsquared_adj = 1.0 - ((n - 1) / safe_df)[:, None] * (1.0 - rsquared)
+    pvalues = _two_sided_pvalues(tvalues, safe_df[:, None, None])
+
+    bad = ~ok
+    for values in (params, bse, tvalues, pvalues, rsquared, rsquared_adj, mse_resid):
+        values[bad] = np.nan
+    return {
+        "params": params,
+        "bse": bse,
+        "tvalues": tvalues,
+        "pvalues": pvalues,
+        "rsquared": rsquared,
+        "rsquared_adj": rsquared_adj,
+        "mse_resid": mse_resid,
+        "df_resid": df_resid,
+    }
@@ -0,0 +1,454 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows; single process only
+    fcntl = None
+
+
+# Control records share the log with plain data records; they are told apart
+# by this key, which never appears in a SurveyResponse/ReminderRequest dict.
+OP_KEY = "_op"
+# Bytes before a cursor's offset that are hashed to recognize the same file
+CURSOR_TAIL_BYTES = 4096
+
+
+def _dumps(record: Dict) -> str:
+    return json.dumps(record, separators=(",", ":"))
+
+
+class AppendLog:
+    """Append-only JSONL store for a list of records.
+
+    Every line is either a data record (a plain dict) or a control record
+    carrying ``OP_KEY``:
+
+      - ``{"_op": "delete", "timestamp": ...}`` removes every earlier record
+        whose ``timestamp`` matches.
+
+    Appends are O(1): the line is written and flushed to the OS immediately,
+    while ``fsync`` is batched (every ``fsync_every`` records or
+    ``fsync_interval`` seconds, whichever comes first). Deletes append a
+    tombstone; once dead lines outnumber live ones (``compact_ratio``) the
+    file is rewritten atomically with only the live records.
+
+    On first use the log is migrated from ``legacy_path`` (the old
+    ``{"<legacy_key>": [...]}`` JSON file) if the log does not exist yet.
+    The legacy file is left untouched as a backup.
+
+    Several processes may share one log. Every write, rewrite and replay
+    holds an exclusive ``flock`` on ``<path>.lock`` (see ``locked``), and
+    each process remembers how far into the file it has read. Before
+    writing it first reads whatever other processes appended in the
+    meantime; with ``track_changes`` those lines are kept as change
+    operations for ``read_changes``:
+
+      - ``("add", record)`` for a data record,
+      - ``("delete", timestamp)`` for a tombstone,
+      - ``("reset", records)`` when the file was replaced (compaction,
+        rewrite) and the caller has to start over from ``records``.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        legacy_path: Optional[str] = None,
+        legacy_key: str = "responses",
+        fsync_every: int = 32,
+        fsync_interval: float = 1.0,
+        compact_ratio: float = 1.0,
+        compact_min_dead: int = 256,
+        track_changes: bool = False,
+    ) -> None:
+        self.path = path
+        self.legacy_path = legacy_path
+        self.legacy_key = legacy_key
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_ratio = compact_ratio
+        self.compact_min_dead = compact_min_dead
+        self.track_changes = track_changes
+
+        self._lock = threading.RLock()
+        self._lock_path = path + ".lock"
+        self._lock_fh = None
+        self._lock_depth = 0
+        self._fh = None
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+        # Line accounting used to decide when compaction pays off
+        self._live = 0
+        self._dead = 0
+        self._counted = False
+        self._migrated = False
+        # How far this process has read: (inode, byte offset) of the log
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._pending: List[Tuple] = []
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    @property
+    def count(self) -> int:
+        """Number of live records, including other processes' appends."""
+        with self.locked():
+            if not self._counted:
+                self.load()
+            else:
+                self._catch_up()
+            return self._live
+
+    def load(self) -> List[Dict]:
+        """Replay the log and return the live records in insertion order.
+
+        The caller gets the complete current state, so pending change
+        operations are discarded.
+        """
+        with self.locked():
+            self._migrate()
+            self._pending = []
+            return self._replay()
+
+    def changed(self) -> bool:
+        """Cheap check (one ``stat``) for writes this process has not seen yet."""
+        if self._pending:
+            return True
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return self._inode is not None
+        return st.st_ino != self._inode or st.st_size != self._offset
+
+    def read_changes(self) -> List[Tuple]:
+        """Change operations written by other processes since the last call.
+
+        Only meaningful with ``track_changes``; the caller should hold
+        ``locked()`` while applying them so they cannot interleave with its
+        own writes.
+        """
+        with self.locked():
+            self._catch_up()
+            ops, self._pending = self._pending, []
+            return ops
+
+    def cursor(self) -> Dict:
+        """How far this process has read, for ``restore`` in another process.
+
+        Only meaningful while holding ``locked()`` with every change already
+        applied by the caller; a hash of the bytes just before the offset
+        tells a later ``restore`` whether it is still the same file.
+        """
+        with self.locked():
+            return {
+                "inode": self._inode,
+                "offset": self._offset,
+                "live": self._live,
+                "dead": self._dead,
+                "tail": None if self._inode is None else self._tail_hash(self._offset),
+            }
+
+    def restore(self, cursor: Dict) -> bool:
+        """Continue from a ``cursor`` instead of replaying the whole log:
+        afterwards ``read_changes`` returns only what was written after it.
+        Returns False, changing nothing, when the log has been replaced
+        (compaction, rewrite) since; the caller then has to ``load``."""
+        with self.locked():
+            self._migrate()
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return False
+            offset = cursor.get("offset", -1)
+            if st.st_ino != cursor.get("inode") or not 0 <= offset <= st.st_size:
+                return False
+            if self._tail_hash(offset) != cursor.get("tail"):
+                return False
+            self._close()
+            self._inode, self._offset = st.st_ino, offset
+            self._live, self._dead = cursor["live"], cursor["dead"]
+            self._counted = True
+            self._pending = []
+            return True
+
+    @contextmanager
+    def locked(self):
+        """Hold the log exclusively, across threads and processes (re-entrant)."""
+        with self._lock:
+            if self._lock_depth == 0 and fcntl is not None:
+                if self._lock_fh is None:
+                    self._lock_fh = open(self._lock_path, "a")
+                fcntl.flock(self._lock_fh.fileno(), fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield self
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and fcntl is not None:
+                    fcntl.flock(self._lock_fh.fileno(), fcntl.LOCK_UN)
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def append(self, record: Dict) -> None:
+        """Append one record; O(1) regardless of log size."""
+        self.append_many([record])
+
+    def append_many(self, records: List[Dict]) -> None:
+        """Append several records with a single write call."""
+        if not records:
+            return
+        self.append_encoded("".join(_dumps(r) + "\n" for r in records), len(records))
+
+    def append_encoded(self, payload: str, count: int) -> None:
+        """Append ``count`` records that are already encoded as JSONL text."""
+        if not payload:
+            return
+        with self.locked():
+            self._migrate()
+            # Whatever other processes appended sits before our lines
+            self._catch_up()
+            fh = self._open()
+            fh.write(payload)
+            fh.flush()
+            self._seen(os.fstat(fh.fileno()))
+            self._live += count
+            self._after_write(count)
+
+    def delete(self, timestamp: str, removed: int) -> None:
+        """Record a deletion of all records with ``timestamp``.
+
+        ``removed`` is the number of live records the tombstone hides; it only
+        feeds the compaction heuristic.
+        """
+        with self.locked():
+            self.append_many([{OP_KEY: "delete", "timestamp": timestamp}])
+            # The tombstone itself was counted as live by append_many
+            self._live -= 1 + removed
+            self._dead += 1 + removed
+            self._maybe_compact()
+
+    def rewrite(self, records: List[Dict]) -> None:
+        """Atomically replace the log contents with ``records``."""
+        with self.locked():
+            self._migrated = True
+            self._close()
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                for r in records:
+                    f.write(_dumps(r) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._fsync_dir()
+            self._seen(os.stat(self.path))
+            self._live, self._dead = len(records), 0
+            self._counted = True
+            self._unsynced = 0
+            self._last_fsync = time.monotonic()
+
+    def compact(self) -> None:
+        """Rewrite the log without tombstones and the records they hide."""
+        with self.locked():
+            # Queue other processes' lines first so compaction cannot hide them
+            self._catch_up()
+            self.rewrite(self._replay())
+
+    def sync(self) -> None:
+        """Force any batched writes to stable storage."""
+        with self._lock:
+            if self._fh is not None and self._unsynced:
+                os.fsync(self._fh.fileno())
+            self._unsynced = 0
+            self._last_fsync = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            self.sync()
+            self._close()
+            if self._lock_fh is not None and self._lock_depth == 0:
+                self._lock_fh.close()
+                self._lock_fh = None
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _open(self):
+        if self._fh is not None and os.fstat(self._fh.fileno()).st_ino != self._inode:
+            # Another process replaced the file; never append to the old inode
+            self._close()
+        if self._fh is None:
+            self._fh = open(self.path, "a")
+        return self._fh
+
+    def _seen(self, st: os.stat_result) -> None:
+        self._inode, self._offset = st.st_ino, st.st_size
+
+    def _tail_hash(self, offset: int) -> str:
+        start = max(0, offset - CURSOR_TAIL_BYTES)
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            return hashlib.blake2b(f.read(offset - start), digest_size=16).hexdigest()
+
+    def _replay(self) -> List[Dict]:
+        """Read the whole file (caller holds ``locked()``)."""
+        records: List[Dict] = []
+        # A tombstone hides the records with its timestamp written before it:
+        # remember how many records preceded the last one, filter once at the end
+        deleted_before: Dict[object, int] = {}
+        tombstones = 0
+        dead = 0
+        good_offset = 0
+        self._counted = True
+        if not os.path.exists(self.path):
+            self._live, self._dead = 0, 0
+            self._inode, self._offset = None, 0
+            return records
+
+        with open(self.path, "rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    # Torn final write (crash mid-append): drop it below
+                    break
+                line = raw.strip()
+                if line:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        break
+                    op = rec.get(OP_KEY) if isinstance(rec, dict) else None
+                    if op is None:
+                        records.append(rec)
+                    elif op == "delete":
+                        deleted_before[rec.get("timestamp")] = len(records)
+                        tombstones += 1
+                    else:
+                        dead += 1
+                good_offset += len(raw)
+
+        # Writers hold the lock for the whole append, so a partial line seen
+        # under the lock really is the leftover of a crash
+        if good_offset < os.path.getsize(self.path):
+            print(f"Truncating torn tail of {self.path} at byte {good_offset}")
+            self._close()
+            with open(self.path, "r+b") as f:
+                f.truncate(good_offset)
+
+        if deleted_before:
+            total = len(records)
+            records = [
+                r for i, r in enumerate(records)
+                if deleted_before.get(r.get("timestamp"), -1) <= i
+            ]
+            dead += total - len(records) + tombstones
+
+        self._seen(os.stat(self.path))
+        self._live, self._dead = len(records), dead
+        return records
+
+    def _catch_up(self) -> None:
+        """Account for lines other processes wrote since we last looked
+        (caller holds ``locked()``)."""
+        if not self._counted:
+            return
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        if st is None or st.st_ino != self._inode or st.st_size < self._offset:
+            if st is None and self._inode is None:
+                return
+            # Replaced or truncated elsewhere: start over from the new file
+            self._close()
+            records = self._replay()
+            if self.track_changes:
+                self._pending = [("reset", records)]
+            return
+        if st.st_size == self._offset:
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(st.st_size - self._offset)
+        for raw in data.splitlines(keepends=True):
+            if not raw.endswith(b"\n"):
+                break
+            line = raw.strip()
+            if not line:
+                self._offset += len(raw)
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                break
+            self._offset += len(raw)
+            op = rec.get(OP_KEY) if isinstance(rec, dict) else None
+            if op is None:
+                self._live += 1
+                if self.track_changes:
+                    self._pending.append(("add", rec))
+            elif op == "delete":
+                # How many records it hid is only known to the writer
+                self._dead += 1
+                if self.track_changes:
+                    self._pending.append(("delete", rec.get("timestamp")))
+            else:
+                self._dead += 1
+        if self._offset < st.st_size:
+            # Leftover of a writer that crashed mid-append (writers hold the
+            # lock): cut it off before anyone appends after it
+            print(f"Truncating torn tail of {self.path} at byte {self._offset}")
+            self._close()
+            with open(self.path, "r+b") as f:
+                f.truncate(self._offset)
+
+    def _close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def _after_write(self, n: int) -> None:
+        self._unsynced += n
+        now = time.monotonic()
+        if self._unsynced >= self.fsync_every or now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._fh.fileno())
+            self._unsynced = 0
+            self._last_fsync = now
+
+    def _maybe_compact(self) -> None:
+        if self._dead >= self.compact_min_dead and self._dead > self._live * self.compact_ratio:
+            print(f"Compacting {self.path}: {self._live} live / {self._dead} dead lines")
+            self.compact()
+
+    def _fsync_dir(self) -> None:
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _migrate(self) -> None:
+        """One-time import from the legacy pretty-printed JSON file."""
+        if self._migrated:
+            return
+        self._migrated = True
+        if os.path.exists(self.path) or not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        with open(self.legacy_path, "r") as f:
+            legacy = json.load(f)
+        records = legacy.get(self.legacy_key, []) if isinstance(legacy, dict) else []
+        print(f"Migrating {len(records)} records from {self.legacy_path} to {self.path}")
+        self.rewrite(records)
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+import numpy as np
+
+from stats_engine import AGE_GROUPS, N_QUESTIONS, NO_AGE, SufficientStats, regression_entry, stacked_loo_ols
+
+
+# Per-age-group analytics. The ResponseStore already keeps sufficient
+# statistics per age code, so every stratum comes from one stacked
+# (G, p, p) array: correlations, alpha and all G * 6 question regressions
+# are batched over the groups instead of filtering and refitting per group.
+
+QUESTION_LABELS = ["Sentience", "EQ2030", "Reliance", "Future Education", "Understanding", "Social Impact"]
+MODEL_KEYS = ("params", "bse", "tvalues", "pvalues", "rsquared", "rsquared_adj", "mse_resid")
+
+
+def _list(values: np.ndarray) -> list:
+    return np.where(np.isfinite(values), values, None).tolist()
+
+
+def stratified_analytics(age_labels: List[str], groups: Dict[int, SufficientStats]) -> Dict:
+    """Means, SDs, correlations, Cronbach's alpha and the six leave-one-out
+    question regressions for each age group.
+
+    ``groups`` maps store age codes to statistics and ``age_labels`` the
+    codes to labels. Every canonical group ('16-18' .. '40+') is listed, even
+    when empty, followed by any other labels that have responses; responses
+    without an age group are only counted (``unassigned``).
+    """
+    codes = list(range(len(AGE_GROUPS))) + [
+        code for code in sorted(groups)
+        if code >= len(AGE_GROUPS) and groups[code].n > 0
+    ]
+    empty = SufficientStats()
+    stats = [groups.get(code, empty) for code in codes]
+
+    n = np.array([s.n for s in stats], dtype=np.int64)
+    mean = np.stack([s.mean[:N_QUESTIONS] for s in stats])
+    m2 = np.stack([s.m2[:N_QUESTIONS, :N_QUESTIONS] for s in stats])
+
+    k = float(N_QUESTIONS)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = m2 / (n - 1)[:, None, None]
+        sd = np.sqrt(np.diagonal(cov, axis1=1, axis2=2))
+        corr = np.clip(cov / (sd[:, :, None] * sd[:, None, :]), -1.0, 1.0)
+        total = cov.sum(axis=(1, 2))
+        alpha = np.where(total > 0, (k / (k - 1.0)) * (1.0 - np.trace(cov, axis1=1, axis2=2) / total), np.nan)
+    few = n < 2
+    mean[n == 0] = np.nan
+    sd[few], corr[few], alpha[few] = np.nan, np.nan, np.nan
+    models = stacked_loo_ols(n, mean, m2)
+
+    strata = []
+    for g, code in enumerate(codes):
+        regressions = []
+        if n[g] > N_QUESTIONS:
+            for t in range(N_QUESTIONS):
+                predictor_indices = [i for i in range(N_QUESTIONS) if i != t]
+                model = {key: models[key][g, t] for key in MODEL_KEYS}
+                model["nobs"] = n[g]
+                regressions.append(regression_entry(
+                    model, t, predictor_indices, [QUESTION_LABELS[i] for i in predictor_indices]
+                ))
+        strata.append({
+            "age_group": age_labels[code],
+            "n": int(n[g]),
+            "means": _list(mean[g]),
+            "sd": _list(sd[g]),
+            "corr_matrix": _list(corr[g]),
+            "cronbach_alpha": _list(alpha[g]),
+            "regressions": regressions,
+        })
+
+    unassigned = groups.get(NO_AGE)
+    return {
+        "columns": QUESTION_LABELS,
+        "strata": strata,
+        "unassigned": unassigned.n if unassigned is not None else 0,
+    }
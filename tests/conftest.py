@@ -0,0 +1,17 @@
+from typing import Dict, List
+
+import pytest
+
+
+def response(i: int, age_group: str = "19-22") -> Dict:
+    """A survey response with a distinct timestamp per ``i``."""
+    return {
+        "timestamp": f"2025-05-01T{i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}.000Z",
+        "age_group": age_group,
+        **{f"q{k}": round((i * k % 19) / 19 * 2 - 1, 2) for k in range(1, 7)},
+    }
+
+
+@pytest.fixture
+def responses() -> List[Dict]:
+    return [response(i, ("16-18", "19-22", "23-26", "40+")[i % 4]) for i in range(40)]
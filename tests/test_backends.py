@@ -0,0 +1,136 @@
+import threading
+
+import pytest
+
+from binary_storage import BinaryLog
+from sqlite_storage import SQLiteLog
+
+
+def sqlite_log(tmp_path, **kwargs):
+    return SQLiteLog(str(tmp_path / "survey.db"), "responses", **kwargs)
+
+
+def binary_log(tmp_path, **kwargs):
+    return BinaryLog(str(tmp_path / "survey.bin"), **kwargs)
+
+
+@pytest.fixture(params=[sqlite_log, binary_log], ids=["sqlite", "binary"])
+def open_log(request, tmp_path):
+    opened = []
+
+    def open_log(**kwargs):
+        log = request.param(tmp_path, **kwargs)
+        opened.append(log)
+        return log
+
+    yield open_log
+    for log in opened:
+        log.close()
+
+
+def test_changed_and_count_across_instances(open_log, responses):
+    writer = open_log()
+    reader = open_log(track_changes=True)
+    writer.append_many(responses[:5])
+    assert reader.load() == responses[:5]
+    assert reader.count == 5
+    assert not reader.changed()
+
+    writer.append_many(responses[5:10])
+    assert reader.changed()
+    assert reader.count == 10
+    assert reader.read_changes() == [("add", r) for r in responses[5:10]]
+    assert not reader.changed()
+
+    writer.delete(responses[0]["timestamp"], 1)
+    assert writer.count == 9
+    assert reader.changed()
+    assert reader.read_changes() == [("delete", responses[0]["timestamp"])]
+    assert not reader.changed()
+
+
+def test_rewrite_is_a_reset(open_log, responses):
+    writer = open_log()
+    reader = open_log(track_changes=True)
+    writer.append_many(responses[:10])
+    reader.load()
+
+    writer.rewrite(responses[20:25])
+    assert writer.count == 5
+    assert reader.changed()
+    assert reader.count == 5
+    assert reader.read_changes() == [("reset", responses[20:25])]
+    assert not reader.changed()
+
+
+def test_own_writes_do_not_count_as_changes(open_log, responses):
+    log = open_log(track_changes=True)
+    log.load()
+    log.append_many(responses[:5])
+    log.delete(responses[1]["timestamp"], 1)
+    assert not log.changed()
+    assert log.count == 4
+    assert open_log().load() == [responses[0]] + responses[2:5]
+
+
+def test_sqlite_checks_do_not_wait_for_a_writer(tmp_path, responses):
+    writer = sqlite_log(tmp_path)
+    reader = sqlite_log(tmp_path)
+    writer.append_many(responses[:3])
+    reader.load()
+    holding, release = threading.Event(), threading.Event()
+
+    def hold_write_lock():
+        with writer.locked():
+            writer.append(responses[3])
+            holding.set()
+            release.wait(10)
+
+    thread = threading.Thread(target=hold_write_lock)
+    thread.start()
+    try:
+        assert holding.wait(10)
+        # The uncommitted append is invisible, and neither call blocks
+        assert reader.count == 3
+        assert not reader.changed()
+    finally:
+        release.set()
+        thread.join()
+    assert reader.count == 4
+    assert reader.changed()
+    writer.close()
+    reader.close()
+
+
+def test_sqlite_prunes_old_deletes(tmp_path, responses):
+    writer = sqlite_log(tmp_path, changes_keep=4)
+    follower = sqlite_log(tmp_path, track_changes=True)
+    lagging = sqlite_log(tmp_path, track_changes=True)
+    writer.append_many(responses)
+    follower.load()
+    lagging.load()
+    cursor = lagging.cursor()
+
+    for record in responses[:30]:
+        writer.delete(record["timestamp"], 1)
+        # Read after every delete, so nothing it needs is pruned
+        assert follower.read_changes() == [("delete", record["timestamp"])]
+    rows = writer._db().execute("SELECT COUNT(*) FROM changes").fetchone()[0]
+    assert rows <= 2 * writer.changes_keep + 1
+
+    # Too far behind: the pruned deletes come back as a reset
+    assert lagging.read_changes() == [("reset", responses[30:])]
+    assert not sqlite_log(tmp_path, track_changes=True).restore(cursor)
+
+    writer.compact()
+    assert writer._db().execute("SELECT COUNT(*) FROM changes").fetchone()[0] == writer.changes_keep
+    writer.delete(responses[30]["timestamp"], 1)
+    assert follower.read_changes() == [("delete", responses[30]["timestamp"])]
+
+    # A rewrite empties the table; later deletes are read normally again
+    writer.rewrite(responses[:5])
+    assert follower.read_changes() == [("reset", responses[:5])]
+    writer.delete(responses[0]["timestamp"], 1)
+    assert follower.read_changes() == [("delete", responses[0]["timestamp"])]
+    for log in (writer, follower, lagging):
+        log.close()
@@ -0,0 +1,87 @@
+import numpy as np
+
+from checkpoint import capture, read_checkpoint, write_checkpoint
+from response_store import ResponseStore
+from storage import AppendLog
+
+
+def apply_changes(store, ops):
+    """Same replay as main.apply_log_changes."""
+    for op, arg in ops:
+        if op == "add":
+            store.append(arg)
+        elif op == "delete":
+            store.delete(arg)
+        else:
+            store.reset(arg)
+
+
+def assert_same_store(restored, expected):
+    assert restored.records() == expected.records()
+    assert restored.stats.n == expected.stats.n
+    np.testing.assert_allclose(restored.stats.mean, expected.stats.mean, atol=1e-12)
+    np.testing.assert_allclose(restored.stats.m2, expected.stats.m2, atol=1e-9)
+    assert sorted(restored.group_stats) == sorted(expected.group_stats)
+    for code, stats in expected.group_stats.items():
+        assert restored.group_stats[code].n == stats.n
+        np.testing.assert_allclose(restored.group_stats[code].mean, stats.mean, atol=1e-12)
+    np.testing.assert_array_equal(restored.timeline.keys, expected.timeline.keys)
+    np.testing.assert_array_equal(restored.aggregates.counts, expected.aggregates.counts)
+
+
+def test_round_trip(tmp_path, responses):
+    store = ResponseStore.from_records(responses)
+    store.delete(responses[5]["timestamp"])
+    path = str(tmp_path / "checkpoint.npz")
+    cursor = {"offset": 123}
+    assert write_checkpoint(path, capture(store), cursor, "log:test") > 0
+
+    restored, meta = read_checkpoint(path, "log:test")
+    assert meta["cursor"] == cursor
+    assert_same_store(restored, store)
+    assert restored.version == store.version
+    assert restored.next_seq == store.next_seq
+
+
+def test_other_source_or_damaged_file_is_ignored(tmp_path, responses):
+    path = str(tmp_path / "checkpoint.npz")
+    assert read_checkpoint(path, "log:test") is None
+    write_checkpoint(path, capture(ResponseStore.from_records(responses)), {}, "log:test")
+    assert read_checkpoint(path, "sqlite:test") is None
+    with open(path, "r+b") as f:
+        f.truncate(100)
+    assert read_checkpoint(path, "log:test") is None
+
+
+def test_inconsistent_statistics_are_ignored(tmp_path, responses):
+    path = str(tmp_path / "checkpoint.npz")
+    state = capture(ResponseStore.from_records(responses))
+    state["stats"].m2[0, 0] = np.inf
+    write_checkpoint(path, state, {}, "log:test")
+    assert read_checkpoint(path, "log:test") is None
+
+    state = capture(ResponseStore.from_records(responses))
+    state["stats"].n -= 1
+    write_checkpoint(path, state, {}, "log:test")
+    assert read_checkpoint(path, "log:test") is None
+
+
+def test_restore_then_replay_the_log_tail(tmp_path, responses):
+    log_path = str(tmp_path / "log.jsonl")
+    path = str(tmp_path / "checkpoint.npz")
+    log = AppendLog(log_path, track_changes=True)
+    log.append_many(responses[:30])
+    store = ResponseStore.from_records(log.load())
+    with log.locked():
+        write_checkpoint(path, capture(store), log.cursor(), "log:test")
+
+    # Writes after the checkpoint, as another worker would make them
+    log.append_many(responses[30:])
+    log.delete(responses[2]["timestamp"], 1)
+    log.close()
+
+    restored, meta = read_checkpoint(path, "log:test")
+    restarted = AppendLog(log_path, track_changes=True)
+    assert restarted.restore(meta["cursor"])
+    apply_changes(restored, restarted.read_changes())
+    assert_same_store(restored, ResponseStore.from_records(AppendLog(log_path).load()))
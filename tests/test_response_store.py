@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from conftest import response
+from response_store import ResponseStore
+from stats_engine import (
+    N_QUESTIONS,
+    VARIABLES,
+    SufficientStats,
+    loo_ols_from_stats,
+    multi_target_ols_from_stats,
+    ols_from_stats,
+)
+
+
+def test_non_finite_answers_are_not_complete_rows(responses):
+    store = ResponseStore.from_records(responses + [dict(response(99), q2=float("inf"))])
+    assert store.stats.n == len(responses)
+    assert store.stats_finite()
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_overflow_gives_no_model_and_clears_on_delete(responses):
+    bad = dict(response(99), q1=1e308)
+    store = ResponseStore.from_records(responses + [bad])
+    assert not store.stats.is_finite()
+    others = list(range(1, len(VARIABLES)))
+    with pytest.raises(ValueError, match="not finite"):
+        ols_from_stats(store.stats, 0, others)
+    with pytest.raises(ValueError, match="not finite"):
+        loo_ols_from_stats(store.stats, range(N_QUESTIONS), store.stats.age_dummy_indices())
+    with pytest.raises(ValueError, match="not finite"):
+        multi_target_ols_from_stats(store.aged_stats(), [N_QUESTIONS + 1], range(N_QUESTIONS))
+
+    store.delete(bad["timestamp"])
+    expected = ResponseStore.from_records(responses)
+    assert store.stats_finite()
+    assert store.stats.n == expected.stats.n
+    np.testing.assert_allclose(store.stats.m2, expected.stats.m2, atol=1e-9)
+    np.testing.assert_allclose(store.timeline.m2, expected.timeline.m2, atol=1e-9)
+    np.testing.assert_allclose(store.aggregates.sum_sq, expected.aggregates.sum_sq)
+
+
+def test_add_rows_skips_non_finite_rows():
+    rows = np.arange(12, dtype=np.float64).reshape(4, 3)
+    stats = SufficientStats(3)
+    stats.add_rows(np.vstack([rows, [np.nan, 1.0, 2.0], [np.inf, 0.0, 0.0]]))
+    assert stats.n == 4
+    stats.remove_rows(np.vstack([rows[:2], [np.inf, 0.0, 0.0]]))
+    assert stats.n == 2
+    np.testing.assert_allclose(stats.mean, rows[2:].mean(axis=0))
@@ -0,0 +1,50 @@
+import asyncio
+import json
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from snapshots import SnapshotWorker
+
+
+async def run_in_thread(fn, *args):
+    return await asyncio.to_thread(fn, *args)
+
+
+def test_stuck_build_is_reported_not_served_stale():
+    version = [1]
+    release = threading.Event()
+
+    def build():
+        if version[0] > 1:
+            release.wait(10)
+        return {"version": version[0]}
+
+    worker = SnapshotWorker({"a": build}, lambda: (version[0], 0), run_in_thread,
+                            min_interval=0.0, build_timeout=0.2)
+
+    async def scenario():
+        first = await worker.get("a")
+        assert json.loads(first.body)["version"] == 1
+
+        version[0] = 2
+        await worker.get("a")  # still current until the rebuild: served, rebuild scheduled
+        await asyncio.sleep(0.5)
+        stats = worker.stats()
+        assert stats["stuck"] and stats["timeouts"] == 1 and stats["building_s"] >= 0.2
+        with pytest.raises(HTTPException) as err:
+            await worker.get("a")
+        assert err.value.status_code == 503 and "Retry-After" in err.value.headers
+
+        release.set()
+        for _ in range(50):
+            await asyncio.sleep(0.05)
+            stats = worker.stats()
+            if not stats["stuck"] and not stats["stale"]:
+                break
+        assert json.loads((await worker.get("a")).body)["version"] == 2
+        assert worker.stats()["building_s"] is None
+        worker.stop()
+
+    asyncio.run(scenario())
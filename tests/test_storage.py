@@ -0,0 +1,125 @@
+import os
+
+from conftest import response
+from storage import OP_KEY, AppendLog
+
+
+def lines(path):
+    with open(path) as f:
+        return [line for line in f if line.strip()]
+
+
+def test_round_trip_across_instances(tmp_path, responses):
+    path = str(tmp_path / "log.jsonl")
+    log = AppendLog(path)
+    log.append_many(responses[:30])
+    for record in responses[30:]:
+        log.append(record)
+    log.close()
+
+    reopened = AppendLog(path)
+    assert reopened.load() == responses
+    assert reopened.count == len(responses)
+
+
+def test_tombstone_hides_only_earlier_records(tmp_path):
+    path = str(tmp_path / "log.jsonl")
+    log = AppendLog(path)
+    first, other = response(1), response(2)
+    log.append_many([first, other, dict(first, q1=0.0)])
+    log.delete(first["timestamp"], 2)
+    again = dict(first, q1=0.9)
+    log.append(again)
+    log.close()
+
+    reopened = AppendLog(path)
+    assert reopened.load() == [other, again]
+    assert reopened.count == 2
+
+
+def test_torn_tail_is_dropped(tmp_path, responses):
+    path = str(tmp_path / "log.jsonl")
+    log = AppendLog(path)
+    log.append_many(responses[:3])
+    log.close()
+    with open(path, "a") as f:
+        f.write('{"timestamp": "2025-05-0')
+
+    reopened = AppendLog(path)
+    assert reopened.load() == responses[:3]
+    reopened.append(responses[3])
+    assert AppendLog(path).load() == responses[:4]
+
+
+def test_compaction_drops_tombstones_and_hidden_records(tmp_path, responses):
+    path = str(tmp_path / "log.jsonl")
+    log = AppendLog(path, compact_min_dead=4)
+    log.append_many(responses[:6])
+    for record in responses[:3]:
+        log.delete(record["timestamp"], 1)
+
+    # 3 live / 6 dead lines crossed the threshold on the last delete
+    assert len(lines(path)) == 3
+    assert all(OP_KEY not in line for line in lines(path))
+    assert AppendLog(path).load() == responses[3:6]
+
+
+def test_read_changes_from_another_writer(tmp_path, responses):
+    path = str(tmp_path / "log.jsonl")
+    writer = AppendLog(path)
+    reader = AppendLog(path, track_changes=True)
+    writer.append_many(responses[:2])
+    assert reader.load() == responses[:2]
+    assert not reader.changed()
+
+    writer.append(responses[2])
+    writer.delete(responses[0]["timestamp"], 1)
+    assert reader.changed()
+    assert reader.read_changes() == [("add", responses[2]), ("delete", responses[0]["timestamp"])]
+    assert not reader.changed()
+
+    writer.compact()
+    assert reader.read_changes() == [("reset", responses[1:3])]
+
+
+def test_restore_replays_only_the_tail(tmp_path, responses):
+    path = str(tmp_path / "log.jsonl")
+    log = AppendLog(path, track_changes=True)
+    log.append_many(responses[:10])
+    assert log.load() == responses[:10]
+    cursor = log.cursor()
+    log.append_many(responses[10:12])
+    log.delete(responses[3]["timestamp"], 1)
+    log.close()
+
+    restarted = AppendLog(path, track_changes=True)
+    assert restarted.restore(cursor)
+    assert restarted.read_changes() == [
+        ("add", responses[10]),
+        ("add", responses[11]),
+        ("delete", responses[3]["timestamp"]),
+    ]
+
+
+def test_restore_refuses_a_rewritten_log(tmp_path, responses):
+    path = str(tmp_path / "log.jsonl")
+    log = AppendLog(path)
+    log.append_many(responses[:5])
+    cursor = log.cursor()
+    log.rewrite(responses[5:8])
+
+    restarted = AppendLog(path, track_changes=True)
+    assert not restarted.restore(cursor)
+    assert restarted.load() == responses[5:8]
+
+
+def test_restore_refuses_a_truncated_log(tmp_path, responses):
+    path = str(tmp_path / "log.jsonl")
+    log = AppendLog(path)
+    log.append_many(responses[:5])
+    cursor = log.cursor()
+    log.close()
+    with open(path, "r+") as f:
+        f.truncate(os.path.getsize(path) // 2)
+
+    assert not AppendLog(path).restore(cursor)
@@ -0,0 +1,26 @@
+import numpy as np
+
+from conftest import response
+from response_store import ResponseStore
+from stats_engine import N_QUESTIONS, loo_ols_from_stats, regression_entry
+from stratified import QUESTION_LABELS, stratified_analytics
+
+
+def test_stratum_models_match_pooled_shape_and_values():
+    # One age group only: its stratum models are the pooled models
+    store = ResponseStore.from_records([response(i, "23-26") for i in range(40)])
+    pooled = loo_ols_from_stats(store.stats, range(N_QUESTIONS), store.stats.age_dummy_indices())
+    expected = [
+        regression_entry(model, t, [i for i in range(N_QUESTIONS) if i != t],
+                         [QUESTION_LABELS[i] for i in range(N_QUESTIONS) if i != t])
+        for t, model in enumerate(pooled)
+    ]
+
+    strata = stratified_analytics(store.age_labels, store.strata())["strata"]
+    regressions = next(s for s in strata if s["age_group"] == "23-26")["regressions"]
+    assert [list(r) for r in regressions] == [list(e) for e in expected]
+    for got, want in zip(regressions, expected):
+        assert got["method"] == "OLS" and got["n"] == 40
+        for key in ("beta", "standardErrors", "tStats", "pValues", "r2", "adjR2", "rmse"):
+            np.testing.assert_allclose(np.array(got[key], dtype=float), np.array(want[key], dtype=float),
+                                       rtol=1e-6, atol=1e-9, err_msg=key)
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from stats_engine import N_QUESTIONS, VARIABLES, SufficientStats
+
+
+HOUR_MS = 3_600_000
+# Period lengths for time series; both are whole numbers of (UTC) hours
+INTERVAL_MS = {"hour": HOUR_MS, "day": 24 * HOUR_MS}
+# Rows per outer-product block when summarizing a large append
+_CHUNK = 16384
+
+
+def _group_by_hour(rows: np.ndarray, ts_ms: np.ndarray):
+    """Per-hour (keys, n, mean, m2) of a block of rows, keys sorted."""
+    hours = ts_ms // HOUR_MS
+    if hours.min() == hours.max():
+        # Common case (a single submission): one bucket, no grouping needed
+        mean = rows.mean(axis=0)
+        centered = rows - mean
+        return hours[:1], np.array([len(rows)], dtype=np.int64), mean[None], (centered.T @ centered)[None]
+    order = np.argsort(hours, kind="stable")
+    hours, rows = hours[order], rows[order]
+    keys, starts, counts = np.unique(hours, return_index=True, return_counts=True)
+    mean = np.add.reduceat(rows, starts, axis=0) / counts[:, None]
+    centered = rows - np.repeat(mean, counts, axis=0)
+    p = rows.shape[1]
+    m2 = np.zeros((len(keys), p, p))
+    # Sum the per-row outer products group by group, a chunk at a time
+    for lo in range(0, len(rows), _CHUNK):
+        block = centered[lo:lo + _CHUNK]
+        first = np.searchsorted(starts, lo, side="right") - 1
+        edges = np.clip(starts[first:] - lo, 0, None)
+        edges = edges[edges < len(block)]
+        outer = block[:, :, None] * block[:, None, :]
+        m2[first:first + len(edges)] += np.add.reduceat(outer, edges, axis=0)
+    return keys, counts.astype(np.int64), mean, m2
+
+
+class TimeBuckets:
+    """Sufficient statistics of the response timeline, one bucket per UTC hour.
+
+    ``keys`` are the occupied hours (epoch hours, sorted); ``n``, ``mean`` and
+    ``m2`` hold each bucket's count, mean vector and centered co-moment
+    matrix over ``VARIABLES``. Blocks of rows are folded in and out with the
+    same Chan et al. update as SufficientStats, vectorized over buckets.
+
+    Any contiguous run of buckets is combined from prefix sums of the
+    moments (taken about the overall mean to keep the differences well
+    conditioned), so a time slice costs O(p^2) and a whole time series
+    O(buckets * p^2), independent of the number of responses. The prefix
+    sums are rebuilt lazily after a mutation. Rows without a parseable
+    timestamp are not part of the timeline.
+    """
+
+    def __init__(self, p: int = len(VARIABLES)) -> None:
+        self.keys = np.empty(0, dtype=np.int64)
+        self.n = np.empty(0, dtype=np.int64)
+        self.mean = np.empty((0, p))
+        self.m2 = np.empty((0, p, p))
+        self._prefix: Optional[Tuple[np.ndarray, ...]] = None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def reset(self) -> None:
+        p = self.mean.shape[1]
+        self.keys = np.empty(0, dtype=np.int64)
+        self.n = np.empty(0, dtype=np.int64)
+        self.mean = np.empty((0, p))
+        self.m2 = np.empty((0, p, p))
+        self._prefix = None
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+    def add(self, rows: np.ndarray, ts_ms: np.ndarray) -> None:
+        """Fold in complete design rows with their epoch-ms timestamps
+        (``MISSING_TS`` entries must already be filtered out)."""
+        if len(rows) == 0:
+            return
+        keys, n_b, mean_b, m2_b = _group_by_hour(np.asarray(rows, dtype=np.float64), ts_ms)
+        i = np.searchsorted(self.keys, keys)
+        if np.any(i >= len(self.keys)) or not np.array_equal(self.keys[i], keys):
+            self._expand(np.union1d(self.keys, keys))
+            i = np.searchsorted(self.keys, keys)
+        if len(i) == 1:
+            # One bucket (e.g. a single submission): update it in place
+            j, k = int(i[0]), int(n_b[0])
+            n_a = int(self.n[j])
+            n = n_a + k
+            delta = mean_b[0] - self.mean[j]
+            self.m2[j] += m2_b[0] + np.outer(delta, delta) * (n_a * k / n)
+            self.mean[j] += delta * (k / n)
+            self.n[j] = n
+            self._prefix = None
+            return
+        n_a, mean_a = self.n[i], self.mean[i]
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        self.m2[i] += m2_b + delta[:, :, None] * delta[:, None, :] * (n_a * n_b / n)[:, None, None]
+        self.mean[i] = mean_a + delta * (n_b / n)[:, None]
+        self.n[i] = n
+        self._prefix = None
+
+    def remove(self, rows: np.ndarray, ts_ms: np.ndarray) -> None:
+        """Remove rows previously added; emptied buckets are dropped."""
+        if len(rows) == 0:
+            return
+        keys, n_b, mean_b, m2_b = _group_by_hour(np.asarray(rows, dtype=np.float64), ts_ms)
+        i = np.searchsorted(self.keys, keys)
+        if np.any(i >= len(self.keys)) or not np.array_equal(self.keys[i], keys) or np.any(self.n[i] < n_b):
+            raise ValueError("Cannot remove rows that were not added")
+        n_a = self.n[i]
+        n = n_a - n_b
+        safe = np.where(n > 0, n, 1)
+        mean = (n_a[:, None] * self.mean[i] - n_b[:, None] * mean_b) / safe[:, None]
+        delta = mean_b - mean
+        self.m2[i] -= m2_b + delta[:, :, None] * delta[:, None, :] * (n * n_b / n_a)[:, None, None]
+        self.mean[i] = mean
+        self.n[i] = n
+        keep = self.n > 0
+        if not keep.all():
+            self.keys, self.n = self.keys[keep], self.n[keep]
+            self.mean, self.m2 = self.mean[keep], self.m2[keep]
+        self._prefix = None
+
+    def _expand(self, keys: np.ndarray) -> None:
+        p = self.mean.shape[1]
+        pos = np.searchsorted(keys, self.keys)
+        n = np.zeros(len(keys), dtype=np.int64)
+        mean = np.zeros((len(keys), p))
+        m2 = np.zeros((len(keys), p, p))
+        n[pos], mean[pos], m2[pos] = self.n, self.mean, self.m2
+        self.keys, self.n, self.mean, self.m2 = keys, n, mean, m2
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    @staticmethod
+    def resolve(start_ms: Optional[int], end_ms: Optional[int]) -> Tuple[Optional[int], Optional[int]]:
+        """Bucket-aligned bounds: ``start`` rounded down and ``end`` up to the hour."""
+        lo = None if start_ms is None else (start_ms // HOUR_MS) * HOUR_MS
+        hi = None if end_ms is None else -(-end_ms // HOUR_MS) * HOUR_MS
+        return lo, hi
+
+    def between(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> SufficientStats:
+        """Statistics of the rows timestamped in [start_ms, end_ms), at hour
+        resolution (see ``resolve``); ``None`` leaves a side open."""
+        s, e = self._index_range(start_ms, end_ms)
+        n, mean, m2 = self._combine(np.array([s]), np.array([e]))
+        stats = SufficientStats(self.mean.shape[1])
+        if n[0] > 0:
+            stats.n, stats.mean, stats.m2 = int(n[0]), mean[0], m2[0]
+        return stats
+
+    def series(
+        self,
+        interval: str = "day",
+        window: int = 1,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+    ) -> Dict[str, np.ndarray]:
+        """Key metrics per period for the periods in range that have data.
+
+        Each point covers ``window`` periods ending with its own (a rolling
+        window; 1 means just that period), clipped to the range. Returns
+        period start (epoch ms), n, per-question means, Cronbach's alpha and
+        the R^2 of each question regressed on the other five.
+        """
+        step = INTERVAL_MS[interval]
+        lo, hi = self.resolve(start_ms, end_ms)
+        s, e = self._index_range(start_ms, end_ms)
+        periods = np.unique(self.keys[s:e] * HOUR_MS // step)
+        first = (periods - window + 1) * step
+        last = (periods + 1) * step
+        if lo is not None:
+            first = np.maximum(first, lo)
+        if hi is not None:
+            last = np.minimum(last, hi)
+        starts = np.searchsorted(self.keys, first // HOUR_MS)
+        ends = np.searchsorted(self.keys, last // HOUR_MS)
+        n, mean, m2 = self._combine(starts, ends)
+        metrics = question_metrics(n, m2)
+        return {"start_ms": periods * step, "n": n, "means": mean[:, :N_QUESTIONS], **metrics}
+
+    def _index_range(self, start_ms: Optional[int], end_ms: Optional[int]) -> Tuple[int, int]:
+        lo, hi = self.resolve(start_ms, end_ms)
+        s = 0 if lo is None else int(np.searchsorted(self.keys, lo // HOUR_MS))
+        e = len(self.keys) if hi is None else int(np.searchsorted(self.keys, hi // HOUR_MS))
+        return s, max(s, e)
+
+    def _combine(self, starts: np.ndarray, ends: np.ndarray):
+        """(n, mean, m2) of the bucket ranges [starts[i], ends[i])."""
+        if self._prefix is None:
+            total = max(int(self.n.sum()), 1)
+            shift = (self.n[:, None] * self.mean).sum(axis=0) / total
+            d = self.mean - shift
+            zero = np.zeros((1,) + self.m2.shape[1:])
+            self._prefix = (
+                shift,
+                np.concatenate([[0], np.cumsum(self.n)]),
+                np.concatenate([zero[:, 0], np.cumsum(self.n[:, None] * d, axis=0)]),
+                np.concatenate([zero, np.cumsum(self.m2 + self.n[:, None, None] * d[:, :, None] * d[:, None, :], axis=0)]),
+            )
+        shift, cn, cs, cq = self._prefix
+        n = cn[ends] - cn[starts]
+        safe = np.where(n > 0, n, 1)
+        d = (cs[ends] - cs[starts]) / safe[:, None]
+        m2 = (cq[ends] - cq[starts]) - n[:, None, None] * d[:, :, None] * d[:, None, :]
+        mean = np.where((n > 0)[:, None], d + shift, np.nan)
+        return n, mean, m2
+
+
+def question_metrics(n: np.ndarray, m2: np.ndarray) -> Dict[str, np.ndarray]:
+    """Cronbach's alpha and leave-one-out R^2 of the six questions, batched
+    over a stack of co-moment matrices (NaN where undefined)."""
+    q = m2[:, :N_QUESTIONS, :N_QUESTIONS]
+    k = float(N_QUESTIONS)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total = q.sum(axis=(1, 2))
+        trace = np.trace(q, axis1=1, axis2=2)
+        alpha = np.where((n >= 2) & (total > 0), (k / (k - 1.0)) * (1.0 - trace / total), np.nan)
+        # R^2 of question t on the others is 1 - 1 / (S_tt * inv(S)_tt)
+        ok = n > N_QUESTIONS
+        ok[ok] = np.linalg.cond(q[ok]) < 1e12
+        prec = np.linalg.inv(np.where(ok[:, None, None], q, np.eye(N_QUESTIONS)))
+        diag = np.diagonal(q, axis1=1, axis2=2) * np.diagonal(prec, axis1=1, axis2=2)
+        r2 = np.where(ok[:, None], 1.0 - 1.0 / diag, np.nan)
+    return {"alpha": alpha, "r2": r2}
+
+
+def format_ms(ms: Optional[int]) -> Optional[str]:
+    """Epoch milliseconds as a naive UTC isoformat string (like stored timestamps)."""
+    if ms is None:
+        return None
+    return str(np.datetime_as_string(np.datetime64(int(ms), "ms"), unit="s"))
+
+
+def series_to_json(series: Dict[str, np.ndarray], interval: str, window: int) -> Dict:
+    """Columnar, JSON-ready form of ``TimeBuckets.series`` (NaN as None)."""
+    def _list(values):
+        return np.where(np.isfinite(values), values, None).tolist()
+
+    return {
+        "interval": interval,
+        "window": window,
+        "start": np.datetime_as_string(series["start_ms"].astype("datetime64[ms]"), unit="s").tolist(),
+        "n": series["n"].tolist(),
+        "means": _list(series["means"]),
+        "alpha": _list(series["alpha"]),
+        "r2": _list(series["r2"]),
+    }